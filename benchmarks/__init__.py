@@ -0,0 +1,2 @@
+""" Performance benchmarks. See benchmarks/run.py.
+"""
@@ -0,0 +1,93 @@
+""" Controller refresh path benchmarks. Starts the full Application
+    against a generated database and times the record refresh, the
+    Studies tree reload and amendment loading, including the Tk work.
+
+    Needs a display. On a headless machine, run under Xvfb:
+        xvfb-run python -m benchmarks.run --controller
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import time
+
+# Import custom modules
+from benchmarks.bench_dbmodel import timeit
+
+
+#########
+# BEGIN #
+#########
+def _settle(app, timeout=600):
+    """ Run the Tk event loop until no query is in flight and no
+        tree is still loading.
+    """
+    deadline = time.perf_counter() + timeout
+    while (app.executor.busy or app.mainview.tree.loading
+        or app.amendmentview.tree.loading):
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Application did not settle")
+        app.update()
+        time.sleep(0.001)
+    # Deliver anything queued by the last callback
+    app.update()
+
+
+def _round_trip(app, func, *args):
+    """ Run func(conn, *args) on the query executor and wait for the
+        result on the Tk thread.
+    """
+    result = []
+    app.executor.submit(func, *args, callback=result.append)
+    _settle(app)
+    return result[0]
+
+
+def run(db_file, repeat=5):
+    """ Time the controller refresh path.
+    :return: dict of benchmark name: timings
+    """
+    # Tk is only needed (and only importable headless) here
+    import controller
+
+    results = {}
+    start = time.perf_counter()
+    app = controller.Application(db_file=db_file, check_updates=False)
+    _settle(app)
+    results['startup'] = {'min': (time.perf_counter() - start) * 1000}
+    results['startup']['median'] = results['startup']['max'] = \
+        results['startup']['min']
+
+    try:
+        # Study with the most amendments
+        busiest = max(app.cache.amendments,
+            key=lambda x: len(app.cache.amendments[x]))
+
+        def record_values_cold():
+            app.cache.invalidate()
+            _round_trip(app, app._get_record_values)
+
+        def refresh_view():
+            app.refresh_view()
+            _settle(app)
+
+        def populate_amendments():
+            app._amendvars['study_id'].set(busiest)
+            app._populate_amendments()
+            _settle(app)
+
+        benchmarks = {
+            'get_record_values_cold': record_values_cold,
+            'get_record_values_warm': lambda: _round_trip(app,
+                app._get_record_values),
+            'refresh_view': refresh_view,
+            'populate_amendments': populate_amendments,
+        }
+        for name, func in benchmarks.items():
+            results[name] = timeit(func, repeat)
+    finally:
+        app._quit()
+    return results
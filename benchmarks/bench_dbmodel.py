@@ -0,0 +1,118 @@
+""" DBModel benchmarks. Times every DBModel query and write method
+    against a generated database.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import statistics
+import time
+
+# Import custom modules
+from models import dbmodel
+
+
+#########
+# BEGIN #
+#########
+def timeit(func, repeat=5):
+    """ Call func() repeat times.
+    :return: dict of min, median and max time in ms
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'min': min(times), 'median': statistics.median(times),
+        'max': max(times)}
+
+
+def _sample(conn):
+    """ Pick representative arguments from the database.
+    """
+    busiest = conn.execute("SELECT study_id FROM Amendments GROUP BY "
+        "study_id ORDER BY count(*) DESC LIMIT 1").fetchone()[0]
+    middle = conn.execute("SELECT study_id, study_name, date_created "
+        "FROM Studies WHERE date_created IS NOT NULL ORDER BY "
+        "date_created DESC, study_id DESC LIMIT 1 OFFSET "
+        "(SELECT count(*) / 2 FROM Studies)").fetchone()
+    amend_id = conn.execute("SELECT max(amend_id) / 2 FROM Amendments"
+        ).fetchone()[0]
+    study = conn.execute("SELECT irb_ref, study_name, study_type, "
+        "researcher_id, date_created, date_closed, study_id FROM Studies "
+        "WHERE study_id=?", [middle[0]]).fetchone()
+    amendment = conn.execute("SELECT submit_date, approval_date, "
+        "rationale, study_id, amend_id FROM Amendments WHERE amend_id=?",
+        [amend_id]).fetchone()
+    return {
+        'busiest_study': busiest,
+        'middle_study': middle[0],
+        'middle_name': middle[1],
+        'middle_key': (middle[2], middle[0]),
+        'amend_id': amend_id,
+        'study_values': list(study),
+        'amend_values': list(amendment),
+    }
+
+
+def run(db_file, repeat=5):
+    """ Time every DBModel method. Writes change the database: pass a
+        scratch copy.
+    :return: dict of benchmark name: timings
+    """
+    db = dbmodel.DBModel()
+    pool = db.create_pool(db_file)
+    conn = pool.get()
+    args = _sample(conn)
+    study_values = args['study_values']
+    new_study = study_values[:-1]
+    amend_values = args['amend_values']
+    new_amendment = amend_values[:-1]
+
+    benchmarks = {
+        'get_data_version': lambda: db.get_data_version(conn),
+        'get_studyid_from_name': lambda: db.get_studyid_from_name(
+            conn, [args['middle_name']]),
+        'select_open_studies': lambda: db.select_open_studies(conn),
+        'select_all_studies': lambda: db.select_all_studies(conn),
+        'select_study': lambda: db.select_study(
+            conn, [args['middle_study']]),
+        'select_studies_page_first': lambda: db.select_studies_page(conn),
+        'select_studies_page_middle': lambda: db.select_studies_page(
+            conn, args['middle_key']),
+        'select_studies_page_open': lambda: db.select_studies_page(
+            conn, open_only=True),
+        'select_active_researchers': lambda: db.select_active_researchers(
+            conn),
+        'select_amendments': lambda: db.select_amendments(
+            conn, [args['busiest_study']]),
+        'select_all_amendments': lambda: db.select_all_amendments(conn),
+        'select_amendment': lambda: db.select_amendment(
+            conn, [args['amend_id']]),
+        'search_selective': lambda: db.search(conn, args['middle_name']),
+        'search_common': lambda: db.search(conn, 'consent'),
+        'select_study_counts': lambda: db.select_study_counts(conn),
+        'select_study_summary_researcher': lambda: db.select_study_summary(
+            conn, 'researcher'),
+        'select_amendment_summary': lambda: db.select_amendment_summary(
+            conn, args['busiest_study']),
+        'select_study_columns': lambda: db.select_study_columns(conn),
+        'select_amendment_columns': lambda: db.select_amendment_columns(
+            conn),
+        'update_study': lambda: db.update_study(conn, study_values),
+        'update_amendment': lambda: db.update_amendment(conn, amend_values),
+        'create_study': lambda: db.create_study(conn, new_study),
+        'create_amendment': lambda: db.create_amendment(conn, new_amendment),
+    }
+
+    results = {}
+    try:
+        for name, func in benchmarks.items():
+            results[name] = timeit(func, repeat)
+    finally:
+        pool.close_all()
+    return results
@@ -0,0 +1,233 @@
+""" Level function benchmarks. Times functions.levels against the
+    Audio code it replaced, on generated multichannel files, and
+    checks that both give the same samples. The replaced code is kept
+    here as the reference.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_levels
+        python -m benchmarks.run --levels
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+
+# Import system packages
+import argparse
+import os
+import tempfile
+
+# Import audio packages
+import soundfile as sf
+
+# Import custom modules
+from benchmarks.bench_dbmodel import timeit
+from functions import levels
+
+
+#########
+# BEGIN #
+#########
+# Generated files: channels, seconds at 48 kHz
+FILES = ((2, 60), (8, 30), (32, 10))
+FS = 48000
+
+
+#####################
+# Reference Methods #
+#####################
+# Audio's level code before functions.levels
+def legacy_db2mag(db):
+    try:
+        mag = [10**(x/20) for x in db]
+        return mag
+    except:
+        mag = 10**(db/20)
+        return mag
+
+
+def legacy_mag2db(mag):
+    try:
+        db = [20 * np.log10(x) for x in mag]
+        return db
+    except:
+        db = 20 * np.log10(mag)
+        return db
+
+
+def legacy_rms(sig):
+    return np.sqrt(np.mean(np.square(sig)))
+
+
+def legacy_set_rms(sig, amp, eq='n'):
+    """ Audio.setRMS() for a 2-channel signal (channels by samples),
+        for channels that are not already at amp.
+    """
+    rmsdbLeft = legacy_mag2db(legacy_rms(sig[0]))
+    rmsdbRight = legacy_mag2db(legacy_rms(sig[1]))
+    ILD = np.abs(rmsdbLeft - rmsdbRight)
+    if rmsdbLeft > rmsdbRight:
+        lvlAdv = 'left'
+    elif rmsdbRight > rmsdbLeft:
+        lvlAdv = 'right'
+    else:
+        lvlAdv = None
+
+    refdb = amp
+    diffdbLeft = np.abs(rmsdbLeft - refdb)
+    diffdbRight = np.abs(rmsdbRight - refdb)
+    if rmsdbLeft > refdb:
+        sigAdjLeft = sig[0] / legacy_db2mag(diffdbLeft)
+    elif rmsdbLeft < refdb:
+        sigAdjLeft = sig[0] * legacy_db2mag(diffdbLeft)
+    if rmsdbRight > refdb:
+        sigAdjRight = sig[1] / legacy_db2mag(diffdbRight)
+    elif rmsdbRight < refdb:
+        sigAdjRight = sig[1] * legacy_db2mag(diffdbRight)
+
+    if eq == 'n':
+        if lvlAdv == 'left':
+            sigAdjLeft = sigAdjLeft * legacy_db2mag(ILD/2)
+            sigAdjRight = sigAdjRight / legacy_db2mag(ILD/2)
+        elif lvlAdv == 'right':
+            sigAdjLeft = sigAdjLeft / legacy_db2mag(ILD/2)
+            sigAdjRight = sigAdjRight * legacy_db2mag(ILD/2)
+    return np.array([sigAdjLeft, sigAdjRight])
+
+
+def legacy_normalize(signal):
+    """ Audio.play() with no level.
+    """
+    temp = signal.astype(np.float32)
+    num_channels = temp.shape[1]
+    for chan in range(0, num_channels):
+        temp[:, chan] = temp[:, chan] - np.mean(temp[:, chan])
+        temp[:, chan] = temp[:, chan] / np.max(np.abs(temp[:, chan]))
+        temp[:, chan] = temp[:, chan] / num_channels
+    return temp
+
+
+def legacy_stats(signal):
+    """ Per-channel RMS, peak and DC, one channel at a time.
+    """
+    return [(legacy_rms(signal[:, chan]), np.max(np.abs(signal[:, chan])),
+        np.mean(signal[:, chan])) for chan in range(signal.shape[1])]
+
+
+def legacy_scale(signal, level):
+    """ Audio.play() with a level.
+    """
+    temp = signal.astype(np.float32)
+    return temp * legacy_db2mag(level)
+
+
+######################
+# Benchmark Function #
+######################
+def make_files(directory):
+    """ Write the FILES test signals: noise with a different level
+        and DC offset in each channel.
+    :return: list of paths
+    """
+    rng = np.random.default_rng(0)
+    paths = []
+    for channels, seconds in FILES:
+        gains = np.linspace(0.02, 0.2, channels)
+        offsets = np.linspace(-0.01, 0.01, channels)
+        sig = (rng.standard_normal((seconds * FS, channels)) * gains +
+            offsets).astype(np.float32)
+        path = os.path.join(directory, f"noise_{channels}ch.wav")
+        sf.write(path, sig, FS, subtype='FLOAT')
+        paths.append(path)
+    return paths
+
+
+def _check(name, expected, actual):
+    if not np.allclose(expected, actual, rtol=1e-4, atol=1e-6):
+        raise AssertionError(f"{name}: results differ by up to " +
+            f"{np.max(np.abs(np.asarray(expected) - actual)):.3g}")
+
+
+def run(repeat=5):
+    """ Time the reference and new code on each file. Results are
+        checked before timing.
+    :return: dict of benchmark name: timings
+    """
+    results = {}
+    dbs = np.linspace(-80, 0, 10000)
+    _check('db2mag', legacy_db2mag(dbs), levels.db2mag(dbs))
+    results['db2mag_10k/legacy'] = timeit(lambda: legacy_db2mag(dbs),
+        repeat)
+    results['db2mag_10k/levels'] = timeit(lambda: levels.db2mag(dbs),
+        repeat)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in make_files(tmp_dir):
+            # As Audio reads files
+            sig, _ = sf.read(path, dtype='float32')
+            name = f"{sig.shape[1]}ch"
+
+            _check('normalize', legacy_normalize(sig), levels.normalize(sig))
+            results[f'normalize_{name}/legacy'] = timeit(
+                lambda: legacy_normalize(sig), repeat)
+            results[f'normalize_{name}/levels'] = timeit(
+                lambda: levels.normalize(sig), repeat)
+
+            st = levels.stats(sig)
+            _check('stats', legacy_stats(sig),
+                np.column_stack([st.rms, st.peak, st.dc]))
+            results[f'stats_{name}/legacy'] = timeit(
+                lambda: legacy_stats(sig), repeat)
+            results[f'stats_{name}/levels'] = timeit(
+                lambda: levels.stats(sig), repeat)
+
+            _check('scale', legacy_scale(sig, -10),
+                levels.apply_gain(sig, levels.db2mag(-10)))
+            results[f'scale_{name}/legacy'] = timeit(
+                lambda: legacy_scale(sig, -10), repeat)
+            results[f'scale_{name}/levels'] = timeit(
+                lambda: levels.apply_gain(sig, levels.db2mag(-10)), repeat)
+            out = np.empty_like(sig)
+            results[f'scale_{name}/levels_out'] = timeit(
+                lambda: levels.apply_gain(sig, levels.db2mag(-10), out=out),
+                repeat)
+
+            if sig.shape[1] == 2:
+                # setRMS takes channels by samples
+                _check('set_rms', legacy_set_rms(sig.T, -25),
+                    levels.set_rms(sig, -25).T)
+                _check('set_rms_eq', legacy_set_rms(sig.T, -25, eq='y'),
+                    levels.set_rms(sig, -25, equalize=True).T)
+                results[f'set_rms_{name}/legacy'] = timeit(
+                    lambda: legacy_set_rms(sig.T, -25), repeat)
+                results[f'set_rms_{name}/levels'] = timeit(
+                    lambda: levels.set_rms(sig, -25), repeat)
+    return results
+
+
+def report(results):
+    """ Print each benchmark with its speed-up over the reference.
+    """
+    print(f"\n{'Benchmark':<30}{'Median ms':>12}{'Speed-up':>10}")
+    for name, t in results.items():
+        line = f"{name:<30}{t['median']:>12.2f}"
+        test, method = name.rsplit('/', 1)
+        legacy = results.get(f"{test}/legacy")
+        if method != 'legacy' and legacy:
+            line += f"{legacy['median'] / t['median']:>9.1f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    report(run(args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+""" Synthetic study database generator for benchmarks. Builds
+    Researchers, Studies and Amendments tables with the current
+    schema and realistic distributions:
+    - a few researchers own most studies (Zipf-like weights)
+    - studies are created more often in recent years
+    - older studies are more likely to be closed
+    - amendments per study are skewed: most have a few, some many
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import database packages
+import sqlite3
+
+# Import system packages
+import datetime
+import os
+import random
+
+# Import custom modules
+from models import migrationmodel
+
+
+#########
+# BEGIN #
+#########
+# Benchmark sizes: number of studies
+SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# Vocabulary for names and rationales
+FIRST_NAMES = ['Alex', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley',
+    'Jamie', 'Avery', 'Quinn', 'Harper', 'Rowan', 'Emery', 'Sage', 'Kai']
+LAST_NAMES = ['Smith', 'Nguyen', 'Garcia', 'Olsen', 'Patel', 'Kim',
+    'Schmidt', 'Rossi', 'Haddad', 'Okafor', 'Larsen', 'Moreau', 'Sato']
+TOPICS = ['Hearing Aid', 'Tinnitus', 'Speech in Noise', 'Own Voice',
+    'Feedback Cancellation', 'Directional Microphone', 'Noise Reduction',
+    'Music Perception', 'Fitting Formula', 'Streaming', 'Battery Life',
+    'Sound Quality', 'Localization', 'Listening Effort', 'Occlusion']
+DESIGNS = ['Pilot', 'Field Trial', 'Lab Evaluation', 'Validation',
+    'Crossover', 'Follow-Up', 'Feasibility', 'Comparison']
+RATIONALES = ['Added participant consent form revision',
+    'Extended enrollment period', 'Updated inclusion criteria',
+    'Added new test site', 'Changed primary investigator',
+    'Revised questionnaire', 'Increased sample size',
+    'Added follow-up visit', 'Updated device firmware under test',
+    'Corrected protocol typographical errors']
+
+STUDIES_PER_RESEARCHER = 500
+YEARS = 15
+TODAY = datetime.date(2024, 1, 1)
+
+
+def _researchers(rng, count):
+    rows = []
+    for researcher_id in range(1, count + 1):
+        status = 'active' if rng.random() < 0.8 else 'inactive'
+        rows.append((researcher_id, rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES), status))
+    return rows
+
+
+def _zipf_weights(count, s=1.1):
+    """ Cumulative Zipf-like weights: the researcher of rank r gets
+        a share proportional to 1/r**s.
+    """
+    weights = [1 / (rank ** s) for rank in range(1, count + 1)]
+    total = 0
+    cum = []
+    for w in weights:
+        total += w
+        cum.append(total)
+    return cum
+
+
+def _date_created(rng):
+    # More studies in recent years: skew towards TODAY
+    age = int(YEARS * 365 * (1 - rng.random() ** 0.6))
+    return TODAY - datetime.timedelta(days=age)
+
+
+def _studies(rng, count, researcher_count):
+    cum = _zipf_weights(researcher_count)
+    # Shuffle so the busiest researcher is not always researcher 1
+    ids = list(range(1, researcher_count + 1))
+    rng.shuffle(ids)
+    for study_id in range(1, count + 1):
+        researcher_id = rng.choices(ids, cum_weights=cum)[0]
+        # A few legacy records have no creation date
+        if rng.random() < 0.01:
+            created = None
+            closed = None
+        else:
+            created = _date_created(rng)
+            # Older studies are more likely to be closed
+            age = (TODAY - created).days
+            closed = None
+            if rng.random() < min(0.95, age / (4 * 365)):
+                closed = created + datetime.timedelta(
+                    days=rng.randint(90, 1500))
+                if closed >= TODAY:
+                    closed = None
+        year = created.year if created else 2000
+        yield (
+            study_id,
+            f"IRB{year}-{study_id:07d}",
+            f"{rng.choice(TOPICS)} {rng.choice(DESIGNS)} {study_id}",
+            'Main Study' if rng.random() < 0.8 else 'Sub-Study',
+            researcher_id,
+            str(created) if created else None,
+            str(closed) if closed else None,
+        )
+
+
+def _amendments(rng, study, amend_id):
+    """ Amendments for one study. Returns the rows and the next
+        amend_id.
+    """
+    study_id, created = study[0], study[5]
+    # Geometric: mean of about 2 per study, with a long tail
+    count = 0
+    while rng.random() < 0.67:
+        count += 1
+    start = (datetime.date.fromisoformat(created) if created
+        else TODAY - datetime.timedelta(days=YEARS * 365))
+    rows = []
+    for _ in range(count):
+        submitted = start + datetime.timedelta(days=rng.randint(1, 900))
+        if submitted >= TODAY:
+            break
+        approved = None
+        if rng.random() < 0.9:
+            approved = submitted + datetime.timedelta(days=rng.randint(3, 60))
+            if approved >= TODAY:
+                approved = None
+        rows.append((amend_id, str(submitted),
+            str(approved) if approved else None,
+            rng.choice(RATIONALES), study_id))
+        amend_id += 1
+    return rows, amend_id
+
+
+def generate(path, studies, seed=0, batch=10_000):
+    """ Create a synthetic database at path with the given number of
+        studies. The same seed always gives the same data.
+    """
+    print(f"\ngenerator: Building {path} ({studies} studies)...")
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Load into the base tables, then build indexes and the search 
+    # index in bulk: row-by-row index and trigger upkeep is far 
+    # slower
+    migrations = migrationmodel.MigrationModel()
+    migrations.migrate(conn, target=1)
+
+    researcher_count = max(10, studies // STUDIES_PER_RESEARCHER)
+    with conn:
+        conn.executemany("INSERT INTO Researchers VALUES(?,?,?,?)",
+            _researchers(rng, researcher_count))
+
+        amend_id = 1
+        study_rows = []
+        amend_rows = []
+        for study in _studies(rng, studies, researcher_count):
+            study_rows.append(study)
+            rows, amend_id = _amendments(rng, study, amend_id)
+            amend_rows.extend(rows)
+            if len(study_rows) >= batch:
+                conn.executemany("INSERT INTO Studies VALUES(?,?,?,?,?,?,?)",
+                    study_rows)
+                conn.executemany("INSERT INTO Amendments VALUES(?,?,?,?,?)",
+                    amend_rows)
+                study_rows = []
+                amend_rows = []
+        conn.executemany("INSERT INTO Studies VALUES(?,?,?,?,?,?,?)",
+            study_rows)
+        conn.executemany("INSERT INTO Amendments VALUES(?,?,?,?,?)",
+            amend_rows)
+
+    migrations.migrate(conn)
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"generator: Done! ({amend_id - 1} amendments)")
+
+
+def cached_database(size, cache_dir, seed=0):
+    """ Return the path to a generated database for a named size,
+        building it if it does not exist yet. Databases are rebuilt
+        when the schema version changes.
+    """
+    version = migrationmodel.MigrationModel().latest_version
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"bench_{size}_s{seed}_v{version}.db")
+    if not os.path.exists(path):
+        # Build under a temporary name so an interrupted build is 
+        # never mistaken for a finished one
+        generate(path + '.tmp', SIZES[size], seed)
+        os.replace(path + '.tmp', path)
+    return path
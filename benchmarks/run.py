@@ -0,0 +1,164 @@
+""" Benchmark runner. Times DBModel (and optionally the controller
+    refresh path) on generated databases and compares the results
+    with a stored baseline.
+
+    Usage (from the repository root):
+        python -m benchmarks.run                    # 1k and 100k
+        python -m benchmarks.run --sizes 1k 100k 1m
+        xvfb-run python -m benchmarks.run --controller
+        python -m benchmarks.run --levels           # add audio levels
+        python -m benchmarks.run --save-baseline    # record a baseline
+
+    Exits with status 1 if any benchmark is slower than the baseline
+    by more than the tolerance.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# Import custom modules
+from benchmarks import bench_dbmodel
+from benchmarks import generator
+
+
+#########
+# BEGIN #
+#########
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+CACHE_DIR = str(Path.home() / '.study_database_bench')
+
+
+def _scratch_copy(db_file, tmp_dir):
+    """ Copy a generated database so write benchmarks leave the cached
+        one unchanged.
+    """
+    path = os.path.join(tmp_dir, os.path.basename(db_file))
+    shutil.copyfile(db_file, path)
+    return path
+
+
+def run(sizes, repeat=5, controller=False, verbose=False, levels=False):
+    """ Run the benchmarks.
+    :param levels: also time the audio level functions (once, not 
+        per database size)
+    :return: dict of 'size/group/name': timings
+    """
+    results = {}
+    if levels:
+        from benchmarks import bench_levels
+        print("\nrun: Benchmarking audio levels...")
+        for name, t in bench_levels.run(repeat).items():
+            results[f"levels/{name}"] = t
+    for size in sizes:
+        db_file = generator.cached_database(size, CACHE_DIR)
+        groups = [('dbmodel', bench_dbmodel.run)]
+        if controller:
+            from benchmarks import bench_controller
+            groups.append(('controller', bench_controller.run))
+
+        for group, func in groups:
+            print(f"\nrun: Benchmarking {group} on {size}...")
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                scratch = _scratch_copy(db_file, tmp_dir)
+                # Model and controller console messages would swamp
+                # the report
+                out = sys.stdout if verbose else io.StringIO()
+                with contextlib.redirect_stdout(out):
+                    timings = func(scratch, repeat)
+            for name, t in timings.items():
+                results[f"{size}/{group}/{name}"] = t
+    return results
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as fh:
+        return json.load(fh)
+
+
+def save_baseline(path, results):
+    data = {
+        'machine': platform.node(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'results': {name: t['median'] for name, t in results.items()},
+    }
+    with open(path, 'w') as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+    print(f"\nrun: Saved baseline to {path}")
+
+
+def report(results, baseline=None, tolerance=0.2, min_delta_ms=1.0):
+    """ Print median times, compared with the baseline if given. A
+        benchmark has regressed if it is slower by more than 
+        tolerance and by more than min_delta_ms (sub-millisecond 
+        timings are mostly noise).
+    :return: list of benchmark names that regressed
+    """
+    regressions = []
+    old = baseline['results'] if baseline else {}
+    if baseline and baseline.get('machine') != platform.node():
+        print(f"\nrun: WARNING: baseline was recorded on " +
+            f"'{baseline.get('machine')}', not this machine")
+
+    print(f"\n{'Benchmark':<50}{'Median ms':>12}{'Baseline':>12}{'Change':>10}")
+    for name, t in results.items():
+        line = f"{name:<50}{t['median']:>12.2f}"
+        if name in old:
+            change = (t['median'] - old[name]) / old[name] if old[name] else 0
+            line += f"{old[name]:>12.2f}{change:>+10.0%}"
+            if (change > tolerance 
+                and t['median'] - old[name] > min_delta_ms):
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=['1k', '100k'],
+        choices=list(generator.SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--controller', action='store_true',
+        help="also time the controller refresh path (needs a display)")
+    parser.add_argument('--levels', action='store_true',
+        help="also time the audio level functions against the code "
+        "they replaced")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help="allowed slowdown before a benchmark is flagged (0.2 = 20%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+        help="ignore slowdowns smaller than this")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.controller, args.verbose,
+        args.levels)
+    regressions = report(results, load_baseline(args.baseline),
+        args.tolerance, args.min_delta_ms)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,9 +11,13 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
+from tkinter import filedialog
 
 # Import system packages
+import multiprocessing
 import os
+import threading
+from pathlib import Path
 
 # Import misc packages
 import webbrowser
@@ -29,12 +33,31 @@ from models import sessionmodel
 from models import calmodel
 from models import csvmodel
 from models import updatermodel
+from models import audiomodel
 from models import dbmodel
+from models import querymodel
+from models import cachemodel
+from models import indexmodel
+from models import migrationmodel
+from models import statsmodel
+from models import importmodel
+from models import exportmodel
+from models import writequeuemodel
+from models import replicamodel
+from models import recordmodel
+from models import analyticsmodel
+from models import stimulusmodel
 # View imports
 from views import study_tabview
 from views import study_recordview
 from views import amendment_tabview
 from views import amendment_recordview
+from views import querystatsview
+from views import importreportview
+from views import exportview
+from views import reports_tabview
+from views import stimulusview
+from views import settingsview
 
 
 #########
@@ -43,7 +66,17 @@ from views import amendment_recordview
 class Application(tk.Tk):
     """ Application root window
     """
-    def __init__(self, *args, **kwargs):
+    # Default database file
+    DATABASE = r"C:\Users\MooTra\OneDrive - Starkey\Desktop\Clinical_Studies.db"
+
+    # Seconds to wait for pending edits to be saved on quitting
+    QUIT_FLUSH_S = 30
+
+    def __init__(self, *args, db_file=None, check_updates=True, **kwargs):
+        """ 
+        :param db_file: database file to open instead of DATABASE
+        :param check_updates: check the version library on startup
+        """
         super().__init__(*args, **kwargs)
 
         #############
@@ -80,6 +113,7 @@ class Application(tk.Tk):
             'submit_date': tk.StringVar(),
             'approval_date': tk.StringVar(),
             'rationale': tk.StringVar(),
+            'study_id': tk.IntVar(),
         }
 
 
@@ -108,14 +142,69 @@ class Application(tk.Tk):
         self.csvmodel = csvmodel.CSVModel(self.sessionpars)
 
         # Load calibration model
-        self.calmodel = calmodel.CalModel(self.sessionpars)
+        # Streamed playback reports errors from its reader thread
+        self.calmodel = calmodel.CalModel(self.sessionpars,
+            on_error=lambda e: self.executor.call_soon(self.show_error, e))
 
         # Load database model
-        database = r"C:\Users\MooTra\OneDrive - Starkey\Desktop\Clinical_Studies.db"
-        self.db = dbmodel.DBModel()
-        self.conn = self.db.create_connection(database)
-
-        self._get_record_values()
+        database = db_file or self.DATABASE
+        # Record timing, lock wait and slow query plans
+        self.query_stats = statsmodel.QueryStats(
+            slow_ms=self.sessionpars['slow_query_ms'].get(),
+            log_file=self.sessionpars['slow_query_log'].get() or None)
+        self.db = dbmodel.DBModel(stats=self.query_stats)
+
+        # Optionally read from a local copy of the shared database
+        self.replica = None
+        if self.sessionpars['local_replica'].get():
+            self.replica = replicamodel.Replica(self.db, database,
+                self._replica_path(database),
+                interval=self.sessionpars['replica_sync_s'].get(),
+                on_sync=lambda others: self.executor.call_soon(
+                    self._on_replica_sync, others),
+                on_progress=lambda done, total: self.executor.call_soon(
+                    self._on_replica_progress, done, total))
+            database = self.replica.replica_file
+        self.pool = self.db.create_pool(database)
+
+        # Run database work off the Tk thread
+        self.executor = querymodel.QueryExecutor(self, self.pool,
+            on_busy=self._on_db_busy)
+        # Exports get their own thread and connection, so a long one
+        # does not hold up other requests
+        self.export_executor = querymodel.QueryExecutor(self, self.pool,
+            name='ExportExecutor')
+        if self.replica is not None:
+            self.replica.start()
+
+        # Create or upgrade the schema before anything else runs
+        self.migrations = migrationmodel.MigrationModel()
+        self.executor.submit(self._migrate_database, 
+            errback=self._on_db_error)
+
+        # Hold records in memory between refreshes
+        self.cache = cachemodel.StudyCache(self.db)
+        self.analytics = analyticsmodel.AnalyticsModel(self.db)
+
+        # Load bulk imports and exports
+        self.importer = importmodel.ImportModel(self.db)
+        self.exporter = exportmodel.ExportModel(self.db)
+        self.exportview = None
+        self._export_job = None
+        self.stimulusview = None
+
+        # Optionally hold edits and write them in batches
+        self.write_queue = writequeuemodel.WriteBehindQueue()
+        self._flush_after = None
+
+        # Records are loaded in the background by refresh_view()
+        self.open_studies = []
+        self.all_studies = []
+        # (open, total) from the StudyCounts summary table
+        self.study_counts = (0, 0)
+        self.study_index = indexmodel.NameIndex()
+        self.researcher_index = indexmodel.NameIndex()
+        self.active_researchers = frozenset()
 
         # Title label
         ttk.Label(self, style='Heading.TLabel',
@@ -133,28 +222,49 @@ class Application(tk.Tk):
 
         # Load amendment view
         self.amendmentview = amendment_tabview.AmendmentFrame(self.notebook, 
-            self.all_studies, self._amendvars)
+            self.study_index, self._amendvars)
         self.amendmentview.grid(row=0, column=0)
 
+        # Load reports view
+        self.reportsview = reports_tabview.ReportsFrame(self.notebook)
+        self.reportsview.grid(row=0, column=0)
+
         # Populate notebook tabs
         self.notebook.add(self.mainview, text="Studies")
         self.notebook.add(self.amendmentview, text="Amendments")
+        self.notebook.add(self.reportsview, text="Reports")
+
+        # Reports are computed when their tab is shown
+        self.notebook.bind('<<NotebookTabChanged>>', 
+            lambda _: self._on_tab_changed())
 
         # Display open study count
         self.open_study_count = tk.StringVar(
-            value=f"Open Studies: {len(self.open_studies)}")
+            value=f"Open Studies: {self.study_counts[0]}")
         ttk.Label(
             self, textvariable=self.open_study_count).grid(
             column=5, row=15, sticky='w', padx=10
         )
 
+        # Display query in flight indicator
+        self.db_status = tk.StringVar()
+        ttk.Label(
+            self, textvariable=self.db_status).grid(
+            column=5, row=15, sticky='e', padx=10
+        )
+
         # Display total study count
         self.total_study_count = tk.StringVar(
-            value=f"Total Studies: {len(self.all_studies)}")
+            value=f"Total Studies: {self.study_counts[1]}")
         ttk.Label(self, 
                   textvariable=self.total_study_count).grid(
             column=5, row=20, sticky='w', padx=10, pady=(0,10))
 
+        # Display pending/saved state of queued edits
+        self.write_status = tk.StringVar()
+        ttk.Label(self, textvariable=self.write_status).grid(
+            column=5, row=20, sticky='e', padx=10, pady=(0,10))
+
         # Load menus
         menu = mainmenu.MainMenu(self, self._menu_settings)
         self.config(menu=menu)
@@ -164,13 +274,31 @@ class Application(tk.Tk):
             # File menu
             '<<FileNewAmendment>>': lambda _: self.show_new_amendment_view(),
             '<<FileNewStudy>>': lambda _: self.show_new_study_view(),
+            '<<FileImportStudies>>': lambda _: self.import_records('studies'),
+            '<<FileImportAmendments>>': lambda _: self.import_records(
+                'amendments'),
+            '<<FileExport>>': lambda _: self.show_export_view(),
+            '<<FileSaveEdits>>': lambda _: self.flush_writes(),
+
+            # Export view commands
+            '<<ExportSubmit>>': lambda _: self.export_records(),
+            '<<ExportCancel>>': lambda _: self.cancel_export(),
             '<<FileQuit>>': lambda _: self._quit(),
 
+            # Tools menu
+            '<<ToolsQueryStats>>': lambda _: self.show_query_stats(),
+            '<<ToolsCheckStimuli>>': lambda _: self.check_stimuli(),
+            '<<ToolsSettings>>': lambda _: self.show_settings(),
+            '<<SettingsSubmit>>': lambda _: self._on_settings_submit(),
+
             # Help menu
             '<<Help>>': lambda _: self._show_help(),
 
             # Study tab view commands
             '<<MainTreeSelection>>': lambda _: self.show_edit_study_view(),
+            '<<MainTreeNeedPage>>': lambda _: self.load_study_page(),
+            '<<MainSearch>>': lambda _: self.search_records(),
+            '<<MainSearchSelection>>': lambda _: self.open_search_result(),
 
             # Study record view commands
             '<<StudyViewSubmitEdit>>': lambda _: self.save_study_edits(),
@@ -180,6 +308,9 @@ class Application(tk.Tk):
             '<<AmendmentStudySelected>>': lambda _: self._populate_amendments(),
             '<<AmendmentTreeSelection>>': lambda _: self.show_edit_amendment_view(),
 
+            # Reports tab view commands
+            '<<ReportsRefresh>>': lambda _: self.refresh_reports(),
+
             # Amendment record view commands
             '<<AmendmentSubmitEdit>>': lambda _: self.save_amendment_edits(),
             '<<AmendmentSubmitNew>>': lambda _: self.create_new_amendment(),
@@ -195,11 +326,16 @@ class Application(tk.Tk):
         # Center main window
         self.center_window()
 
+        # Load records
+        self.refresh_view()
+
         # Check for updates
-        _filepath = r'\\starfile\Public\Temp\MooreT\Custom Software\version_library.csv'
-        u = updatermodel.VersionChecker(_filepath, self.NAME, self.VERSION)
-        if not u.current:
-            self.destroy()
+        if check_updates:
+            _filepath = r'\\starfile\Public\Temp\MooreT\Custom Software\version_library.csv'
+            u = updatermodel.VersionChecker(_filepath, self.NAME, self.VERSION)
+            self._report_update_status(u)
+            if not u.current:
+                self._quit()
 
 
     #####################
@@ -218,24 +354,326 @@ class Application(tk.Tk):
         self.deiconify()
 
 
-    def _get_record_values(self):
-        # Select all open studies
-        with self.conn:
-            self.open_studies = self.db.select_open_studies(self.conn)
-            self.all_studies = self.db.select_all_studies(self.conn)
-            self.researchers = dict(
-                self.db.select_active_researchers(self.conn)
-                )
+    def _get_record_values(self, conn):
+        """ Get study and researcher records, reloading the cache 
+            only if the database has changed. Runs on the query 
+            executor thread.
+        """
+        self.cache.refresh(conn)
+        return (self.cache.open_studies, self.cache.studies, 
+            self.cache.study_index, self.cache.researcher_index,
+            self.cache.active_researchers, self.db.select_study_counts(conn))
+
+
+    def _migrate_database(self, conn):
+        """ Bring the schema up to date and check that hot queries 
+            still use their indexes. Runs on the query executor thread.
+        """
+        conn = self._write_conn(conn)
+        old_version = self.migrations.get_version(conn)
+        # Migration scripts are not retried if the database is locked
+        with self.db.wait_for_locks(conn):
+            version = self.migrations.migrate(conn)
+        if version != old_version:
+            self.migrations.check_query_plans(conn)
+        # The first read must wait for the local copy
+        self._after_write()
+
+
+    def _replica_path(self, database):
+        """ Local copy location: the replica_file setting, or a
+            file of the same name in ~/.study_database.
+        """
+        return (self.sessionpars['replica_file'].get() or 
+            str(Path.home() / '.study_database' / os.path.basename(database)))
+
+
+    def _write_conn(self, conn):
+        """ Return the connection writes should use: the shared 
+            database when reading from a local copy. Runs on the 
+            query executor thread.
+        """
+        if self.replica is None:
+            return conn
+        return self.replica.primary.get()
+
+
+    def _after_write(self):
+        """ Bring the local copy up to date after a write, so the 
+            reads queued after it see the write. Runs on the query
+            executor thread.
+        """
+        # Local writes do not change data_version
+        self.analytics.invalidate()
+        if self.replica is not None and not self.replica.sync():
+            raise dbmodel.DBError("The change was saved, but the local " +
+                f"copy could not be updated: {self.replica.error}")
+
+
+    def _on_replica_sync(self, changed_by_others):
+        """ Show changes other users made to the shared database.
+        """
+        self.db_status.set("")
+        if changed_by_others:
+            print("\ncontroller: Shared database changed: reloading...")
+            self.refresh_view()
+            self._populate_amendments()
+
+
+    def _on_replica_progress(self, done, total):
+        if done < total:
+            self.db_status.set(f"Syncing local copy: {done * 100 // total}%")
+
+
+    def _write_record(self, conn, func, values):
+        """ Call a DBModel write function in a transaction. Runs on 
+            the query executor thread.
+        """
+        conn = self._write_conn(conn)
+        with conn:
+            record_id = func(conn, values)
+        self._after_write()
+        return record_id
+
+
+    def _write_study(self, conn, func, values):
+        """ Write a study and patch it into the cache. Runs on the 
+            query executor thread.
+        """
+        study_id = self._write_record(conn, func, values)
+        self.cache.apply_study(conn, study_id)
+
+
+    def _save_record(self, name, values):
+        """ Write a study or amendment now, or queue it if 
+            write-behind is on. Returns True if the write was queued.
+        """
+        if not self.sessionpars['write_behind'].get():
+            func = getattr(self.db, name)
+            write = self._write_study if name.endswith('study') \
+                else self._write_amendment
+            self.executor.submit(write, func, values, 
+                errback=self._on_db_error)
+            return False
+
+        self.write_queue.put(name, values)
+        self._update_write_status()
+        if self._flush_after is None:
+            self._flush_after = self.after(
+                self.sessionpars['write_behind_ms'].get(), self.flush_writes)
+        return True
+
+
+    def flush_writes(self):
+        """ Write every queued edit in one transaction.
+        :return: the QueryJob, or None if nothing was queued
+        """
+        if self._flush_after is not None:
+            self.after_cancel(self._flush_after)
+            self._flush_after = None
+        if not len(self.write_queue):
+            return None
+
+        writes = self.write_queue.take()
+        self.write_status.set(f"Saving {len(writes)} edit(s)...")
+        return self.executor.submit(self._flush_writes, 
+            [write for _, write in writes],
+            callback=self._on_writes_flushed,
+            errback=lambda e: self._on_flush_error(writes, e))
+
+
+    def _flush_writes(self, conn, writes):
+        """ Write queued edits and patch them into the cache. Runs 
+            on the query executor thread.
+        """
+        results = self.db.write_batch(self._write_conn(conn), writes)
+        self._after_write()
+        for name, record_id, error in results:
+            if error is not None:
+                continue
+            if name.endswith('study'):
+                self.cache.apply_study(conn, record_id)
+            else:
+                self.cache.apply_amendment(conn, record_id)
+        return results
+
+
+    def _on_writes_flushed(self, results):
+        """ Show the written edits and report any that were 
+            rejected.
+        """
+        errors = [(name, record_id, error) 
+            for name, record_id, error in results if error is not None]
+        self._update_write_status()
+        self.refresh_view()
+        self._populate_amendments()
+        for name, record_id, error in errors:
+            kind = 'study' if name.endswith('study') else 'amendment'
+            what = f"{kind} {record_id}" if record_id else f"new {kind}"
+            print(f"controller: Could not save {what}: {error}")
+            self.show_error(error)
+
+
+    def _on_flush_error(self, writes, error):
+        """ Queue the edits again after the whole batch failed 
+            (e.g. the database stayed locked) and retry later.
+        """
+        self.write_queue.restore(writes)
+        self._update_write_status()
+        if self._flush_after is None:
+            self._flush_after = self.after(
+                self.sessionpars['write_behind_ms'].get(), self.flush_writes)
+        self._on_db_error(error)
+
+
+    def _update_write_status(self):
+        count = len(self.write_queue)
+        if count:
+            self.write_status.set(f"{count} edit(s) pending")
+        elif self.sessionpars['write_behind'].get():
+            self.write_status.set("All edits saved")
+
+
+    def _show_pending(self, name, record_id, vars, keys):
+        """ Load queued values of a record into vars, so an edit 
+            view never shows values older than the user's last edit.
+        :param keys: the vars keys, in the order of the queued values
+        :return: True if there were queued values
+        """
+        values = self.write_queue.pending(name, record_id)
+        if values is None:
+            return False
+        for key, value in zip(keys, values):
+            vars[key].set('' if value is None else value)
+        return True
+
+
+    def _on_db_busy(self, pending):
+        """ Show whether any database queries are in flight.
+        """
+        if pending:
+            self.db_status.set("Querying database...")
+        else:
+            self.db_status.set("")
+
+
+    def _on_db_error(self, error):
+        """ Report a failed database request.
+        """
+        print(f"controller: {error}")
+        self.show_error(error)
+
+
+    def show_error(self, error):
+        """ Show a dialog for an error raised by a model. Models 
+            raise typed exceptions instead of showing dialogs, so 
+            they can run off the Tk thread.
+        """
+        if isinstance(error, dbmodel.IntegrityViolation):
+            title, message = "Invalid Record", "Could not save record!"
+        elif isinstance(error, dbmodel.DatabaseLocked):
+            title, message = "Database Busy", "Could not complete request!"
+        elif isinstance(error, audiomodel.InvalidDeviceError):
+            title, message = "Invalid Audio Device", "Invalid audio device!"
+        elif isinstance(error, audiomodel.ClippingError):
+            title, message = "Clipping", "Audio would clip!"
+        else:
+            title, message = "Request Failed", "Could not complete request!"
+        messagebox.showerror(title=title, message=message, detail=f"{error}")
+
+        # Show where the signal clipped
+        if (isinstance(error, audiomodel.ClippingError) 
+            and error.audio is not None):
+            error.audio.plot_wave(error.signal, error.start)
+
+
+    def _report_update_status(self, checker):
+        """ Tell the user the outcome of a VersionChecker.
+        """
+        if checker.status == checker.STATUS_MANDATORY:
+            messagebox.showerror(
+                title="New Version Available",
+                message="Mandatory software update required!",
+                detail=f"You must download version {checker.latest} " +
+                    "to continue."
+            )
+        elif checker.status == checker.STATUS_AVAILABLE:
+            messagebox.showwarning(
+                title="New Version Available",
+                message="Software update available!",
+                detail=f"Please download {self.NAME} version " +
+                    f"{checker.latest}."
+            )
+        elif checker.status == checker.STATUS_UNREACHABLE:
+            messagebox.showwarning(
+                title="Cannot Reach Library",
+                message="Cannot check for updates!",
+                detail="The version library is unreachable. Please check " +
+                    "that you have access to Starfile and try again."
+            )
+        elif checker.status == checker.STATUS_NOT_FOUND:
+            messagebox.showerror(
+                title="Update Check Failed",
+                message="Could not check for updates!",
+                detail=f"'{self.NAME}' cannot be found in the version " +
+                    "library."
+            )
 
 
     def _quit(self):
         """ Disconnect device(s), if possible.
             Exit the application.
         """
+        # Finish queued writes before anything is closed
+        if not self._save_before_quit():
+            return
+
+        # Close database connections. A running export is cancelled.
+        stopped = self.export_executor.shutdown()
+        stopped = self.executor.shutdown() and stopped
+        if self.replica is not None:
+            self.replica.stop()
+        if stopped:
+            self.pool.close_all()
+
         # Quit app
         self.destroy()
 
 
+    def _save_before_quit(self):
+        """ Write queued edits and wait for the result.
+        :return: True if it is safe to quit
+        """
+        job = self.flush_writes()
+        if job is None:
+            return True
+
+        print("\ncontroller: Saving pending edits before quitting...")
+        if not self.executor.wait(job, self.QUIT_FLUSH_S):
+            # Still running: its callback or errback will report it
+            messagebox.showwarning(title="Edits Not Saved",
+                message="Your pending edits are still being saved.",
+                detail="The database may be locked by another user. " +
+                    "Try quitting again in a moment.")
+            return False
+        if job.error is not None:
+            # The errback queues the edits again and retries
+            messagebox.showwarning(title="Edits Not Saved",
+                message="Your pending edits could not be saved, so " +
+                    "the application will stay open.",
+                detail=f"{job.error}\n\nThe edits will be retried. " +
+                    "Quit again once they have been saved.")
+            return False
+
+        rejected = [x for x in job.result if x[2] is not None]
+        if rejected:
+            return messagebox.askokcancel(title="Edits Rejected",
+                message=f"{len(rejected)} edit(s) were rejected by the " +
+                    "database and will be lost. Quit anyway?",
+                detail='\n'.join(str(x[2]) for x in rejected[:10]))
+        return True
+
+
     #######################
     # File Menu Functions #
     #######################
@@ -247,12 +685,108 @@ class Application(tk.Tk):
             self._amendvars[var].set('')
 
         self._amendvars['amend_id'].set(0)
+        self._amendvars['study_id'].set(0)
         
         # Create and display window
         print('\ncontroller: Calling new amendment view')
-        amendment_recordview.AmendmentRecordView(self, 'new', self._amendvars, self.all_studies)
+        amendment_recordview.AmendmentRecordView(self, 'new', 
+            self._amendvars, self.study_index)
         
 
+    def import_records(self, kind):
+        """ Bulk import studies or amendments from a CSV or Excel
+            file in the background.
+        :param kind: 'studies' or 'amendments'
+        """
+        path = filedialog.askopenfilename(
+            title=f"Import {kind.title()}",
+            filetypes=[('CSV or Excel files', '*.csv *.xlsx *.xlsm'), 
+                ('All files', '*.*')])
+        if not path:
+            return
+
+        print(f"\ncontroller: Importing {kind} from {path}")
+        func = {'studies': self.importer.import_studies,
+            'amendments': self.importer.import_amendments}[kind]
+        self.executor.submit(self._import_file, func, path, 
+            callback=self._on_import_done, errback=self._on_db_error)
+
+
+    def _import_file(self, conn, func, path):
+        """ Run an import. Runs on the query executor thread.
+        """
+        try:
+            return func(self._write_conn(conn), path)
+        finally:
+            self._after_write()
+            # Local writes do not change data_version: reload the 
+            # cache from the database
+            self.cache.invalidate()
+
+
+    def _on_import_done(self, report):
+        """ Show the import report and redraw the views.
+        """
+        importreportview.ImportReportView(self, report)
+        self.refresh_view()
+        if self._amendvars['study_id'].get():
+            self._populate_amendments()
+
+
+    def show_export_view(self):
+        """ Show the export window.
+        """
+        print('\ncontroller: Calling export view')
+        if self.exportview is not None and self.exportview.winfo_exists():
+            self.exportview.lift()
+            return
+        columns = {kind: self.exporter.columns(kind) 
+            for kind in ('studies', 'amendments')}
+        self.exportview = exportview.ExportView(self, columns)
+
+
+    def export_records(self):
+        """ Export records in the background with the export view 
+            settings.
+        """
+        view = self.exportview
+        print(f"\ncontroller: Exporting {view.kind.get()} to {view.path}")
+        # Progress is reported from the export thread
+        progress = lambda done, total: self.export_executor.call_soon(
+            self._on_export_progress, done, total)
+        self._export_job = self.export_executor.submit(self.exporter.export, 
+            view.kind.get(), view.path, view.selected_columns(), 
+            view.filter.get() == 'open', progress,
+            callback=self._on_export_done, errback=self._on_export_error,
+            key='export')
+
+
+    def cancel_export(self):
+        if self._export_job is not None:
+            self.export_executor.cancel(self._export_job)
+            self._export_job = None
+        if self.exportview is not None and self.exportview.winfo_exists():
+            self.exportview.finish("Export cancelled")
+
+
+    def _on_export_progress(self, done, total):
+        if self.exportview is not None and self.exportview.winfo_exists():
+            self.exportview.set_progress(done, total)
+
+
+    def _on_export_done(self, count):
+        self._export_job = None
+        if self.exportview is not None and self.exportview.winfo_exists():
+            self.exportview.finish(f"Exported {count} rows")
+
+
+    def _on_export_error(self, error):
+        self._export_job = None
+        if self.exportview is not None and self.exportview.winfo_exists():
+            self.exportview.finish("Export failed")
+        self._on_db_error(error)
+
+
     def show_new_study_view(self):
         """ Show record view
         """
@@ -265,7 +799,7 @@ class Application(tk.Tk):
         # Create and display window
         print('\ncontroller: Calling new study view')
         study_recordview.StudyView(self, 'new', self._studyvars, 
-            self.researchers)
+            self.researcher_index, self.active_researchers)
 
 
     ############################
@@ -289,117 +823,267 @@ class Application(tk.Tk):
         """
         # Create and display window
         print('\ncontroller: Calling edit study view')
+        if self._show_pending('update_study', 
+            self._studyvars['study_id'].get(), self._studyvars, 
+            ['irb_ref', 'study_name', 'study_type', 'researcher_id', 
+            'date_created', 'date_closed']):
+            # Queued values hold the researcher id: show the name
+            researcher = self._studyvars['researcher_id'].get()
+            if researcher.isdigit():
+                self._studyvars['researcher_id'].set(
+                    self.researcher_index.name(int(researcher)) or researcher)
         study_recordview.StudyView(self, 'edit', self._studyvars, 
-            self.researchers)
+            self.researcher_index, self.active_researchers)
+
+
+    def search_records(self):
+        """ Full-text search studies and amendments in the 
+            background. A newer search supersedes one in progress;
+            an empty one finds nothing, so clearing the search box
+            also drops the results of a search still running.
+        """
+        self.executor.submit(self.db.search, self.mainview.search_var.get(),
+            callback=self.mainview.show_search_results, 
+            errback=self._on_db_error, key='search')
+
+
+    def open_search_result(self):
+        """ Open the study or amendment chosen from the search 
+            results.
+        """
+        kind, ref_id, study_id = self.mainview.search_selection
+        if kind == 'study':
+            self.executor.submit(self.db.select_study, [ref_id],
+                callback=self._on_search_study, errback=self._on_db_error)
+            return
+
+        # Show the amendment on the Amendments tab
+        if self.study_index.name(study_id) is not None:
+            self._amendvars['study_name'].set(
+                self.study_index.label(study_id))
+        self._amendvars['study_id'].set(study_id)
+        self.notebook.select(self.amendmentview)
+        self._populate_amendments(select=ref_id)
+
+
+    def _on_search_study(self, rows):
+        if not rows:
+            return
+        # Load study details into _studyvars
+        rows[0].set_vars(self._studyvars)
+        self.show_edit_study_view()
 
 
     #################################
     # Amendments Tab View Functions #
     #################################
-    def _populate_amendments(self):
+    def _populate_amendments(self, select=None):
         """ Get list of amendments for selected study.
+        :param select: amend_id to select once the list is loaded
+        """
+        self.executor.submit(self._query_amendments,
+            self._amendvars['study_id'].get(),
+            callback=lambda rows: self._on_amendments(rows, select), 
+            errback=self._on_db_error, key='amendments')
+
+
+    def _query_amendments(self, conn, study_id):
+        """ Get amendments for the selected study. Runs on the query 
+            executor thread.
+        """
+        # Get amendments from cache
+        self.cache.refresh(conn)
+        return self.cache.amendments.get(study_id, [])
+
+
+    def _on_amendments(self, rows, select=None):
+        """ Load queried amendments into the amendment tree.
         """
-        # Get study id based on name of selected study
-        id = self.db.get_studyid_from_name(self.conn, 
-            [self._amendvars['study_name'].get()])
-        # Extract id from [(int,)]
-        id = id[0][0]
-
-        # Call select amendments query
-        with self.conn:
-            rows = self.db.select_amendments(self.conn, [id])
-        # Drop final value from each tuple
-        amendments = [x[0:4] for x in rows]
         # Populate tree with amendments
-        self.amendmentview._populate_tree(amendments)
+        self.amendmentview._populate_tree(rows)
+
+        # Selecting an amendment opens it for editing
+        tree = self.amendmentview.tree
+        if select is not None and tree.exists(str(select)):
+            tree.see(str(select))
+            tree.selection_set(str(select))
+
+
+    def _write_amendment(self, conn, func, vals):
+        """ Write an amendment and patch it into the cache. Runs on 
+            the query executor thread.
+        """
+        amend_id = self._write_record(conn, func, vals)
+        self.cache.apply_amendment(conn, amend_id)
 
 
     def show_edit_amendment_view(self):
         # Create and display window
         print('\ncontroller: Calling edit amendment view')
+        self._show_pending('update_amendment', 
+            self._amendvars['amend_id'].get(), self._amendvars, 
+            ['submit_date', 'approval_date', 'rationale'])
         amendment_recordview.AmendmentRecordView(self, 'edit', 
-            self._amendvars, self.all_studies)
+            self._amendvars, self.study_index)
         
 
+    ##############################
+    # Reports Tab View Functions #
+    ##############################
+    def _on_tab_changed(self):
+        if self.notebook.select() == str(self.reportsview):
+            self.refresh_reports()
+
+
+    def refresh_reports(self):
+        """ Compute the reports in the background. The arrays are 
+            only reloaded if the database has changed.
+        """
+        self.reportsview.set_loading()
+        self.executor.submit(self._get_report, 
+            callback=self.reportsview.show_report, 
+            errback=self._on_db_error, key='report')
+
+
+    def _get_report(self, conn):
+        """ Runs on the query executor thread.
+        """
+        self.analytics.refresh(conn)
+        return self.analytics.report()
+
+
     ###############################
     # Study Record View Functions #
     ###############################
-    def _get_researcher_id_from_name(self):
-        # Replace researcher full name with id
-        try:
-            id = int(self.researchers[self._studyvars['researcher_id'].get()])
-            self._studyvars['researcher_id'].set(id)
-        except KeyError:
-            pass
-
+    def _get_researcher_id_from_name(self, study):
+        # Replace researcher full name with id (None if unknown)
+        return self.researcher_index.lookup(study.researcher)
 
-    def _create_list_from_vars(self, vars):
-        # Create list of _studyvars values
-        vals = []
-        for var in vars:
-            # Check for NULLs
-            x = vars[var].get()
-            if (x == "None") or (x == ""):
-                x = None
-            vals.append(x)
 
-        return vals
+    def _check_researcher(self, study, researcher_id):
+        """ Report a study with no researcher selected, or one whose
+            name does not match a researcher. The name is never 
+            written in place of the id.
+        :return: True if the study can be saved
+        """
+        if researcher_id is not None:
+            return True
+        if study.researcher is None:
+            detail = "Please select a researcher for the study."
+        else:
+            detail = (f"'{study.researcher}' does not match exactly one " +
+                "researcher. Please select a researcher from the list.")
+        messagebox.showerror(
+            title="Request Failed",
+            message="Could not complete request!",
+            detail=detail
+        )
+        return False
 
 
     def _prepare_study_vars(self):
-        # Convert full name to researcher id
-        self._get_researcher_id_from_name()
+        """ Return the study in _studyvars and its researcher id.
+        """
+        study = recordmodel.Study.from_vars(self._studyvars)
+        return study, self._get_researcher_id_from_name(study)
+    
+
+    def load_study_page(self):
+        """ Fetch the next page of studies for the Studies tree.
+        """
+        self.executor.submit(self.db.select_studies_page, 
+            self.mainview.last_key, callback=self._on_study_page, 
+            errback=self._on_study_page_error, key='study_page')
 
-        # Create list of vars
-        vals = self._create_list_from_vars(self._studyvars)
 
-        # Move study_id from first position to last in list
-        vals = vals[1:] + [vals[0]]
+    def _on_study_page(self, rows):
+        self.mainview.append_rows(rows, self.db.PAGE_SIZE)
+
+
+    def _on_study_page_error(self, error):
+        self.mainview.loading = False
+        self._on_db_error(error)
 
-        return vals
-    
 
     def refresh_view(self):
-        # Repull generic values
-        self._get_record_values()
+        """ Repull generic values in the background. The views are 
+            redrawn when they arrive.
+        """
+        # Reload as many studies as are already shown (at least one 
+        # page) so the tree keeps its length
+        count = max(len(self.mainview.tree.get_children()), 
+            self.db.PAGE_SIZE)
+        # Don't request more pages until the reload arrives
+        self.mainview.loading = True
+        self.executor.submit(self.db.select_studies_page, None, count,
+            callback=lambda rows: self._on_study_pages(rows, count), 
+            errback=self._on_study_page_error, key='study_page')
+
+        self.executor.submit(self._get_record_values,
+            callback=self._on_record_values, errback=self._on_db_error,
+            key='records')
+
+
+    def _on_record_values(self, values):
+        """ Redraw views with freshly queried records.
+        """
+        (self.open_studies, self.all_studies, self.study_index, 
+            self.researcher_index, self.active_researchers, 
+            self.study_counts) = values
 
-        self.open_study_count.set(f"Open Studies: {len(self.open_studies)}")
-        self.total_study_count.set(f"Total Studies: {len(self.all_studies)}")
+        self._update_study_counts()
 
-        # Delete data from mainview tree
-        for row in self.mainview.tree.get_children():
-            self.mainview.tree.delete(row)
+        # Update amendment study list
+        self.amendmentview.set_studies(self.study_index)
 
-        # Load data into tree
-        for row in self.all_studies:
-            self.mainview.tree.insert('', tk.END, values=row)
+        # Keep visible reports current
+        self._on_tab_changed()
 
 
-    def create_new_study(self):
-        # Prepare study vars for database
-        vals = self._prepare_study_vars()
+    def _on_study_pages(self, rows, count):
+        """ Replace the Studies tree with freshly queried rows.
+        """
+        self.mainview.reload_rows(rows, count, 
+            on_progress=self._on_tree_progress)
+
 
-        # Drop study_id from list
-        vals.pop(6)
+    def _on_tree_progress(self, done, total):
+        """ Show Studies tree loading progress in the count labels.
+        """
+        if done < total:
+            self.total_study_count.set(
+                f"Total Studies: loading {done} of {total}...")
+        else:
+            self._update_study_counts()
 
-        # Update record
-        with self.conn:
-            self.db.create_study(self.conn, vals)
 
-        # Refresh record tree
-        self.refresh_view()
+    def _update_study_counts(self):
+        self.open_study_count.set(f"Open Studies: {self.study_counts[0]}")
+        self.total_study_count.set(f"Total Studies: {self.study_counts[1]}")
+
+
+    def create_new_study(self):
+        # Prepare study vars for database
+        study, researcher_id = self._prepare_study_vars()
+        if not self._check_researcher(study, researcher_id):
+            return
+        vals = study.create_values(researcher_id)
+
+        # Create record, then refresh record tree
+        if not self._save_record('create_study', vals):
+            self.refresh_view()
 
 
     def save_study_edits(self):
         # Prepare _studyvars for database
-        vals = self._prepare_study_vars()
-
-        # Update record
-        with self.conn:
-            self.db.update_study(self.conn, vals)
+        study, researcher_id = self._prepare_study_vars()
+        if not self._check_researcher(study, researcher_id):
+            return
+        vals = study.update_values(researcher_id)
 
-        # Refresh record tree
-        self.refresh_view()
+        # Update record, then refresh record tree
+        if not self._save_record('update_study', vals):
+            self.refresh_view()
 
 
     ####################################
@@ -407,57 +1091,39 @@ class Application(tk.Tk):
     ####################################
     def save_amendment_edits(self):
         # Prepare _amendvars for database
-        vals = self._create_list_from_vars(self._amendvars)
-
-        # Remove study name
-        vals.pop(0)
-
-        # Get study id based on name of selected study
-        id = self.db.get_studyid_from_name(self.conn, 
-            [self._amendvars['study_name'].get()])
-        # Extract id from [(int,)]
-        id = id[0][0]
+        amendment = recordmodel.Amendment.from_vars(self._amendvars)
+        vals = amendment.update_values()
 
-        # Add study id to end of values list
-        vals.append(id)
-
-        # Move amend_id from first position to last in list
-        vals = vals[1:] + [vals[0]]
-
-        # Update record
-        with self.conn:
-            self.db.update_amendment(self.conn, vals)
-
-        # Refresh amendment tree
-        self._populate_amendments()
+        # Update record, then refresh amendment tree and the study 
+        # rows and counts that include it
+        if not self._save_record('update_amendment', vals):
+            self.refresh_view()
+            self._populate_amendments()
 
 
     def create_new_amendment(self):
         print("\ncontroller: Creating new amendment...")
-        # Prepare _amendvars for database
-        vals = self._create_list_from_vars(self._amendvars)
-
-        # Get study id based on name of selected study
-        id = self.db.get_studyid_from_name(self.conn, 
-            [self._amendvars['study_name'].get()])
-        # Extract id from [(int,)]
-        id = id[0][0]
+        # Amendments must belong to a study
+        if not self._amendvars['study_id'].get():
+            messagebox.showerror(
+                title="Request Failed",
+                message="Could not complete request!",
+                detail="Please select a study for the new amendment."
+            )
+            return
 
-        # Add study id to end of values list
-        vals.append(id)
-
-        # Remove study name and empty amend_id from list
-        vals = vals[2:]
+        # Prepare _amendvars for database
+        amendment = recordmodel.Amendment.from_vars(self._amendvars)
+        vals = amendment.create_values()
 
         print("\nAmendment values to be sent to database as new amendment.")
         print(vals)
 
-        # Create amendment
-        with self.conn:
-            self.db.create_amendment(self.conn, vals)
-
-        # Refresh amendment tree
-        self._populate_amendments()
+        # Create amendment, then refresh amendment tree and the study
+        # rows and counts that include it
+        if not self._save_record('create_amendment', vals):
+            self.refresh_view()
+            self._populate_amendments()
 
 
     ############################
@@ -491,6 +1157,86 @@ class Application(tk.Tk):
             self.sessionpars_model.save()
 
 
+    ########################
+    # Tools Menu Functions #
+    ########################
+    def show_settings(self):
+        """ Show the write-behind and local copy settings.
+        """
+        print("\ncontroller: Calling database settings dialog")
+        settingsview.SettingsDialog(self, self.sessionpars)
+
+
+    def _on_settings_submit(self):
+        """ Save the settings. Edits already queued are written now
+            if write-behind was turned off.
+        """
+        self._save_sessionpars()
+        if not self.sessionpars['write_behind'].get():
+            self.flush_writes()
+
+
+    def show_query_stats(self):
+        """ Show the slowest database queries.
+        """
+        print("\ncontroller: Calling query statistics view")
+        querystatsview.QueryStatsView(self, self.query_stats)
+
+
+    def check_stimuli(self):
+        """ Check the session's audio files folder in the background.
+        """
+        if self.stimulusview is not None and self.stimulusview.winfo_exists():
+            self.stimulusview.lift()
+            return
+        folder = self.sessionpars['audio_files_path'].get()
+        if not os.path.isdir(folder):
+            folder = filedialog.askdirectory(title="Audio File Directory")
+            if not folder:
+                return
+            self.sessionpars['audio_files_path'].set(folder)
+
+        print(f"\ncontroller: Checking stimuli in {folder}")
+        self.stimulusview = stimulusview.StimulusView(self, folder)
+        max_channels = audiomodel.device_outputs(
+            self.sessionpars['audio_device'].get())
+        # The analysis waits on its worker processes: keep it off the
+        # Tk thread and the query executor
+        threading.Thread(target=self._run_stimulus_check,
+            args=(folder, max_channels), name='StimulusCheck',
+            daemon=True).start()
+
+
+    def _run_stimulus_check(self, folder, max_channels):
+        """ Run a stimulus check. Runs on its own thread; results 
+            are passed back to the Tk thread by the query executor.
+        """
+        progress = lambda stage, done, total: self.executor.call_soon(
+            self._on_stimulus_progress, stage, done, total)
+        try:
+            report = stimulusmodel.StimulusAnalyzer(folder).run(
+                max_channels=max_channels, progress=progress)
+        except Exception as e:
+            print(f"controller: Stimulus check failed: {e}")
+            self.executor.call_soon(self._on_stimulus_done, None, e)
+        else:
+            self.executor.call_soon(self._on_stimulus_done, report, None)
+
+
+    def _on_stimulus_progress(self, stage, done, total):
+        if self.stimulusview is not None and self.stimulusview.winfo_exists():
+            self.stimulusview.set_progress(stage, done, total)
+
+
+    def _on_stimulus_done(self, report, error):
+        if self.stimulusview is None or not self.stimulusview.winfo_exists():
+            return
+        if error is not None:
+            self.stimulusview.finish(f"Stimulus check failed: {error}")
+        else:
+            self.stimulusview.show_report(report)
+
+
     #######################
     # Help Menu Functions #
     #######################
@@ -522,5 +1268,7 @@ class Application(tk.Tk):
 
 
 if __name__ == "__main__":
+    # Stimulus checks start worker processes, also from a frozen app
+    multiprocessing.freeze_support()
     app = Application()
     app.mainloop()
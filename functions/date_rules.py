@@ -0,0 +1,38 @@
+""" Date rules shared by the DateEntry widget and the bulk importer.
+    Dates are ISO strings: YYYY-MM-DD.
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+from datetime import datetime
+
+
+#########
+# Funcs #
+#########
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def valid_date_char(index, char):
+    """ Check one typed character of a date at position index.
+    """
+    if index in (4, 7):
+        return char == '-'
+    if 0 <= index < 10:
+        return char.isdigit()
+    return False
+
+
+def is_valid_date(text):
+    """ Check a complete date string.
+    """
+    if len(text) != 10 or not all(
+        valid_date_char(ii, char) for ii, char in enumerate(text)):
+        return False
+    try:
+        datetime.strptime(text, DATE_FORMAT)
+    except ValueError:
+        return False
+    return True
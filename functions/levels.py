@@ -0,0 +1,241 @@
+""" Level functions for audio signals. Signals are arrays of samples
+    by channels (a 1-D array is one channel). Every function works on
+    all channels at once, for any number of channels.
+
+    Results keep the signal's float type: gains and offsets are
+    converted to float32 for a float32 signal, so no float64 copy of
+    the signal is made (integer signals are scaled as float64). Pass
+    dtype to choose the type, and out to write the result into an
+    existing array, such as the signal itself.
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+
+# Import system packages
+from collections import namedtuple
+
+
+#########
+# Funcs #
+#########
+# Per-channel measurements (float64 arrays). low and high are the
+# smallest and largest samples; peak is the largest magnitude.
+ChannelStats = namedtuple('ChannelStats',
+    ['frames', 'dc', 'rms', 'peak', 'low', 'high'])
+
+# stats() measures a signal in chunks of about this many bytes, so
+# each chunk is read from memory once and stays in the CPU cache for
+# the rest of its measurements
+CHUNK_BYTES = 2**18
+
+# NumPy reduces short rows slowly: blocks with few channels are
+# measured as rows of at least this many samples (several frames per
+# row), then the frames in each row are combined
+FOLD_SAMPLES = 256
+
+
+def db2mag(db, dtype=np.float64):
+    """ Convert decibels to magnitude. Takes a number or an array.
+    """
+    db = np.asarray(db, dtype)
+    return np.power(db.dtype.type(10), db / db.dtype.type(20))
+
+
+def mag2db(mag, dtype=np.float64):
+    """ Convert magnitude to decibels. Takes a number or an array.
+        Zero is -inf.
+    """
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(np.asarray(mag, dtype))
+
+
+def _as_2d(sig):
+    """ View a 1-D signal as one column.
+    """
+    sig = np.asarray(sig)
+    return sig.reshape(len(sig), -1) if sig.ndim == 1 else sig
+
+
+def _float_type(sig, dtype):
+    if dtype is not None:
+        return np.dtype(dtype)
+    if sig.dtype.kind == 'f':
+        return sig.dtype
+    return np.dtype(np.float64)
+
+
+def stats_blocks(blocks, channels=0):
+    """ Measure every channel of a signal given as consecutive blocks
+        (e.g. SoundFile.blocks()), in one pass.
+    :param channels: number of channels, for a signal with no blocks
+    :return: ChannelStats
+    """
+    frames = 0
+    total = squares = low = high = None
+    for block in blocks:
+        block = _as_2d(block)
+        if block.dtype.kind != 'f':
+            # Squares of integer samples overflow
+            block = block.astype(np.float64)
+        if total is None:
+            channels = block.shape[1]
+            total = np.zeros(channels)
+            squares = np.zeros(channels)
+            low = np.full(channels, np.inf)
+            high = np.full(channels, -np.inf)
+        frames += len(block)
+        for part, in _fold(block):
+            # Rows of part are one or more whole frames
+            width = part.shape[1] // channels
+            total += part.sum(axis=0, dtype=np.float64).reshape(
+                width, channels).sum(axis=0)
+            squares += np.einsum('ij,ij->j', part, part).reshape(
+                width, channels).sum(axis=0)
+            np.minimum(low, part.min(axis=0).reshape(
+                width, channels).min(axis=0), out=low)
+            np.maximum(high, part.max(axis=0).reshape(
+                width, channels).max(axis=0), out=high)
+
+    if not frames:
+        zeros = np.zeros(channels)
+        return ChannelStats(0, zeros, zeros, zeros, zeros, zeros)
+    return ChannelStats(frames, total / frames, np.sqrt(squares / frames),
+        np.maximum(high, -low), low, high)
+
+
+def _fold(*blocks):
+    """ Split blocks of the same shape into parts without copying: 
+        as many frames as possible viewed as rows of about 
+        FOLD_SAMPLES samples, and the frames left over.
+    :return: list of tuples of parts, one part per block
+    """
+    frames, channels = blocks[0].shape
+    width = FOLD_SAMPLES // max(channels, 1)
+    if width < 2 or not all(x.flags.c_contiguous for x in blocks):
+        return [blocks] if frames else []
+    whole = frames // width * width
+    parts = []
+    if whole:
+        parts.append(tuple(x[:whole].reshape(-1, width * channels)
+            for x in blocks))
+    if whole < frames:
+        parts.append(tuple(x[whole:] for x in blocks))
+    return parts
+
+
+def stats(sig):
+    """ Measure every channel of a signal in one pass.
+    :return: ChannelStats
+    """
+    sig = _as_2d(sig)
+    if (sig.shape[1] > 1 and sig.flags.f_contiguous 
+        and not sig.flags.c_contiguous):
+        # Channel by channel, each one contiguous (e.g. the transpose
+        # of a channels by samples array)
+        channels = [stats(sig[:, ii]) for ii in range(sig.shape[1])]
+        return ChannelStats(len(sig), *(np.concatenate(x)
+            for x in list(zip(*channels))[1:]))
+    step = max(1024, CHUNK_BYTES // max(sig.itemsize * sig.shape[1], 1))
+    return stats_blocks((sig[ii:ii + step]
+        for ii in range(0, len(sig), step)), sig.shape[1])
+
+
+def rms(sig):
+    """ Root mean square of each channel.
+    """
+    return stats(sig).rms
+
+
+def peak(sig):
+    """ Largest magnitude in the whole signal, without an abs() copy
+        of it.
+    """
+    sig = np.asarray(sig)
+    if not sig.size:
+        return 0.0
+    return float(max(sig.max(), -sig.min()))
+
+
+def apply_gain(sig, gain, offset=None, out=None, dtype=None):
+    """ Return (sig - offset) * gain. gain and offset are numbers or
+        one value per channel.
+    :param out: array to write the result to (may be sig)
+    """
+    sig = np.asarray(sig)
+    ftype = _float_type(sig, dtype)
+    if out is None:
+        out = np.empty(sig.shape, ftype)
+    gain = np.asarray(gain, ftype)
+    if offset is not None:
+        offset = np.asarray(offset, ftype)
+
+    channels = _as_2d(sig).shape[1]
+    for src, dst in _fold(_as_2d(sig), _as_2d(out)):
+        # Repeat per-channel values across folded rows
+        width = src.shape[1] // channels
+        row_gain = np.tile(gain, width) if gain.ndim else gain
+        if offset is not None:
+            np.subtract(src, np.tile(offset, width) if offset.ndim 
+                else offset, out=dst)
+            src = dst
+        np.multiply(src, row_gain, out=dst)
+    return out
+
+
+def remove_dc(sig, out=None, dtype=None):
+    """ Subtract the mean of each channel.
+    """
+    ftype = _float_type(sig, dtype)
+    if out is None:
+        out = np.empty(np.shape(sig), ftype)
+    return np.subtract(sig, stats(sig).dc.astype(ftype), out=out)
+
+
+def normalization(channel_stats, channels=None):
+    """ Per-channel offset and gain for normalize(): the DC offset,
+        and a gain that brings the peak after removing it to
+        1 / channels. A channel with no peak once its offset is
+        removed is given a gain as if its peak were 1.
+    :param channels: number of channels the level is shared by
+        (default: every measured channel)
+    :return: (offset, gain) float64 arrays
+    """
+    st = channel_stats
+    if channels is None:
+        channels = len(st.dc)
+    # Peak after removing the DC offset
+    ac_peak = np.maximum(st.high - st.dc, st.dc - st.low)
+    ac_peak[~(ac_peak > 0)] = 1
+    return st.dc, 1 / (ac_peak * channels)
+
+
+def normalize(sig, channels=None, out=None, dtype=None):
+    """ Remove each channel's DC offset and scale its peak to
+        1 / channels, so the channels can be summed without clipping.
+    """
+    offset, gain = normalization(stats(sig), channels)
+    return apply_gain(sig, gain, offset, out, dtype)
+
+
+def set_rms(sig, level, equalize=False, out=None, dtype=None):
+    """ Scale a signal to an RMS level in dB (re: full scale = 1).
+
+        By default every channel gets the same gain, chosen so the
+        mean of the channel levels in dB is level: level differences
+        between channels (e.g. an ILD) are kept. With equalize, each
+        channel is set to level on its own. Silent channels are left
+        alone and not counted.
+    """
+    db = mag2db(rms(sig))
+    audible = np.isfinite(db)
+    if equalize:
+        gain_db = np.where(audible, level - db, 0.0)
+    elif audible.any():
+        gain_db = level - db[audible].mean()
+    else:
+        gain_db = 0.0
+    return apply_gain(sig, db2mag(gain_db), out=out, dtype=dtype)
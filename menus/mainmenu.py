@@ -47,6 +47,24 @@ class MainMenu(tk.Menu):
             accelerator='Ctrl+S'
         )
         file_menu.add_separator()
+        file_menu.add_command(
+            label="Import Studies...",
+            command=self._event('<<FileImportStudies>>')
+        )
+        file_menu.add_command(
+            label="Import Amendments...",
+            command=self._event('<<FileImportAmendments>>')
+        )
+        file_menu.add_command(
+            label="Export...",
+            command=self._event('<<FileExport>>')
+        )
+        file_menu.add_separator()
+        file_menu.add_command(
+            label="Save Pending Edits",
+            command=self._event('<<FileSaveEdits>>')
+        )
+        file_menu.add_separator()
         file_menu.add_command(
             label="Quit",
             command=self._event('<<FileQuit>>'),
@@ -58,6 +76,21 @@ class MainMenu(tk.Menu):
         ############## 
         # Tools menu #
         ##############
+        tools_menu = tk.Menu(self, tearoff=False)
+        tools_menu.add_command(
+            label="Query Statistics...",
+            command=self._event('<<ToolsQueryStats>>')
+        )
+        tools_menu.add_command(
+            label="Check Stimuli...",
+            command=self._event('<<ToolsCheckStimuli>>')
+        )
+        tools_menu.add_separator()
+        tools_menu.add_command(
+            label="Database Settings...",
+            command=self._event('<<ToolsSettings>>')
+        )
+        self.add_cascade(label='Tools', menu=tools_menu)
 
 
         #############
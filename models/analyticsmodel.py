@@ -0,0 +1,344 @@
+""" Study and amendment analytics. Studies and amendments are held
+    as columns in NumPy arrays: dates as int64 day numbers, study
+    type and researcher as integer category codes. Reports are
+    computed from whole columns at once instead of row by row.
+
+    The arrays are rebuilt only when the database has changed.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+
+# Import system packages
+from collections import namedtuple
+
+
+#########
+# BEGIN #
+#########
+# Report sections
+LagSummary = namedtuple('LagSummary',
+    ['count', 'pending', 'mean', 'percentiles'])
+AgeingSummary = namedtuple('AgeingSummary',
+    ['count', 'undated', 'median', 'oldest', 'bins'])
+Workload = namedtuple('Workload',
+    ['researcher', 'open', 'total', 'amendments', 'per_study',
+    'median_lag'])
+YearSummary = namedtuple('YearSummary',
+    ['year', 'created', 'closed', 'amendments', 'per_study',
+    'median_lag'])
+TypeSummary = namedtuple('TypeSummary', ['study_type', 'open', 'total'])
+Report = namedtuple('Report',
+    ['studies', 'open', 'amendments', 'lag', 'ageing', 'workload',
+    'years', 'types', 'today'])
+
+
+class AnalyticsModel:
+    """ Columnar snapshot of studies and amendments, plus the
+        reports computed from it.
+
+        Like StudyCache, the snapshot is reloaded when PRAGMA
+        data_version shows that another connection has committed.
+        Local writes do not change data_version: call invalidate()
+        after them. Always pass the same connection (the query
+        executor's).
+
+        Arrays are replaced, never modified in place.
+    """
+    # Approval lag percentiles
+    PERCENTILES = (25, 50, 75, 90, 95)
+
+    # Open study age bins, in days: (upper bound, label)
+    AGE_BINS = ((90, "Under 3 months"), (180, "3-6 months"),
+        (365, "6-12 months"), (730, "1-2 years"), (1825, "2-5 years"),
+        (None, "Over 5 years"))
+
+    def __init__(self, db):
+        self.db = db
+        self.no_day = db.NO_DAY
+
+        # Study columns, sorted by study_id
+        self.study_id = np.zeros(0, np.int64)
+        self.created = np.zeros(0, np.int64)
+        self.closed = np.zeros(0, np.int64)
+        # Category codes, and the value of each code
+        self.study_type = np.zeros(0, np.intp)
+        self.type_names = []
+        self.researcher = np.zeros(0, np.intp)
+        self.researcher_names = []
+
+        # Amendment columns. amend_study is the row of each
+        # amendment's study in the study columns, or -1.
+        self.amend_study = np.zeros(0, np.intp)
+        self.submitted = np.zeros(0, np.int64)
+        self.approved = np.zeros(0, np.int64)
+
+        # Watermark
+        self._conn_id = None
+        self._data_version = None
+
+
+    ######################
+    # Snapshot Functions #
+    ######################
+    def is_stale(self, conn):
+        """ Check whether the database has changed since the last load.
+        """
+        if self._conn_id != id(conn):
+            return True
+        return self.db.get_data_version(conn) != self._data_version
+
+
+    def invalidate(self):
+        """ Force a full reload on the next refresh.
+        """
+        self._data_version = None
+
+
+    def refresh(self, conn):
+        """ Reload the arrays if they are stale.
+        :return: True if the arrays were reloaded
+        """
+        if not self.is_stale(conn):
+            print("\nanalyticsmodel: Arrays are current")
+            return False
+
+        self.reload(conn)
+        return True
+
+
+    def reload(self, conn):
+        """ Load studies and amendments into arrays.
+        """
+        print("\nanalyticsmodel: Loading arrays...")
+        with self.db.wait_for_locks(conn), conn:
+            # Read every table from one consistent snapshot
+            conn.execute("BEGIN")
+            data_version = self.db.get_data_version(conn)
+            studies = self.db.select_study_columns(conn)
+            amendments = self.db.select_amendment_columns(conn)
+            names = dict((x.researcher_id, x.name)
+                for x in self.db.select_all_researchers(conn))
+
+        count = len(studies)
+        study_id, study_type, researcher, created, closed = (
+            self._columns(studies, 5))
+
+        # Category codes, in order of first appearance
+        types = {}
+        type_codes = np.fromiter((types.setdefault(x, len(types))
+            for x in study_type), np.intp, count)
+        researcher_ids, researcher_codes = np.unique(
+            np.fromiter(researcher, np.int64, count), return_inverse=True)
+
+        study_ids = np.fromiter(study_id, np.int64, count)
+        amend_study, submitted, approved = self._columns(amendments, 3)
+        amend_study = self._study_rows(study_ids,
+            np.fromiter(amend_study, np.int64, len(amendments)))
+
+        self.study_id = study_ids
+        self.created = np.fromiter(created, np.int64, count)
+        self.closed = np.fromiter(closed, np.int64, count)
+        self.study_type = type_codes
+        self.type_names = [x or '' for x in types]
+        # np.unique can return a 2-D inverse for 1-D input
+        self.researcher = researcher_codes.reshape(-1)
+        self.researcher_names = [names.get(int(x), '')
+            for x in researcher_ids]
+        self.amend_study = amend_study
+        self.submitted = np.fromiter(submitted, np.int64, len(amendments))
+        self.approved = np.fromiter(approved, np.int64, len(amendments))
+        self._conn_id = id(conn)
+        self._data_version = data_version
+        print(f"analyticsmodel: Loaded {count} studies and " +
+            f"{len(amendments)} amendments")
+
+
+    @staticmethod
+    def _columns(rows, width):
+        """ Split rows into width columns (empty if there are no
+            rows).
+        """
+        return list(zip(*rows)) if rows else [()] * width
+
+
+    @staticmethod
+    def _study_rows(study_ids, ids):
+        """ Map study ids to their row in the (sorted) study columns,
+            or -1 for ids that are not there.
+        """
+        rows = np.searchsorted(study_ids, ids)
+        found = rows < len(study_ids)
+        found[found] = study_ids[rows[found]] == ids[found]
+        return np.where(found, rows, -1)
+
+
+    def _years(self, days):
+        """ Calendar year of each day number.
+        """
+        return days.astype('datetime64[D]').astype('datetime64[Y]') \
+            .astype(np.int64) + 1970
+
+
+    def _lags(self):
+        """ Approval lag in days of each approved amendment, and the
+            study row of each.
+        """
+        dated = ((self.submitted != self.no_day) &
+            (self.approved != self.no_day))
+        lags = self.approved[dated] - self.submitted[dated]
+        # Approved before submitted is a data entry error
+        valid = lags >= 0
+        return lags[valid], self.amend_study[dated][valid]
+
+
+    @staticmethod
+    def _group_medians(groups, values, count):
+        """ Median of values in each of count groups (NaN for empty
+            groups), with one sort instead of one pass per group.
+        """
+        medians = np.full(count, np.nan)
+        if not len(values):
+            return medians
+        order = np.lexsort((values, groups))
+        groups, values = groups[order], values[order]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        ends = np.r_[starts[1:], len(groups)]
+        lower = values[(starts + ends - 1) // 2]
+        upper = values[(starts + ends) // 2]
+        medians[groups[starts]] = (lower + upper) / 2
+        return medians
+
+
+    ####################
+    # Report Functions #
+    ####################
+    def approval_lag(self):
+        """ Summarise the days from submission to approval.
+        :return: LagSummary. percentiles is a list of (percentile,
+            days); mean and days are None without approvals.
+        """
+        lags, _ = self._lags()
+        pending = int(np.count_nonzero((self.submitted != self.no_day) &
+            (self.approved == self.no_day)))
+        if not len(lags):
+            return LagSummary(0, pending, None,
+                [(p, None) for p in self.PERCENTILES])
+        values = np.percentile(lags, self.PERCENTILES)
+        return LagSummary(len(lags), pending, float(lags.mean()),
+            [(p, float(x)) for p, x in zip(self.PERCENTILES, values)])
+
+
+    def open_ageing(self, today):
+        """ Summarise how long open studies have been open.
+        :param today: day number of today
+        :return: AgeingSummary. bins is a list of (label, count).
+        """
+        is_open = self.closed == self.no_day
+        dated = is_open & (self.created != self.no_day)
+        ages = today - self.created[dated]
+        edges = [upper for upper, _ in self.AGE_BINS[:-1]]
+        counts = np.bincount(np.searchsorted(edges, ages, side='right'),
+            minlength=len(self.AGE_BINS))
+        bins = [(label, int(n)) for (_, label), n
+            in zip(self.AGE_BINS, counts)]
+        if not len(ages):
+            return AgeingSummary(0, int(is_open.sum()), None, None, bins)
+        return AgeingSummary(len(ages), int(is_open.sum() - len(ages)),
+            float(np.median(ages)), int(ages.max()), bins)
+
+
+    def researcher_workload(self):
+        """ Studies and amendments per researcher, busiest first.
+        :return: list of Workload
+        """
+        count = len(self.researcher_names)
+        is_open = self.closed == self.no_day
+        total = np.bincount(self.researcher, minlength=count)
+        open = np.bincount(self.researcher[is_open], minlength=count)
+        linked = self.amend_study >= 0
+        amendments = np.bincount(
+            self.researcher[self.amend_study[linked]], minlength=count)
+        lags, rows = self._lags()
+        linked = rows >= 0
+        medians = self._group_medians(self.researcher[rows[linked]],
+            lags[linked], count)
+
+        order = np.lexsort((-amendments, -open))
+        return [Workload(self.researcher_names[ii], int(open[ii]),
+            int(total[ii]), int(amendments[ii]),
+            float(amendments[ii] / total[ii]) if total[ii] else 0.0,
+            None if np.isnan(medians[ii]) else float(medians[ii]))
+            for ii in order]
+
+
+    def by_year(self):
+        """ Studies created and closed, and amendments submitted, per
+            calendar year, newest first.
+        :return: list of YearSummary. per_study is amendments per
+            study created that year.
+        """
+        created = self.created[self.created != self.no_day]
+        closed = self.closed[self.closed != self.no_day]
+        submitted = self.submitted != self.no_day
+        years = [self._years(created), self._years(closed),
+            self._years(self.submitted[submitted])]
+        if not any(len(x) for x in years):
+            return []
+
+        first = min(x.min() for x in years if len(x))
+        last = max(x.max() for x in years if len(x))
+        span = last - first + 1
+        counts = [np.bincount(x - first, minlength=span) for x in years]
+
+        # Median lag by year of submission
+        dated = submitted & (self.approved != self.no_day)
+        lags = self.approved[dated] - self.submitted[dated]
+        valid = lags >= 0
+        medians = self._group_medians(
+            self._years(self.submitted[dated][valid]) - first,
+            lags[valid], span)
+
+        return [YearSummary(int(first + ii), int(counts[0][ii]),
+            int(counts[1][ii]), int(counts[2][ii]),
+            float(counts[2][ii] / counts[0][ii]) if counts[0][ii] else None,
+            None if np.isnan(medians[ii]) else float(medians[ii]))
+            for ii in range(span - 1, -1, -1)
+            if counts[0][ii] or counts[1][ii] or counts[2][ii]]
+
+
+    def by_type(self):
+        """ Open and total studies per study type, most first.
+        :return: list of TypeSummary
+        """
+        count = len(self.type_names)
+        total = np.bincount(self.study_type, minlength=count)
+        open = np.bincount(self.study_type[self.closed == self.no_day],
+            minlength=count)
+        return [TypeSummary(self.type_names[ii], int(open[ii]),
+            int(total[ii])) for ii in np.argsort(-total, kind='stable')]
+
+
+    def report(self, today=None):
+        """ Compute every report.
+        :param today: day number of today (default: the local date)
+        :return: Report
+        """
+        if today is None:
+            today = int(np.datetime64('today', 'D').astype(np.int64))
+        return Report(
+            studies=len(self.study_id),
+            open=int(np.count_nonzero(self.closed == self.no_day)),
+            amendments=len(self.submitted),
+            lag=self.approval_lag(),
+            ageing=self.open_ageing(today),
+            workload=self.researcher_workload(),
+            years=self.by_year(),
+            types=self.by_type(),
+            today=str(np.datetime64(today, 'D')),
+        )
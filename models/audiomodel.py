@@ -1,4 +1,9 @@
-""" Audio class for handling .wav files.
+""" Audio class for handling .wav files. Problems are raised as
+    AudioError subclasses for the caller to report.
+
+    Files can be played from memory, or streamed: read, scaled and
+    checked for clipping one block at a time, so memory use and the 
+    delay before the first sample do not grow with file length.
 """
 
 ###########
@@ -9,14 +14,46 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 # Import system packages
+import glob
 import os
+import queue
+import threading
 
 # Import audio packages
 import soundfile as sf
 import sounddevice as sd
 
-# Import GUI packages
-from tkinter import messagebox
+# Import custom modules
+from functions import levels
+
+
+##############
+# Exceptions #
+##############
+class AudioError(Exception):
+    """ Base class for errors raised by Audio. str() is a message 
+        that can be shown to the user.
+    """
+
+
+class InvalidDeviceError(AudioError):
+    """ The audio device id does not exist.
+    """
+
+
+class ClippingError(AudioError):
+    """ The signal would clip at the requested level.
+    :param signal: the scaled signal, for Audio.plot_wave(). When 
+        streaming, only the block that clipped.
+    :param start: time in seconds of the first sample of signal
+    :param audio: the Audio object that clipped, to plot the signal
+        with
+    """
+    def __init__(self, message, signal, start=0.0, audio=None):
+        super().__init__(message)
+        self.signal = signal
+        self.start = start
+        self.audio = audio
 
 
 #########
@@ -25,10 +62,28 @@ from tkinter import messagebox
 class Audio:
     """ Class for use with .wav files.
     """
-
-    def __init__(self, file_path):
-        """ Read audio file and generate info.
+    # Streaming: frames per block, blocks buffered ahead of the 
+    # output, and blocks read before playback starts
+    BLOCK_SIZE = 2048
+    BUFFER_BLOCKS = 20
+    PREFILL_BLOCKS = 4
+
+    # Marks the end of a stream in the block queue
+    _END = None
+
+    def __init__(self, file_path, stream=False, cache=None, on_error=None):
+        """ Read the audio file header and generate info. Samples 
+            are only read when self.signal is first used, or by 
+            play().
             file_path: a Path object from pathlib
+            stream: play() reads the file block by block instead of 
+                loading it all
+            cache: a StimulusCache. Files that fit are decoded once 
+                and played from memory (not streamed) after that.
+            on_error: called as on_error(error) from the reader 
+                thread when an error (e.g. ClippingError) stops 
+                streamed playback after it has started, since play()
+                has already returned by then
         """
         print(f"\naudiomodel: Attempting to load " + 
               f"{os.path.basename(file_path)}...")
@@ -37,87 +92,108 @@ class Audio:
         self.name = os.path.basename(file_path)
         self.file_path = file_path
 
+        self.cache = cache
+        self._signal = None
+
+        # Streaming state
+        self.stream = stream
+        self.on_error = on_error
+        self.error = None
+        self.underflows = 0
+        self._stream = None
+        self._blocks = None
+        self._feeder = None
+        self._stopped = threading.Event()
+        self._done = threading.Event()
+        self._done.set()
+
          # Read audio file
         file_exists = os.access(self.file_path, os.F_OK)
         if not file_exists:
             print("audiomodel: Audio file not found!")
             raise FileNotFoundError
-        else:
-            self.signal, self.fs = sf.read(self.file_path)
-            print("audiomodel: Found!")
-            print(f"audiomodel: Sampling rate: {self.fs}")
 
-        # Get number of channels
-        try:
-            self.num_channels = self.signal.shape[1]
-        except IndexError:
-            self.num_channels = 1
+        # Only read the header, unless the samples are cached
+        entry = cache.peek(self.file_path) if cache is not None else None
+        if entry is not None:
+            self._signal, self.fs, self.subtype = entry
+            self.frames = len(self._signal)
+            self.num_channels = 1 if self._signal.ndim == 1 \
+                else self._signal.shape[1]
+        else:
+            info = sf.info(self.file_path)
+            self.fs = info.samplerate
+            self.frames = info.frames
+            self.num_channels = info.channels
+            self.subtype = info.subtype
+        print("audiomodel: Found!")
+        print(f"audiomodel: Sampling rate: {self.fs}")
         self.channels = np.array(range(1, self.num_channels+1))
         print(f"audiomodel: Number of channels in file: {self.num_channels}")
 
         # Assign audio file attributes
-        self.dur = len(self.signal) / self.fs
-        self.t = np.arange(0, self.dur, 1/self.fs)
+        self.dur = self.frames / self.fs
         print(f"audiomodel: Duration: {np.round(self.dur, 2)} seconds " +
             f"({np.round(self.dur/60, 2)} minutes)")
 
-        # Get data type
-        self.data_type = self.signal.dtype
-        print(f"audiomodel: Data type: {self.data_type}")
+        # Samples are read as float32
+        self.data_type = np.dtype(np.float32)
+        print(f"audiomodel: Data type: {self.data_type} " +
+            f"(file: {self.subtype})")
 
 
-    def play(self, level=None, device_id=None):
-        """ Present audio
+    @property
+    def signal(self):
+        """ The samples, read on first use: 1-D for mono files, 
+            otherwise one column per channel. Read-only if they came 
+            from the cache.
         """
-        print("\naudiomodel: Preparing to present audio...")
-        # Create a temporary signal to be modified
-        temp = self.signal.copy()
-        temp = temp.astype(np.float32)
+        if self._signal is None:
+            entry = None
+            if self.cache is not None:
+                # play() has already counted this presentation
+                entry = self.cache.get(self.file_path, count=False)
+            if entry is None:
+                print(f"audiomodel: Reading {self.name}...")
+                entry = sf.read(self.file_path, dtype='float32')
+            self._signal = entry[0]
+        return self._signal
+
+
+    @property
+    def t(self):
+        """ Sample times in seconds. Built on each use: plot_wave() 
+            only needs times for the signal it plots.
+        """
+        return np.arange(0, self.dur, 1/self.fs)
 
-        # Assign audio device defaults
-        sd.default.device = device_id
-        sd.default.samplerate = self.fs
 
-        # Get number of available audio device channels
-        try:
-            self.num_outputs = sd.query_devices(sd.default.device)['max_output_channels']
-        except sd.PortAudioError:
-            messagebox.showerror(
-                title="Invalid Audio Device",
-                message="Invalid audio device!",
-                detail="Please provide a valid audio device " +
-                "id before continuing."
-            )
+    def play(self, level=None, device_id=None):
+        """ Present audio
+        """
+        if not self._in_memory() and self.stream:
+            self._play_stream(level, device_id)
             return
 
-        # Display audio device features to console
-        print(f"audiomodel: Audio device: " + 
-              f"{sd.query_devices(sd.default.device)['name']}")
-        print(f"audiomodel: Device outputs: {self.num_outputs}")
+        print("\naudiomodel: Preparing to present audio...")
+        # Assign audio device defaults
+        self._set_device(device_id)
 
-        # Set presentation level
+        # Set presentation level. Both write a new float32 signal:
+        # the samples may be shared with the stimulus cache.
         if level == None:
             # Normalize if no level is provided
             print("audiomodel: No level provided, normalizing...")
-            for chan in range(0, self.num_channels):
-                 # Remove DC offset
-                temp[:, chan] = temp[:, chan] - np.mean(temp[:, chan])
-                # Normalize
-                temp[:, chan] = temp[:, chan] / np.max(np.abs(temp[:, chan]))
-                # account for num channels
-                temp[:, chan] = temp[:, chan] / self.num_channels 
-                #print(f"\nMax of signal: {np.max(np.abs(self.signal[:, chan]))}")
-                #print(f"Max of temp: {np.max(np.abs(temp[:, chan]))}")
+            temp = levels.normalize(self.signal, self.num_channels, 
+                dtype=np.float32)
         else:
-            # Convert level in dB to magnitude
-            mag = self.db2mag(level)
-            # Apply scaling factor to temp
-            temp = temp * mag
+            temp = levels.apply_gain(self.signal, 
+                levels.db2mag(level, np.float32), dtype=np.float32)
 
         print(f"audiomodel: Audio shape: {temp.shape}")
 
         # Check for clipping after level has been applied
-        if np.max(np.abs(temp)) > 0.999:
+        if levels.peak(temp) > 0.999:
             self._clipping(temp)
 
         # Present audio
@@ -143,14 +219,58 @@ class Audio:
             print("audiomodel: Done")
 
 
+    def _in_memory(self):
+        """ Whether the samples are loaded, or already cached, so 
+            play() need not stream. Never decodes: on a cache miss 
+            a streamed file is decoded into the cache in the 
+            background, for later presentations. Counts one cache 
+            hit or miss per presentation.
+        """
+        if self.cache is not None:
+            entry = self.cache.peek(self.file_path, count=True)
+            if entry is not None and self._signal is None:
+                self._signal = entry[0]
+            elif entry is None and self._signal is None and self.stream:
+                self.cache.prefetch([self.file_path])
+        return self._signal is not None
+
+
+    def _set_device(self, device_id):
+        """ Make device_id the default device and get its number 
+            of output channels.
+        """
+        sd.default.device = device_id
+        sd.default.samplerate = self.fs
+
+        # Get number of available audio device channels
+        try:
+            self.num_outputs = sd.query_devices(sd.default.device)['max_output_channels']
+        except sd.PortAudioError as e:
+            print("audiomodel: Invalid audio device!")
+            raise InvalidDeviceError("Please provide a valid audio " +
+                "device id before continuing.") from e
+
+        # Display audio device features to console
+        print(f"audiomodel: Audio device: " + 
+              f"{sd.query_devices(sd.default.device)['name']}")
+        print(f"audiomodel: Device outputs: {self.num_outputs}")
+
+
     def stop(self):
         """ Stop audio presentation.
         """
-        sd.stop()
+        if self._stream is not None or self._feeder is not None:
+            self._stop_stream()
+        else:
+            sd.stop()
 
 
-    def plot_wave(self, sig):
-        plt.plot(self.t, sig)
+    def plot_wave(self, sig, start=0.0):
+        """ Plot a signal, e.g. ClippingError.signal. start is the 
+            time of its first sample.
+        """
+        t = start + np.arange(len(sig)) / self.fs
+        plt.plot(t, sig)
         plt.title("Clipping Has Occurred!")
         plt.xlabel("Time (s)")
         plt.ylabel("Amplitude")
@@ -159,44 +279,200 @@ class Audio:
         plt.show()
 
 
-    def _clipping(self, temp):
-        messagebox.showerror(
-            title="Clipping",
-            message="The level provided is too high. Enter a lower level.",
-            detail="The waveform will be plotted when this message is " +
-                "closed for visual inspection."
-        )
-        self.plot_wave(temp)
-        raise Exception("audiomodel: Clipping occurred")
+    def _clipping(self, temp, start=0.0):
+        print("audiomodel: Clipping occurred")
+        raise ClippingError("The level provided is too high. Enter a " +
+            "lower level.", temp, start, self)
+
+
+    #######################
+    # Streaming Functions #
+    #######################
+    def _play_stream(self, level, device_id):
+        """ Start streaming the file. A reader thread reads, scales 
+            and checks each block and queues it for the output 
+            stream's callback. Playback starts once PREFILL_BLOCKS 
+            are queued, however long the file.
+
+            Clipping in the first blocks is raised here. Clipping 
+            found later stops playback before the clipped block and
+            is passed to on_error; wait() also raises it.
+        """
+        print("\naudiomodel: Preparing to stream audio...")
+        self._stop_stream()
+        self._set_device(device_id)
+
+        # Drop channels the device cannot play
+        channels = min(self.num_channels, self.num_outputs)
+        if channels < self.num_channels:
+            print(f"\naudiomodel: {self.num_channels}-channel file, but "
+                f"only {self.num_outputs} audio device output channels!")
+            print("audiomodel: Dropping " +
+                f"{self.num_channels - channels} audio file channels")
+
+        # Set presentation level
+        if level is None:
+            print("audiomodel: No level provided, normalizing...")
+            offset, gain = self._normalization(channels)
+        else:
+            offset, gain = None, levels.db2mag(level, np.float32)
+
+        self.error = None
+        self.underflows = 0
+        self._stopped.clear()
+        self._done.clear()
+        self._blocks = queue.Queue(self.BUFFER_BLOCKS)
+        primed = threading.Event()
+        self._feeder = threading.Thread(target=self._feed, 
+            args=(channels, offset, gain, primed), name='AudioReader', 
+            daemon=True)
+        self._feeder.start()
+        primed.wait()
+        if self.error is not None:
+            # Failed before playback started
+            self._stop_stream()
+            raise self.error
+
+        print("audiomodel: Attempting to present audio...")
+        try:
+            self._stream = sd.OutputStream(samplerate=self.fs, 
+                blocksize=self.BLOCK_SIZE, device=device_id, 
+                channels=channels, dtype='float32', 
+                callback=self._callback, finished_callback=self._done.set)
+            self._stream.start()
+        except sd.PortAudioError as e:
+            self._stop_stream()
+            raise AudioError(f"Could not start audio: {e}") from e
+        print("audiomodel: Streaming")
+
+
+    def _normalization(self, channels):
+        """ Per-channel DC offset and gain that normalize the file 
+            like play() does. Needs one pass over the file, in 
+            blocks, before playback.
+        :return: (offset, gain) arrays
+        """
+        with sf.SoundFile(self.file_path) as fh:
+            st = levels.stats_blocks((block[:, :channels] for block 
+                in fh.blocks(self.BLOCK_SIZE * 16, dtype='float32',
+                always_2d=True)), channels)
+        offset, gain = levels.normalization(st, self.num_channels)
+        return offset.astype(np.float32), gain.astype(np.float32)
+
+
+    def _feed(self, channels, offset, gain, primed):
+        """ Reader thread: queue scaled blocks until the end of the 
+            file, clipping, or stop(). Sets primed once playback can 
+            start.
+        """
+        start = 0
+        try:
+            with sf.SoundFile(self.file_path) as fh:
+                for block in fh.blocks(self.BLOCK_SIZE, dtype='float32', 
+                    always_2d=True):
+                    # Each block is a new array: scale it in place
+                    block = block[:, :channels]
+                    levels.apply_gain(block, gain, offset, out=block)
+
+                    # Check for clipping after level has been applied
+                    if levels.peak(block) > 0.999:
+                        try:
+                            self._clipping(block, start / self.fs)
+                        except ClippingError as e:
+                            self.error = e
+                        break
+
+                    if not self._put(block):
+                        return
+                    start += len(block)
+                    if self._blocks.qsize() >= self.PREFILL_BLOCKS:
+                        primed.set()
+        except RuntimeError as e:
+            # soundfile read errors
+            self.error = AudioError(f"Could not read {self.name}: {e}")
+        finally:
+            # play() raises errors found before playback started
+            started = primed.is_set()
+            self._put(self._END)
+            primed.set()
+        if started and self.error is not None and self.on_error:
+            self.on_error(self.error)
+
+
+    def _put(self, block):
+        """ Queue a block, waiting for space. Returns False if 
+            playback was stopped first.
+        """
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(block, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+    def _callback(self, outdata, frames, time, status):
+        """ Output stream callback: copy the next queued block. 
+            Runs on the audio thread, so it only copies.
+        """
+        if status.output_underflow:
+            self.underflows += 1
+        try:
+            block = self._blocks.get_nowait()
+        except queue.Empty:
+            # The reader fell behind: play silence
+            self.underflows += 1
+            outdata.fill(0)
+            return
+
+        if block is self._END:
+            outdata.fill(0)
+            raise sd.CallbackStop
+        outdata[:len(block)] = block
+        outdata[len(block):] = 0
+
+
+    def _stop_stream(self):
+        self._stopped.set()
+        if self._stream is not None:
+            self._stream.abort()
+            self._stream.close()
+            self._stream = None
+        if self._feeder is not None:
+            self._feeder.join()
+            self._feeder = None
+        self._done.set()
+
+
+    def wait(self, timeout=None):
+        """ Block until streamed playback ends. Raises the error 
+            that stopped it early, if any.
+        :return: False if timeout passed first
+        """
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
 
 
     @staticmethod
     def db2mag(db):
         """ 
             Convert decibels to magnitude. Takes a single
-            value or a list of values.
+            value or an array of values (see levels.db2mag).
         """
-        # Must use this form to handle negative db values!
-        try:
-            mag = [10**(x/20) for x in db]
-            return mag
-        except:
-            mag = 10**(db/20)
-            return mag
+        return levels.db2mag(db)
 
 
     @staticmethod
     def mag2db(mag):
         """ 
             Convert magnitude to decibels. Takes a single
-            value or a list of values.
+            value or an array of values (see levels.mag2db).
         """
-        try:
-            db = [20 * np.log10(x) for x in mag]
-            return db
-        except:
-            db = 20 * np.log10(mag)
-            return db
+        return levels.mag2db(mag)
 
 
     def rms(self, sig):
@@ -217,16 +493,19 @@ class Audio:
 
     def setRMS(self, sig, amp, eq='n'):
         """
-            Set RMS level of a 1-channel or 2-channel signal.
+            Set RMS level of a signal with any number of channels.
         
-            SIG: a 1-channel or 2-channel signal
+            SIG: a 1-D signal, or a 2-D signal with one row per 
+                channel (channels by samples)
             AMP: the desired amplitude to be applied to 
                 each channel. Note this will be the RMS 
-                per channel, not the total of both channels.
+                per channel, not the total of all channels.
             EQ: takes 'y' or 'n'. Whether or not to equalize 
-                the levels in a 2-channel signal. For example, 
+                the levels in a multichannel signal. For example, 
                 a signal with an ILD would lose the ILD with 
-                EQ='y', so the default in 'n'.
+                EQ='y', so the default in 'n'. With 'n', every 
+                channel gets the same gain: the mean of the 
+                channel levels (in dB) is set to AMP.
 
             EXAMPLE: 
             Create a 2 channel signal
@@ -239,60 +518,25 @@ class Audio:
             Created: Jan. 10, 2022
             Last edited: May 17, 2022
         """
-        if len(sig.shape) == 1:
-            rmsdb = self.mag2db(self.rms(sig))
-            refdb = amp
-            diffdb = np.abs(rmsdb - refdb)
-            if rmsdb > refdb:
-                sigAdj = sig / self.db2mag(diffdb)
-            elif rmsdb < refdb:
-                sigAdj = sig * self.db2mag(diffdb)
-            # Edit 5/17/22
-            # Added handling for when rmsdb == refdb
-            elif rmsdb == refdb:
-                sigAdj = sig
-            return sigAdj
-            
-        elif len(sig.shape) == 2:
-            rmsdbLeft = self.mag2db(self.rms(sig[0]))
-            rmsdbRight = self.mag2db(self.rms(sig[1]))
-
-            ILD = np.abs(rmsdbLeft - rmsdbRight) # get lvl diff
-
-            # Determine lvl advantage
-            if rmsdbLeft > rmsdbRight:
-                lvlAdv = 'left'
-                #print("Adv: %s" % lvlAdv)
-            elif rmsdbRight > rmsdbLeft:
-                lvlAdv = 'right'
-                #print("Adv: %s" % lvlAdv)
-            elif rmsdbLeft == rmsdbRight:
-                lvlAdv = None
-
-            #refdb = amp - 3 # apply half amp to each channel
-            refdb = amp
-            diffdbLeft = np.abs(rmsdbLeft - refdb)
-            diffdbRight = np.abs(rmsdbRight - refdb)
-
-            # Adjust left channel
-            if rmsdbLeft > refdb:
-                sigAdjLeft = sig[0] / self.db2mag(diffdbLeft)
-            elif rmsdbLeft < refdb:
-                sigAdjLeft = sig[0] * self.db2mag(diffdbLeft)
-            # Adjust right channel
-            if rmsdbRight > refdb:
-                sigAdjRight = sig[1] / self.db2mag(diffdbRight)
-            elif rmsdbRight < refdb:
-                sigAdjRight = sig[1] * self.db2mag(diffdbRight)
-
-            # If there is a lvl difference to maintain across channels
-            if eq == 'n':
-                if lvlAdv == 'left':
-                    sigAdjLeft = sigAdjLeft * self.db2mag(ILD/2)
-                    sigAdjRight = sigAdjRight / self.db2mag(ILD/2)
-                elif lvlAdv == 'right':
-                    sigAdjLeft = sigAdjLeft / self.db2mag(ILD/2)
-                    sigAdjRight = sigAdjRight * self.db2mag(ILD/2)
-
-            sigBothAdj = np.array([sigAdjLeft, sigAdjRight])
-            return sigBothAdj
+        # levels works on samples by channels
+        sig = np.asarray(sig)
+        return levels.set_rms(sig.T, amp, equalize=(eq == 'y')).T
+
+
+def scan_folder(directory, pattern='*.wav', **kwargs):
+    """ Return an Audio object for each matching file in directory,
+        sorted by name. Only file headers are read.
+    :param kwargs: passed to Audio()
+    """
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    return [Audio(path, **kwargs) for path in paths]
+
+
+def device_outputs(device_id):
+    """ Return the number of output channels of an audio device, or
+        None if the device does not exist.
+    """
+    try:
+        return sd.query_devices(device_id)['max_output_channels']
+    except (sd.PortAudioError, ValueError):
+        return None
@@ -0,0 +1,169 @@
+""" In-memory snapshot of study, researcher and amendment records.
+    Sits between the controller and DBModel so refreshes only hit the
+    database when the data has actually changed.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import custom modules
+from models import indexmodel
+
+
+#########
+# BEGIN #
+#########
+class StudyCache:
+    """ Snapshot of studies, researchers and amendments, plus 
+        name <-> id indexes for studies and researchers. The 
+        researcher index holds every researcher, so studies of 
+        inactive researchers can still be edited; active_researchers
+        holds the ids to offer for new choices.
+
+        The snapshot is reloaded when PRAGMA data_version shows that
+        another connection has committed. Local writes do not change
+        data_version, so the controller patches them in with
+        apply_study() and apply_amendment() instead. data_version is
+        per connection: always pass the same connection (the query
+        executor's).
+
+        Snapshot lists and dicts are replaced, never modified in place,
+        so the Tk thread can safely hold on to the ones it was given.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.studies = []
+        self.amendments = {}
+        self.study_index = indexmodel.NameIndex()
+        self.researcher_index = indexmodel.NameIndex()
+        self.active_researchers = frozenset()
+
+        # Amendment id -> study id, to find amendments that move
+        self._amend_study = {}
+
+        # Watermark
+        self._conn_id = None
+        self._data_version = None
+
+
+    ##############
+    # Properties #
+    ##############
+    @property
+    def open_studies(self):
+        """ Open studies, derived from the full set.
+        """
+        return [x for x in self.studies if x.is_open]
+
+
+    @property
+    def open_count(self):
+        return sum(1 for x in self.studies if x.is_open)
+
+
+    @property
+    def total_count(self):
+        return len(self.studies)
+
+
+    ######################
+    # Snapshot Functions #
+    ######################
+    def is_stale(self, conn):
+        """ Check whether the database has changed since the last load.
+        """
+        if self._conn_id != id(conn):
+            return True
+        return self.db.get_data_version(conn) != self._data_version
+
+
+    def invalidate(self):
+        """ Force a full reload on the next refresh.
+        """
+        self._data_version = None
+
+
+    def refresh(self, conn):
+        """ Reload the snapshot if it is stale.
+        :return: True if the snapshot was reloaded
+        """
+        if not self.is_stale(conn):
+            print("\ncachemodel: Snapshot is current")
+            return False
+
+        self.reload(conn)
+        return True
+
+
+    def reload(self, conn):
+        """ Reload every table into memory.
+        """
+        print("\ncachemodel: Reloading snapshot...")
+        with self.db.wait_for_locks(conn), conn:
+            # Read every table from one consistent snapshot
+            conn.execute("BEGIN")
+            data_version = self.db.get_data_version(conn)
+            studies = self.db.select_all_studies(conn)
+            researchers = self.db.select_all_researchers(conn)
+            active = self.db.select_active_researchers(conn)
+            rows = self.db.select_all_amendments(conn)
+
+        # Group amendments by study id
+        amendments = {}
+        for row in rows:
+            amendments.setdefault(row.study_id, []).append(row)
+
+        self.studies = studies
+        self.amendments = amendments
+        self.study_index = indexmodel.NameIndex(
+            (x.study_id, x.study_name) for x in studies)
+        self.researcher_index = indexmodel.NameIndex(
+            (x.researcher_id, x.name) for x in researchers)
+        self.active_researchers = frozenset(x.researcher_id for x in active)
+        self._amend_study = {row.amend_id: row.study_id for row in rows}
+        self._conn_id = id(conn)
+        self._data_version = data_version
+        print("cachemodel: Done!")
+
+
+    def apply_study(self, conn, study_id):
+        """ Patch one study into the snapshot after a local write.
+        """
+        rows = self.db.select_study(conn, [study_id])
+        studies = [x for x in self.studies if x.study_id != study_id]
+        studies.extend(rows)
+        # Match ORDER BY date_created DESC, study_id DESC (NULLs last)
+        studies.sort(key=lambda x: (x.date_created is not None, 
+            x.date_created or '', x.study_id), reverse=True)
+
+        study_index = self.study_index.copy()
+        study_index.remove(study_id)
+        for row in rows:
+            study_index.add(row.study_id, row.study_name)
+
+        self.studies = studies
+        self.study_index = study_index
+
+
+    def apply_amendment(self, conn, amend_id):
+        """ Patch one amendment into the snapshot after a local write.
+        """
+        rows = self.db.select_amendment(conn, [amend_id])
+        amendments = dict(self.amendments)
+
+        # Remove from its previous study (the study may have changed)
+        old_study = self._amend_study.pop(amend_id, None)
+        if old_study in amendments:
+            amendments[old_study] = [x for x in amendments[old_study]
+                if x.amend_id != amend_id]
+
+        for row in rows:
+            study_rows = list(amendments.get(row.study_id, []))
+            study_rows.append(row)
+            study_rows.sort(key=lambda x: x.amend_id)
+            amendments[row.study_id] = study_rows
+            self._amend_study[amend_id] = row.study_id
+
+        self.amendments = amendments
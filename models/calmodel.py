@@ -12,6 +12,7 @@ import os
 
 # Import custom modules
 from models import audiomodel
+from models import stimuluscachemodel
 from functions import resource_path
 
 
@@ -21,8 +22,14 @@ from functions import resource_path
 class CalModel:
     """ Write provided dictionary to .csv
     """
-    def __init__(self, sessionpars):
+    def __init__(self, sessionpars, on_error=None):
+        """
+        :param on_error: called as on_error(error) from the audio 
+            reader thread if streamed playback stops early (e.g. it
+            clipped part way through)
+        """
         self.sessionpars = sessionpars
+        self.on_error = on_error
 
 
     def _get_cal_file(self):
@@ -40,6 +47,23 @@ class CalModel:
 
         print(f"calmodel: Using {self.cal_file}")
 
+        # Decode it now so the first Play is quick too
+        cache = self._get_cache()
+        if cache is not None:
+            cache.prefetch([self.cal_file])
+
+
+    def _get_cache(self):
+        """ Return the shared stimulus cache, or None if it is 
+            turned off (stimulus_cache_mb is 0).
+        """
+        budget = self.sessionpars['stimulus_cache_mb'].get() * 2**20
+        if budget <= 0:
+            return None
+        cache = stimuluscachemodel.get_cache()
+        cache.set_budget(budget)
+        return cache
+
 
     def _calc_level(self):
         """ Calculate and save adjusted presentation level
@@ -68,8 +92,12 @@ class CalModel:
 
 
     def play_cal(self):
-        # Present calibration file
-        self.cal = audiomodel.Audio(file_path=self.cal_file)
+        """ Present calibration file. Raises audiomodel.AudioError 
+            subclasses for the caller to report.
+        """
+        self.cal = audiomodel.Audio(file_path=self.cal_file,
+            stream=self.sessionpars['stream_audio'].get(),
+            cache=self._get_cache(), on_error=self.on_error)
         self.cal.play(
             level=self.sessionpars['scaling_factor'].get(),
             device_id=self.sessionpars['audio_device'].get()
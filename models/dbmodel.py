@@ -10,22 +10,325 @@
 import sqlite3
 from sqlite3 import Error
 
-# Import GUI packages
-from tkinter import messagebox
+# Import system packages
+import contextlib
+import random
+import threading
+import time
+
+# Import custom modules
+from models import recordmodel
+
+##############
+# Exceptions #
+##############
+class DBError(Error):
+    """ Base class for errors raised by DBModel. A subclass of 
+        sqlite3.Error, so existing handlers still catch it. str() is
+        a message that can be shown to the user.
+    """
+
+
+class IntegrityViolation(DBError):
+    """ A write broke a UNIQUE, NOT NULL, CHECK or FOREIGN KEY 
+        constraint.
+    :param constraint: 'UNIQUE', 'NOT NULL', 'CHECK' or 'FOREIGN KEY'
+    :param column: 'Table.column' the constraint is on, if known
+    """
+    def __init__(self, message, constraint=None, column=None):
+        super().__init__(message)
+        self.constraint = constraint
+        self.column = column
+
+
+    @classmethod
+    def from_sqlite(cls, error):
+        """ Describe a sqlite3.IntegrityError such as 'UNIQUE 
+            constraint failed: Studies.study_name'.
+        """
+        text = str(error)
+        constraint, _, column = text.partition(' constraint failed')
+        column = column.lstrip(': ').split(',')[0] or None
+        field = column.split('.')[-1].replace('_', ' ') if column else None
+        if constraint == 'UNIQUE' and field:
+            message = f"A record with this {field} already exists."
+        elif constraint == 'NOT NULL' and field:
+            message = f"A {field} is required."
+        elif constraint == 'FOREIGN KEY':
+            message = "The record refers to a study or researcher " +\
+                "that does not exist."
+        else:
+            message = f"The record is not valid: {text}"
+        return cls(message, constraint or None, column)
+
+
+class DatabaseLocked(DBError):
+    """ The database stayed locked by another connection for longer
+        than DBModel.lock_timeout.
+    """
 
 
 #########
 # BEGIN #
 #########
+class ConnectionPool:
+    """ Bounded, thread-aware pool of SQLite connections. Each thread 
+        that asks for a connection gets its own, which it keeps until 
+        it calls release() or the pool is closed. Every connection is 
+        opened with the same PRAGMA profile.
+
+        NOTE: WAL needs shared memory between every process that opens 
+            the database. If the file lives somewhere that cannot 
+            provide it, set journal_mode to 'DELETE' in the profile.
+    """
+    # Default PRAGMA profile applied to every new connection
+    pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000, # Negative values are KiB (i.e., 16 MB)
+        'mmap_size': 268435456, # 256 MB
+        'temp_store': 'MEMORY',
+        # ms per attempt. DBModel retries locked statements for up to
+        # DBModel.lock_timeout and records the time spent waiting.
+        # Work that is not retried runs under 
+        # DBModel.wait_for_locks() instead.
+        'busy_timeout': 100,
+    }
+
+    def __init__(self, db_file, max_connections=4, timeout=10, pragmas=None):
+        self.db_file = db_file
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        # Copy class defaults so one pool cannot change another
+        self.pragmas = dict(self.pragmas)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        # Connections keyed by thread ident: (thread, connection)
+        self._conns = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+
+    def _open(self):
+        """ Open a new connection and apply the PRAGMA profile.
+        """
+        print(f"\ndbmodel: Opening connection for " +
+            f"{threading.current_thread().name}...")
+        # Connections are owned by one thread at a time, but the pool
+        # closes them all from whichever thread calls close_all()
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        print(f"dbmodel: Journal mode: {mode}")
+        return conn
+
+
+    def _prune(self):
+        """ Close connections whose owning thread has exited. 
+            Caller must hold self._cond.
+        """
+        for ident, (thread, conn) in list(self._conns.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._conns[ident]
+
+
+    def get(self):
+        """ Return the calling thread's connection, opening one if 
+            needed. Blocks for up to self.timeout seconds if the pool 
+            is full.
+        """
+        ident = threading.get_ident()
+        with self._cond:
+            if self._closed:
+                raise DBError("Connection pool is closed")
+
+            if ident in self._conns:
+                return self._conns[ident][1]
+
+            self._prune()
+            if not self._cond.wait_for(
+                lambda: len(self._conns) < self.max_connections 
+                    or self._closed, 
+                timeout=self.timeout
+            ):
+                raise DatabaseLocked("Timed out waiting for a database connection")
+            if self._closed:
+                raise DBError("Connection pool is closed")
+
+            conn = self._open()
+            self._conns[ident] = (threading.current_thread(), conn)
+            return conn
+
+
+    def release(self):
+        """ Close the calling thread's connection and free its slot.
+        """
+        with self._cond:
+            thread_conn = self._conns.pop(threading.get_ident(), None)
+            if thread_conn:
+                thread_conn[1].close()
+            self._cond.notify()
+
+
+    def health_check(self):
+        """ Check the calling thread's connection with a trivial query. 
+            Reopen it if it is no longer usable.
+        """
+        conn = self.get()
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return conn
+        except Error as e:
+            print(f"dbmodel: Health check failed ({e}), reconnecting...")
+            self.release()
+            return self.get()
+
+
+    def close_all(self):
+        """ Close every connection in the pool.
+        """
+        print("\ndbmodel: Closing all database connections...")
+        with self._cond:
+            self._closed = True
+            for thread, conn in self._conns.values():
+                try:
+                    # Refresh query planner statistics before closing
+                    conn.execute("PRAGMA optimize")
+                    conn.close()
+                except Error as e:
+                    print(f"dbmodel: {e}")
+            self._conns.clear()
+            self._cond.notify_all()
+        print("dbmodel: Done!")
+
+
 class DBModel:
     """ Context manager for database connections. This ensures connecting and 
         disconnecting are always carried out without the user having 
         to remember.
     """
-    # def __init__(self):
-    #     """ Define database path
-    #     """
-    #     pass
+    # Seconds between retries of a locked statement (doubles up to 
+    # LOCK_RETRY_MAX). Each wait is jittered between half and all of
+    # the delay, so writers that collided do not retry in step.
+    LOCK_RETRY_DELAY = 0.01
+    LOCK_RETRY_MAX = 0.2
+
+    def __init__(self, stats=None, lock_timeout=5.0):
+        """ 
+        :param stats: statsmodel.QueryStats object to record every 
+            statement in, or None
+        :param lock_timeout: seconds to keep retrying a statement 
+            while the database is locked
+        """
+        self.stats = stats
+        self.lock_timeout = lock_timeout
+
+    # Hot queries (see MigrationModel.check_query_plans)
+    SQL_STUDY_SELECT = "SELECT Studies.study_id, Studies.irb_ref, Studies.study_name, Studies.study_type, Researchers.first_name || ' ' || Researchers.last_name AS [Full Name], Studies.date_created, Studies.date_closed FROM Studies INNER JOIN Researchers ON Studies.researcher_id = Researchers.researcher_id"
+    SQL_STUDYID_FROM_NAME = '''SELECT study_id FROM Studies WHERE study_name=?'''
+    SQL_OPEN_STUDIES = SQL_STUDY_SELECT + " WHERE Studies.date_closed IS NULL ORDER BY Studies.date_created DESC, Studies.study_id DESC;"
+    SQL_ALL_STUDIES = SQL_STUDY_SELECT + " ORDER BY Studies.date_created DESC, Studies.study_id DESC;"
+    SQL_STUDY = SQL_STUDY_SELECT + " WHERE Studies.study_id=?;"
+    SQL_ACTIVE_RESEARCHERS = "SELECT first_name || ' ' || last_name AS [researcher_name], researcher_id FROM Researchers WHERE status='active'"
+    SQL_ALL_RESEARCHERS = "SELECT first_name || ' ' || last_name AS [researcher_name], researcher_id FROM Researchers"
+    SQL_STUDY_NAMES = "SELECT study_id, study_name FROM Studies"
+    SQL_AMENDMENTS = '''SELECT * FROM Amendments WHERE study_id=?'''
+    SQL_AMENDMENT = '''SELECT * FROM Amendments WHERE amend_id=?'''
+
+    # Record writes, by name (see write_batch). Values for updates 
+    # end with the record id.
+    WRITE_SQL = {
+        'update_amendment': '''UPDATE Amendments SET submit_date=?, approval_date=?, rationale=?, study_id=? WHERE amend_id=?''',
+        'update_study': '''UPDATE Studies SET irb_ref=?, study_name=?, study_type=?, researcher_id=?, date_created=?, date_closed=? WHERE study_id=?''',
+        'create_amendment': '''INSERT INTO Amendments(submit_date, approval_date, rationale, study_id) VALUES(?,?,?,?)''',
+        'create_study': '''INSERT INTO Studies(irb_ref, study_name, study_type, researcher_id, date_created, date_closed) VALUES(?,?,?,?,?,?)''',
+    }
+
+    # Keyset pagination on (date_created, study_id), newest first.
+    # {filter} is '' or SQL_OPEN_FILTER. Studies without a 
+    # date_created sort last and are paged by study_id alone.
+    SQL_OPEN_FILTER = " AND Studies.date_closed IS NULL"
+    # Page rows end with the study's amendment count
+    SQL_STUDY_PAGE_SELECT = SQL_STUDY_SELECT.replace(" FROM Studies", ", IFNULL(AmendmentSummary.amendments, 0) FROM Studies") + " LEFT JOIN AmendmentSummary ON AmendmentSummary.study_id = Studies.study_id"
+    SQL_STUDIES_FIRST_PAGE = SQL_STUDY_PAGE_SELECT + " WHERE Studies.date_created IS NOT NULL{filter} ORDER BY Studies.date_created DESC, Studies.study_id DESC LIMIT ?;"
+    SQL_STUDIES_PAGE = SQL_STUDY_PAGE_SELECT + " WHERE (Studies.date_created, Studies.study_id) < (?, ?){filter} ORDER BY Studies.date_created DESC, Studies.study_id DESC LIMIT ?;"
+    SQL_STUDIES_NULL_PAGE = SQL_STUDY_PAGE_SELECT + " WHERE Studies.date_created IS NULL AND Studies.study_id < ?{filter} ORDER BY Studies.study_id DESC LIMIT ?;"
+    PAGE_SIZE = 200
+
+    # Summary tables (schema version 5), kept up to date by triggers
+    SQL_STUDY_COUNTS = "SELECT IFNULL(sum(CASE WHEN status = 'open' THEN studies END), 0), IFNULL(sum(studies), 0) FROM StudyCounts"
+    SQL_STUDY_SUMMARY = {
+        'researcher': "SELECT IFNULL(Researchers.first_name || ' ' || Researchers.last_name, ''), sum(CASE WHEN StudyCounts.status = 'open' THEN StudyCounts.studies ELSE 0 END), sum(StudyCounts.studies) FROM StudyCounts LEFT JOIN Researchers ON Researchers.researcher_id = StudyCounts.researcher_id GROUP BY StudyCounts.researcher_id ORDER BY 3 DESC",
+        'year': "SELECT year, sum(CASE WHEN status = 'open' THEN studies ELSE 0 END), sum(studies) FROM StudyCounts GROUP BY year ORDER BY year DESC",
+    }
+    SQL_AMENDMENT_TOTALS = "SELECT IFNULL(sum(amendments), 0), IFNULL(sum(pending), 0) FROM AmendmentSummary"
+    SQL_AMENDMENT_SUMMARY = "SELECT amendments, last_submit_date, pending FROM AmendmentSummary WHERE study_id=?"
+
+    # Analytics columns (see AnalyticsModel). Dates are day numbers 
+    # since 1970-01-01; missing or unreadable dates are NO_DAY.
+    NO_DAY = -2**31
+    SQL_DAY = "IFNULL(CAST(julianday({}) - 2440587.5 AS INTEGER), ?)"
+    SQL_STUDY_COLUMNS = f"SELECT study_id, study_type, IFNULL(researcher_id, 0), {SQL_DAY.format('date_created')}, {SQL_DAY.format('date_closed')} FROM Studies ORDER BY study_id"
+    SQL_AMENDMENT_COLUMNS = f"SELECT IFNULL(study_id, 0), {SQL_DAY.format('submit_date')}, {SQL_DAY.format('approval_date')} FROM Amendments"
+
+    # Full-text search, best matches first. Matched terms are wrapped
+    # in SEARCH_MARKS. Every match is ranked with bm25 before the 
+    # LIMIT, so the best match is never dropped.
+    SEARCH_MARKS = ('[', ']')
+    SQL_SEARCH = '''SELECT hits.kind, hits.ref_id, hits.study_id, Studies.study_name, hits.study_name, hits.irb_ref, hits.researcher, hits.rationale FROM (SELECT kind, ref_id, study_id, highlight(SearchIndex, 3, ?, ?) AS study_name, highlight(SearchIndex, 4, ?, ?) AS irb_ref, highlight(SearchIndex, 5, ?, ?) AS researcher, snippet(SearchIndex, 6, ?, ?, '...', 12) AS rationale, rank FROM SearchIndex WHERE SearchIndex MATCH ? ORDER BY rank LIMIT ?) AS hits LEFT JOIN Studies ON Studies.study_id = hits.study_id ORDER BY hits.rank'''
+
+
+    # Bulk import: rows are staged in a temp table with executemany,
+    # then merged with one INSERT ... SELECT (a single statement, so
+    # the search index triggers stay cheap). WHERE true is required 
+    # by the upsert syntax.
+    SQL_STAGE_STUDIES_TABLE = "CREATE TEMP TABLE IF NOT EXISTS ImportStudies (study_id INTEGER, irb_ref TEXT, study_name TEXT, study_type TEXT, researcher_id INTEGER, date_created TEXT, date_closed TEXT)"
+    SQL_CLEAR_STUDIES = "DELETE FROM temp.ImportStudies"
+    SQL_STAGE_STUDIES = "INSERT INTO temp.ImportStudies VALUES(?,?,?,?,?,?,?)"
+    SQL_COUNT_STUDY_UPDATES = "SELECT count(*) FROM temp.ImportStudies WHERE study_id IN (SELECT study_id FROM Studies)"
+    SQL_MERGE_STUDIES = "INSERT INTO Studies (study_id, irb_ref, study_name, study_type, researcher_id, date_created, date_closed) SELECT study_id, irb_ref, study_name, study_type, researcher_id, date_created, date_closed FROM temp.ImportStudies WHERE true ON CONFLICT(study_id) DO UPDATE SET irb_ref=excluded.irb_ref, study_name=excluded.study_name, study_type=excluded.study_type, researcher_id=excluded.researcher_id, date_created=excluded.date_created, date_closed=excluded.date_closed"
+    SQL_STAGE_AMENDMENTS_TABLE = "CREATE TEMP TABLE IF NOT EXISTS ImportAmendments (amend_id INTEGER, submit_date TEXT, approval_date TEXT, rationale TEXT, study_id INTEGER)"
+    SQL_CLEAR_AMENDMENTS = "DELETE FROM temp.ImportAmendments"
+    SQL_STAGE_AMENDMENTS = "INSERT INTO temp.ImportAmendments VALUES(?,?,?,?,?)"
+    SQL_COUNT_AMENDMENT_UPDATES = "SELECT count(*) FROM temp.ImportAmendments WHERE amend_id IN (SELECT amend_id FROM Amendments)"
+    SQL_MERGE_AMENDMENTS = "INSERT INTO Amendments (amend_id, submit_date, approval_date, rationale, study_id) SELECT amend_id, submit_date, approval_date, rationale, study_id FROM temp.ImportAmendments WHERE true ON CONFLICT(amend_id) DO UPDATE SET submit_date=excluded.submit_date, approval_date=excluded.approval_date, rationale=excluded.rationale, study_id=excluded.study_id"
+
+
+    # Export: column name -> SQL expression, per record kind. Rows
+    # come out in primary key order, so no sort is needed.
+    EXPORT_COLUMNS = {
+        'studies': {
+            'study_id': "Studies.study_id",
+            'irb_ref': "Studies.irb_ref",
+            'study_name': "Studies.study_name",
+            'study_type': "Studies.study_type",
+            'researcher': "Researchers.first_name || ' ' || Researchers.last_name",
+            'researcher_id': "Studies.researcher_id",
+            'date_created': "Studies.date_created",
+            'date_closed': "Studies.date_closed",
+        },
+        'amendments': {
+            'amend_id': "Amendments.amend_id",
+            'study_id': "Amendments.study_id",
+            'study_name': "Studies.study_name",
+            'submit_date': "Amendments.submit_date",
+            'approval_date': "Amendments.approval_date",
+            'rationale': "Amendments.rationale",
+        },
+    }
+    SQL_EXPORT_FROM = {
+        'studies': "FROM Studies LEFT JOIN Researchers ON Studies.researcher_id = Researchers.researcher_id",
+        'amendments': "FROM Amendments LEFT JOIN Studies ON Amendments.study_id = Studies.study_id",
+    }
+    SQL_EXPORT_ORDER = {
+        'studies': " ORDER BY Studies.study_id",
+        'amendments': " ORDER BY Amendments.amend_id",
+    }
+    SQL_EXPORT_OPEN_FILTER = " WHERE Studies.study_id IS NOT NULL AND Studies.date_closed IS NULL"
 
 
     #####################
@@ -46,6 +349,190 @@ class DBModel:
         return conn
 
 
+    def create_pool(self, db_file, **kwargs):
+        """ Create a ConnectionPool for the SQLite database 
+            specified by db_file.
+        :param db_file: database file
+        :return: ConnectionPool object
+        """
+        return ConnectionPool(db_file, **kwargs)
+
+
+    @contextlib.contextmanager
+    def wait_for_locks(self, conn):
+        """ Let SQLite itself wait up to lock_timeout for a locked
+            database, for work that _execute() does not retry: 
+            scripts, streamed reads, raw BEGINs and backups. The 
+            connection's busy_timeout is restored afterwards.
+        """
+        old = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute(f"PRAGMA busy_timeout={int(self.lock_timeout * 1000)}")
+        try:
+            yield conn
+        finally:
+            conn.execute(f"PRAGMA busy_timeout={old}")
+
+
+    def get_data_version(self, conn):
+        """ Return PRAGMA data_version for the given connection. The 
+            value changes whenever another connection commits.
+        """
+        return self._query(conn, 'get_data_version', 
+            "PRAGMA data_version")[0][0]
+
+
+    @staticmethod
+    def explain(conn, sql, params=()):
+        """ Return the EXPLAIN QUERY PLAN details for a statement.
+        """
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        # Rows are (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+
+
+    ###################
+    # Instrumentation #
+    ###################
+    def _execute(self, conn, name, sql, params=(), fetch=True, many=False,
+        begin=False):
+        """ Execute a statement, retrying while the database is 
+            locked, and record it in self.stats.
+        :param name: name the statement is recorded under
+        :param fetch: fetch and return every row. Otherwise return
+            the cursor.
+        :param many: params is a sequence of parameter rows 
+            (executemany)
+        :param begin: the statement only takes a lock (BEGIN 
+            IMMEDIATE), so all of its time is recorded as lock wait,
+            including time SQLite spent in busy_timeout
+        :raises IntegrityViolation: a constraint failed
+        :raises DatabaseLocked: still locked after lock_timeout
+        """
+        start = time.perf_counter()
+        lock_wait = 0.0
+        delay = self.LOCK_RETRY_DELAY
+        cur = conn.cursor()
+        while True:
+            attempt = time.perf_counter()
+            try:
+                if many:
+                    cur.executemany(sql, params)
+                else:
+                    cur.execute(sql, params)
+                break
+            except sqlite3.IntegrityError as e:
+                raise IntegrityViolation.from_sqlite(e) from e
+            except sqlite3.OperationalError as e:
+                # Each failed attempt already waited busy_timeout
+                if not self._is_locked(e):
+                    raise
+                if time.perf_counter() - start + delay > self.lock_timeout:
+                    # Record the time lost to contention
+                    lock_wait += time.perf_counter() - attempt
+                    if self.stats is not None:
+                        wall_ms = (time.perf_counter() - start) * 1000
+                        self.stats.record(name, sql, wall_ms, 0, 
+                            wall_ms if begin else lock_wait * 1000, 
+                            failed=True)
+                    raise DatabaseLocked("The database is in use by " +
+                        "someone else. Try again in a moment.") from e
+                time.sleep(random.uniform(delay / 2, delay))
+                lock_wait += time.perf_counter() - attempt
+                delay = min(delay * 2, self.LOCK_RETRY_MAX)
+        rows = cur.fetchall() if fetch else None
+
+        if self.stats is not None:
+            wall_ms = (time.perf_counter() - start) * 1000
+            plan = None
+            if begin:
+                lock_wait = wall_ms / 1000
+            elif self.stats.is_slow(wall_ms):
+                try:
+                    plan = self.explain(conn, sql, 
+                        (params[0] if params else ()) if many else params)
+                except Error as e:
+                    plan = [f"No plan: {e}"]
+            # rowcount is -1 for statements that change no rows
+            self.stats.record(name, sql, wall_ms, 
+                len(rows) if fetch else max(cur.rowcount, 0), 
+                lock_wait * 1000, plan)
+
+        return rows if fetch else cur
+
+
+    def _query(self, conn, name, sql, params=(), record=None):
+        """ Execute a query and return every row.
+        :param record: recordmodel class to convert the rows to
+        """
+        rows = self._execute(conn, name, sql, params)
+        return record.from_rows(rows) if record else rows
+
+
+    def _write(self, conn, name, sql, params=()):
+        """ Execute a write and return the cursor.
+        """
+        return self._execute(conn, name, sql, params, fetch=False)
+
+
+    @contextlib.contextmanager
+    def _immediate(self, conn, name):
+        """ Run a write transaction that takes the write lock up 
+            front with BEGIN IMMEDIATE, then commits. Waiting for the
+            lock happens here, with backoff, and is recorded as 
+            begin_<name>. Statements inside cannot then fail half-way
+            with "database is locked", which a retry cannot fix once
+            a deferred transaction has read stale data. Rolls back 
+            and re-raises on error. Inside another transaction it 
+            just joins that one.
+        """
+        if conn.in_transaction:
+            yield
+            return
+
+        self._execute(conn, f'begin_{name}', "BEGIN IMMEDIATE", 
+            fetch=False, begin=True)
+        try:
+            yield
+            conn.commit()
+        except Error as e:
+            # Runs on the query executor thread: let the controller
+            # report the error on the Tk thread
+            print(f"dbmodel: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+    def _stream(self, conn, name, sql, params=(), size=5000):
+        """ Execute a query and yield its rows in batches of size 
+            with fetchmany, so the whole result is never in memory. 
+            The statement is recorded once the last batch is read.
+        """
+        start = time.perf_counter()
+        count = 0
+        # Not retried like _execute()
+        with self.wait_for_locks(conn):
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                count += len(rows)
+                yield rows
+
+        if self.stats is not None:
+            # Wall time includes the consumer's work between batches
+            self.stats.record(name, sql, 
+                (time.perf_counter() - start) * 1000, count, 0.0)
+
+
+    @staticmethod
+    def _is_locked(error):
+        message = str(error)
+        return 'locked' in message or 'busy' in message
+
+
     ###################
     # Query Functions #
     ###################
@@ -53,10 +540,8 @@ class DBModel:
         """ Get the study_id for the provided study name.
         """
         print("\ndbmodel: Querying study id...")
-        cur = conn.cursor()
-        sql = '''SELECT study_id FROM Studies WHERE study_name=?'''
-        cur.execute(sql, study_name)
-        rows = cur.fetchall()
+        rows = self._query(conn, 'get_studyid_from_name', 
+            self.SQL_STUDYID_FROM_NAME, study_name)
         print(f"dbmodel: {study_name[0]} ID: {rows[0][0]}")
         return rows
 
@@ -68,9 +553,8 @@ class DBModel:
         :return:
         """
         print("\ndbmodel: Querying open studies...")
-        cur = conn.cursor()
-        cur.execute("SELECT Studies.study_id, Studies.irb_ref, Studies.study_name, Studies.study_type, Researchers.first_name || ' ' || Researchers.last_name AS [Full Name], Studies.date_created, Studies.date_closed FROM Studies INNER JOIN Researchers ON Studies.researcher_id = Researchers.researcher_id WHERE Studies.date_closed IS NULL ORDER BY Studies.date_created DESC;")
-        rows = cur.fetchall()
+        rows = self._query(conn, 'select_open_studies', 
+            self.SQL_OPEN_STUDIES, record=recordmodel.Study)
         print(f"dbmodel: Found {len(rows)} open studies")
         return rows
 
@@ -79,105 +563,361 @@ class DBModel:
         """ Select all studies.
         """
         print("\ndbmodel: Querying all studies...")
-        cur = conn.cursor()
-        cur.execute("SELECT Studies.study_id, Studies.irb_ref, Studies.study_name, Studies.study_type, Researchers.first_name || ' ' || Researchers.last_name AS [Full Name], Studies.date_created, Studies.date_closed FROM Studies INNER JOIN Researchers ON Studies.researcher_id = Researchers.researcher_id ORDER BY Studies.date_created DESC;")
-        rows = cur.fetchall()
+        rows = self._query(conn, 'select_all_studies', self.SQL_ALL_STUDIES,
+            record=recordmodel.Study)
         print(f"dbmodel: Found {len(rows)} total studies")
         return rows
 
 
+    def select_study(self, conn, study_id):
+        """ Select a single study by id.
+        """
+        print(f"\ndbmodel: Querying study {study_id[0]}...")
+        rows = self._query(conn, 'select_study', self.SQL_STUDY, study_id,
+            record=recordmodel.Study)
+        print(f"dbmodel: Found {len(rows)} studies")
+        return rows
+
+
+    def select_studies_page(self, conn, after=None, limit=PAGE_SIZE, 
+        open_only=False):
+        """ Select one page of studies, newest first.
+        :param after: (date_created, study_id) of the last row of the 
+            previous page, or None for the first page
+        :param limit: maximum number of rows
+        :param open_only: only select studies that are not closed
+        :return: list of rows. Fewer than limit rows means there are 
+            no more pages.
+        """
+        print(f"\ndbmodel: Querying page of studies after {after}...")
+        filter = self.SQL_OPEN_FILTER if open_only else ''
+        if after is None:
+            sql = self.SQL_STUDIES_FIRST_PAGE.format(filter=filter)
+            rows = self._query(conn, 'select_studies_first_page', sql,
+                [limit], record=recordmodel.StudyRow)
+        elif after[0] is not None:
+            sql = self.SQL_STUDIES_PAGE.format(filter=filter)
+            rows = self._query(conn, 'select_studies_page', sql, 
+                [after[0], after[1], limit], record=recordmodel.StudyRow)
+        else:
+            rows = []
+
+        # Continue into studies without a date_created
+        if len(rows) < limit:
+            if after is not None and after[0] is None:
+                last_id = after[1]
+            else:
+                # Larger than any rowid
+                last_id = 2**63 - 1
+            sql = self.SQL_STUDIES_NULL_PAGE.format(filter=filter)
+            rows.extend(self._query(conn, 'select_studies_null_page', sql,
+                [last_id, limit - len(rows)], record=recordmodel.StudyRow))
+
+        print(f"dbmodel: Found {len(rows)} studies")
+        return rows
+
+
     def select_active_researchers(self, conn):
         """ Select all active researchers.
         """
         print("\ndbmodel: Querying active researchers...")
-        cur = conn.cursor()
-        cur.execute("SELECT first_name || ' ' || last_name AS [researcher_name], researcher_id FROM Researchers WHERE status='active'")
-        rows = cur.fetchall()
+        rows = self._query(conn, 'select_active_researchers', 
+            self.SQL_ACTIVE_RESEARCHERS, record=recordmodel.Researcher)
         print(f"dbmodel: Found {len(rows)} active researchers")
         return rows
 
 
+    def select_all_researchers(self, conn):
+        """ Select every researcher, active or not.
+        """
+        print("\ndbmodel: Querying all researchers...")
+        rows = self._query(conn, 'select_all_researchers', 
+            self.SQL_ALL_RESEARCHERS, record=recordmodel.Researcher)
+        print(f"dbmodel: Found {len(rows)} researchers")
+        return rows
+
+
+    def select_study_names(self, conn):
+        """ Select (study_id, study_name) for every study.
+        """
+        print("\ndbmodel: Querying study names...")
+        rows = self._query(conn, 'select_study_names', self.SQL_STUDY_NAMES)
+        print(f"dbmodel: Found {len(rows)} studies")
+        return rows
+
+
     def select_amendments(self, conn, study_id):
         """ Select all amendments for a given study id.
         """
         print("\ndbmodel: Querying amendments...")
-        cur = conn.cursor()
-        sql = '''SELECT * FROM Amendments WHERE study_id=?'''
-        cur.execute(sql, study_id)
-        rows = cur.fetchall()
+        rows = self._query(conn, 'select_amendments', self.SQL_AMENDMENTS,
+            study_id, record=recordmodel.Amendment)
         print(f"dbmodel: Found {len(rows)} amendments")
         return rows
 
 
+    def select_all_amendments(self, conn):
+        """ Select all amendments for all studies.
+        """
+        print("\ndbmodel: Querying all amendments...")
+        rows = self._query(conn, 'select_all_amendments', 
+            "SELECT * FROM Amendments", record=recordmodel.Amendment)
+        print(f"dbmodel: Found {len(rows)} total amendments")
+        return rows
+
+
+    def select_amendment(self, conn, amend_id):
+        """ Select a single amendment by id.
+        """
+        print(f"\ndbmodel: Querying amendment {amend_id[0]}...")
+        rows = self._query(conn, 'select_amendment', self.SQL_AMENDMENT,
+            amend_id, record=recordmodel.Amendment)
+        print(f"dbmodel: Found {len(rows)} amendments")
+        return rows
+
+
+    def search(self, conn, query, limit=50):
+        """ Full-text search of study names, IRB references, 
+            researcher names and amendment rationales. Every word in 
+            query must match, as a word prefix.
+        :return: list of SearchHit records, best matches first. kind 
+            is 'study' or 'amendment'; ref_id is the study_id or 
+            amend_id.
+        """
+        print(f"\ndbmodel: Searching for '{query}'...")
+        # Quote each word so FTS5 query syntax in user input is 
+        # treated as text. The last word may still be being typed, 
+        # so it matches as a prefix.
+        terms = ['"' + word.replace('"', '""') + '"' 
+            for word in query.split()]
+        if not terms:
+            return []
+        terms[-1] += '*'
+        match = ' '.join(terms)
+
+        rows = self._query(conn, 'search', self.SQL_SEARCH, 
+            [*self.SEARCH_MARKS * 4, match, limit], 
+            record=recordmodel.SearchHit)
+        print(f"dbmodel: Found {len(rows)} matches")
+        return rows
+
+
     def update_amendment(self, conn, values):
         """ Update details in Amendments table.
+        :return: the amendment id
         """
         print(f"\ndbmodel: Updating amendment {values[-1]}...")
-        sql = '''UPDATE Amendments SET submit_date=?, approval_date=?, rationale=?, study_id=? WHERE amend_id=?'''
-        cur = conn.cursor()
-        try:
-            cur.execute(sql, values)
-            conn.commit()
-            print("dbmodel: Done!")
-        except sqlite3.IntegrityError as e:
-            print(f"dbmodel: {e}")
-            messagebox.showerror(
-                title="Request Failed",
-                message="Could not complete request!",
-                detail=f"{e}"
-            ) 
+        with self._immediate(conn, 'update_amendment'):
+            self._write(conn, 'update_amendment', 
+                self.WRITE_SQL['update_amendment'], values)
+        print("dbmodel: Done!")
+        return values[-1]
 
 
     def update_study(self, conn, values):
         """ Update details in Studies table.
+        :return: the study id
         """
         print(f"\ndbmodel: Updating study record: {values[6]}...")
-        sql = '''UPDATE Studies SET irb_ref=?, study_name=?, study_type=?, researcher_id=?, date_created=?, date_closed=? WHERE study_id=?'''
-        cur = conn.cursor()
-        try:
-            cur.execute(sql, values)
-            conn.commit()
-            print("dbmodel: Done!")
-        except sqlite3.IntegrityError as e:
-            print(f"dbmodel: {e}")
-            messagebox.showerror(
-                title="Request Failed",
-                message="Could not complete request!",
-                detail=f"{e}"
-            )
+        with self._immediate(conn, 'update_study'):
+            self._write(conn, 'update_study', 
+                self.WRITE_SQL['update_study'], values)
+        print("dbmodel: Done!")
+        return values[-1]
 
 
     def create_amendment(self, conn, values):
         """ Add a new amendment to the Amendments table.
+        :return: the new amendment id
         """
         print(f"\ndbmodel: Creating new amendment record...")
-        sql = '''INSERT INTO Amendments(submit_date, approval_date, rationale, study_id) VALUES(?,?,?,?)'''
-        cur = conn.cursor()
-        try:
-            cur.execute(sql, values)
-            conn.commit()
-        except sqlite3.IntegrityError as e:
-            print(f"dbmodel: {e}")
-            messagebox.showerror(
-                title="Request Failed",
-                message="Could not complete request!",
-                detail=f"{e}"
-            )
+        with self._immediate(conn, 'create_amendment'):
+            cur = self._write(conn, 'create_amendment', 
+                self.WRITE_SQL['create_amendment'], values)
+        return cur.lastrowid
   
 
     def create_study(self, conn, values):
         """ Add a new study to the Studies table.
+        :return: the new study id
         """
         print(f"\ndbmodel: Creating new study record...")
-        sql = '''INSERT INTO Studies(irb_ref, study_name, study_type, researcher_id, date_created, date_closed) VALUES(?,?,?,?,?,?)'''
-        cur = conn.cursor()
-        try:
-            cur.execute(sql, values)
-            conn.commit()
-        except sqlite3.IntegrityError as e:
-            print(f"dbmodel: {e}")
-            messagebox.showerror(
-                title="Request Failed",
-                message="Could not complete request!",
-                detail=f"{e}"
-            )
+        with self._immediate(conn, 'create_study'):
+            cur = self._write(conn, 'create_study', 
+                self.WRITE_SQL['create_study'], values)
+        return cur.lastrowid
+
+
+    def write_batch(self, conn, writes):
+        """ Run several record writes in one BEGIN IMMEDIATE 
+            transaction (one commit, one fsync). Each write has its 
+            own savepoint, so a write that breaks a constraint is 
+            rolled back and reported without losing the others.
+        :param writes: list of (name, values), name a WRITE_SQL key
+        :return: list of (name, record id, error) in the same order. 
+            error is None, or the DBError that rejected the write 
+            (record id is then None for creates).
+        """
+        print(f"\ndbmodel: Writing {len(writes)} queued record(s)...")
+        results = []
+        with self._immediate(conn, 'write_batch'):
+            for name, values in writes:
+                create = name.startswith('create')
+                conn.execute("SAVEPOINT write")
+                try:
+                    cur = self._write(conn, name, self.WRITE_SQL[name], 
+                        values)
+                except IntegrityViolation as e:
+                    print(f"dbmodel: {e}")
+                    conn.execute("ROLLBACK TO write")
+                    results.append((name, None if create else values[-1],
+                        e))
+                    continue
+                finally:
+                    conn.execute("RELEASE write")
+                results.append((name, cur.lastrowid if create 
+                    else values[-1], None))
+
+        print("dbmodel: Done!")
+        return results
+
+
+    #####################
+    # Summary Functions #
+    #####################
+    def select_study_counts(self, conn):
+        """ Count open and total studies from the summary table.
+        :return: (open, total)
+        """
+        return self._query(conn, 'select_study_counts', 
+            self.SQL_STUDY_COUNTS)[0]
+
+
+    def select_study_summary(self, conn, by):
+        """ Count studies per researcher or per year created.
+        :param by: 'researcher' or 'year'. Studies without one are
+            counted under ''.
+        :return: list of (researcher name or year, open, total)
+        """
+        return self._query(conn, f'select_study_summary_{by}', 
+            self.SQL_STUDY_SUMMARY[by])
+
+
+    def select_amendment_totals(self, conn):
+        """ Count all amendments, and those awaiting approval.
+        :return: (amendments, pending)
+        """
+        return self._query(conn, 'select_amendment_totals', 
+            self.SQL_AMENDMENT_TOTALS)[0]
+
+
+    def select_amendment_summary(self, conn, study_id):
+        """ Summarise one study's amendments.
+        :return: (amendments, last submit_date, pending). A study 
+            without amendments gives (0, None, 0).
+        """
+        rows = self._query(conn, 'select_amendment_summary', 
+            self.SQL_AMENDMENT_SUMMARY, [study_id])
+        return rows[0] if rows else (0, None, 0)
+
+
+    #######################
+    # Analytics Functions #
+    #######################
+    def select_study_columns(self, conn):
+        """ Select the study columns used by AnalyticsModel.
+        :return: list of (study_id, study_type, researcher_id, 
+            created day, closed day), by study_id. researcher_id is 
+            0 if missing.
+        """
+        return self._query(conn, 'select_study_columns', 
+            self.SQL_STUDY_COLUMNS, [self.NO_DAY] * 2)
+
+
+    def select_amendment_columns(self, conn):
+        """ Select the amendment columns used by AnalyticsModel.
+        :return: list of (study_id, submitted day, approved day)
+        """
+        return self._query(conn, 'select_amendment_columns', 
+            self.SQL_AMENDMENT_COLUMNS, [self.NO_DAY] * 2)
+
+
+    ####################
+    # Export Functions #
+    ####################
+    def count_export_rows(self, conn, kind, open_only=False):
+        """ Count the rows export_rows() will yield.
+        """
+        filter = self.SQL_EXPORT_OPEN_FILTER if open_only else ''
+        sql = f"SELECT count(*) {self.SQL_EXPORT_FROM[kind]}{filter}"
+        return self._query(conn, f'count_export_{kind}', sql)[0][0]
+
+
+    def export_rows(self, conn, kind, columns=None, open_only=False, 
+        size=5000):
+        """ Yield batches of up to size rows for export.
+        :param kind: 'studies' or 'amendments'
+        :param columns: column names from EXPORT_COLUMNS[kind], or 
+            None for all of them
+        :param open_only: only rows of studies that are not closed
+        """
+        available = self.EXPORT_COLUMNS[kind]
+        columns = list(columns or available)
+        unknown = [x for x in columns if x not in available]
+        if unknown:
+            raise ValueError(f"Unknown {kind} columns: {', '.join(unknown)}")
+
+        print(f"\ndbmodel: Exporting {kind}...")
+        filter = self.SQL_EXPORT_OPEN_FILTER if open_only else ''
+        sql = (f"SELECT {', '.join(available[x] for x in columns)} " +
+            f"{self.SQL_EXPORT_FROM[kind]}{filter}{self.SQL_EXPORT_ORDER[kind]}")
+        yield from self._stream(conn, f'export_{kind}', sql, size=size)
+
+
+    #########################
+    # Bulk Import Functions #
+    #########################
+    def upsert_studies(self, conn, rows):
+        """ Insert or update many studies in one transaction. Rows 
+            with a study_id that already exists update that study; 
+            rows without a study_id are added as new studies.
+        :param rows: list of (study_id or None, irb_ref, study_name, 
+            study_type, researcher_id, date_created, date_closed)
+        :return: (inserted, updated) counts
+        """
+        print(f"\ndbmodel: Importing {len(rows)} studies...")
+        return self._upsert(conn, 'studies', rows,
+            self.SQL_STAGE_STUDIES_TABLE, self.SQL_CLEAR_STUDIES, 
+            self.SQL_STAGE_STUDIES, self.SQL_COUNT_STUDY_UPDATES, self.SQL_MERGE_STUDIES)
+
+
+    def upsert_amendments(self, conn, rows):
+        """ Insert or update many amendments in one transaction. Rows 
+            with an amend_id that already exists update that 
+            amendment; rows without one are added.
+        :param rows: list of (amend_id or None, submit_date, 
+            approval_date, rationale, study_id)
+        :return: (inserted, updated) counts
+        """
+        print(f"\ndbmodel: Importing {len(rows)} amendments...")
+        return self._upsert(conn, 'amendments', rows,
+            self.SQL_STAGE_AMENDMENTS_TABLE, self.SQL_CLEAR_AMENDMENTS,
+            self.SQL_STAGE_AMENDMENTS, self.SQL_COUNT_AMENDMENT_UPDATES, self.SQL_MERGE_AMENDMENTS)
+
+
+    def _upsert(self, conn, kind, rows, table_sql, clear_sql, stage_sql, 
+        count_sql, merge_sql):
+        """ Stage rows in a temp table and merge them in one 
+            transaction.
+        """
+        self._write(conn, f'create_import_{kind}', table_sql)
+        with self._immediate(conn, f'import_{kind}'):
+            self._write(conn, f'clear_import_{kind}', clear_sql)
+            self._execute(conn, f'stage_{kind}', stage_sql, rows, 
+                fetch=False, many=True)
+            updated = self._query(conn, f'count_{kind}_updates', 
+                count_sql)[0][0]
+            self._write(conn, f'merge_{kind}', merge_sql)
+
+        print("dbmodel: Done!")
+        return len(rows) - updated, updated
@@ -0,0 +1,123 @@
+""" Streaming export of studies and amendments to CSV or Parquet.
+    Rows are read from the database in batches (see
+    DBModel.export_rows()) and written as they arrive, so memory use
+    does not grow with the number of rows.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import csv
+import os
+
+
+#########
+# BEGIN #
+#########
+class ExportModel:
+    """ Export records to a file. The format follows the file
+        extension: .csv or .parquet.
+    """
+    FORMATS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+    # Rows fetched and written at a time
+    BATCH_SIZE = 5000
+
+    # Integer columns (everything else is text)
+    INT_COLUMNS = ('study_id', 'researcher_id', 'amend_id')
+
+    def __init__(self, db):
+        self.db = db
+
+
+    def columns(self, kind):
+        """ Exportable column names for 'studies' or 'amendments'.
+        """
+        return list(self.db.EXPORT_COLUMNS[kind])
+
+
+    def export(self, conn, kind, path, columns=None, open_only=False,
+        progress=None):
+        """ Export records to path.
+        :param kind: 'studies' or 'amendments'
+        :param columns: column names to export, or None for all
+        :param open_only: only export rows of studies that are open
+        :param progress: called as progress(done, total) after each
+            batch
+        :return: number of rows written
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in self.FORMATS:
+            raise ValueError(f"Cannot export to '{ext}' files: use " +
+                f"{' or '.join(self.FORMATS)}")
+        columns = list(columns or self.columns(kind))
+
+        print(f"\nexportmodel: Exporting {kind} to {path}...")
+        total = self.db.count_export_rows(conn, kind, open_only)
+        batches = self.db.export_rows(conn, kind, columns, open_only,
+            self.BATCH_SIZE)
+        writer = {'csv': self._write_csv,
+            'parquet': self._write_parquet}[self.FORMATS[ext]]
+
+        # Write to a temporary file so a failed or cancelled export
+        # never leaves a partial file behind
+        part = path + '.part'
+        try:
+            count = writer(part, columns, batches, total, progress)
+            os.replace(part, path)
+        finally:
+            # Stop the query if writing failed
+            batches.close()
+            if os.path.exists(part):
+                os.remove(part)
+
+        print(f"exportmodel: Wrote {count} rows")
+        return count
+
+
+    def _write_csv(self, path, columns, batches, total, progress):
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(columns)
+            for rows in batches:
+                writer.writerows(rows)
+                count += len(rows)
+                if progress:
+                    progress(count, total)
+        return count
+
+
+    def _write_parquet(self, path, columns, batches, total, progress):
+        """ Write each batch as a Parquet row group.
+        """
+        # pyarrow is the Parquet engine pandas uses. It is only
+        # needed here.
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Exporting Parquet files needs the pyarrow "
+                "package. Export to CSV instead.")
+
+        # Fixed schema: a batch of all-NULL values must not change
+        # a column's type
+        schema = pa.schema([(name, pa.int64() if name in self.INT_COLUMNS
+            else pa.string()) for name in columns])
+
+        count = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in batches:
+                arrays = [pa.array(values, type=field.type) for values,
+                    field in zip(zip(*rows), schema)]
+                writer.write_table(pa.Table.from_arrays(arrays,
+                    schema=schema))
+                count += len(rows)
+                if progress:
+                    progress(count, total)
+            if not count:
+                writer.write_table(schema.empty_table())
+        return count
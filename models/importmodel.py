@@ -0,0 +1,410 @@
+""" Bulk import of studies and amendments from CSV or Excel files.
+    Rows are read as a stream, validated, and written in chunks with
+    DBModel.upsert_studies() and upsert_amendments(). Problems are
+    collected in a per-row ImportReport instead of being shown one
+    at a time.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import csv
+import datetime
+import os
+from itertools import islice
+
+# Import custom modules
+from functions import date_rules
+from models import dbmodel
+from models import indexmodel
+
+
+#########
+# BEGIN #
+#########
+class ImportReport:
+    """ Outcome of one import: counts plus a list of
+        (line number, message) for every row that was skipped.
+    """
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        self.total = 0
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []
+
+
+    @property
+    def skipped(self):
+        return len({line for line, _ in self.errors})
+
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+
+    def summary(self):
+        return (f"Read {self.total} {self.kind} from " +
+            f"{os.path.basename(self.path)}: {self.inserted} added, " +
+            f"{self.updated} updated, {self.skipped} skipped.")
+
+
+    def save(self, path):
+        """ Write the errors to a CSV file.
+        """
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['line', 'error'])
+            writer.writerows(self.errors)
+
+
+class ImportModel:
+    """ Read, validate and load study or amendment spreadsheets.
+
+        Study columns: study_id (optional: existing ids are updated),
+        irb_ref, study_name, study_type, researcher (full name) or
+        researcher_id, date_created, date_closed.
+
+        Amendment columns: amend_id (optional), submit_date,
+        approval_date, rationale, study_id or study_name.
+
+        Headers are matched case-insensitively; see HEADER_ALIASES
+        for alternative names.
+    """
+    # Rows written per transaction
+    CHUNK_SIZE = 5000
+
+    STUDY_TYPES = ('Main Study', 'Sub-Study')
+
+    # Alternative header -> column name
+    HEADER_ALIASES = {
+        'irb': 'irb_ref',
+        'irb_reference': 'irb_ref',
+        'name': 'study_name',
+        'study': 'study_name',
+        'type': 'study_type',
+        'researcher_name': 'researcher',
+        'full_name': 'researcher',
+        'created': 'date_created',
+        'closed': 'date_closed',
+        'submitted': 'submit_date',
+        'approved': 'approval_date',
+    }
+
+    def __init__(self, db):
+        self.db = db
+
+
+    ####################
+    # Import Functions #
+    ####################
+    def import_studies(self, conn, path):
+        """ Import studies from a CSV or Excel file.
+        :return: ImportReport
+        """
+        print(f"\nimportmodel: Importing studies from {path}...")
+        report = ImportReport('studies', path)
+        rows = self.read_rows(path, report)
+        if not self._check_columns(rows, report, ['study_name'],
+            [('researcher', 'researcher_id')]):
+            return report
+
+        # Resolve researcher names to ids in one pass
+        researchers = indexmodel.NameIndex((x.researcher_id, x.name)
+            for x in self.db.select_all_researchers(conn))
+
+        valid = ((line, self._validate_study(line, row, researchers,
+            report)) for line, row in rows)
+        self._load(conn, valid, self.db.upsert_studies, report)
+        print(f"importmodel: {report.summary()}")
+        return report
+
+
+    def import_amendments(self, conn, path):
+        """ Import amendments from a CSV or Excel file.
+        :return: ImportReport
+        """
+        print(f"\nimportmodel: Importing amendments from {path}...")
+        report = ImportReport('amendments', path)
+        rows = self.read_rows(path, report)
+        if not self._check_columns(rows, report, [],
+            [('study_id', 'study_name')]):
+            return report
+
+        # Resolve study names to ids in one pass
+        studies = indexmodel.NameIndex(self.db.select_study_names(conn))
+
+        valid = ((line, self._validate_amendment(line, row, studies,
+            report)) for line, row in rows)
+        self._load(conn, valid, self.db.upsert_amendments, report)
+        print(f"importmodel: {report.summary()}")
+        return report
+
+
+    def _load(self, conn, rows, upsert, report):
+        """ Write valid rows in chunks of CHUNK_SIZE, one transaction
+            per chunk. A chunk with a row that breaks a constraint is
+            rolled back and written again row by row, so only the 
+            failing rows are skipped.
+        :param rows: (line number, values or None) pairs
+        """
+        rows = ((line, values) for line, values in rows 
+            if values is not None)
+        while True:
+            chunk = list(islice(rows, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            try:
+                inserted, updated = upsert(conn, 
+                    [values for _, values in chunk])
+            except dbmodel.IntegrityViolation:
+                print("importmodel: Retrying the chunk row by row...")
+                inserted, updated = self._load_rows(conn, chunk, upsert, 
+                    report)
+            report.inserted += inserted
+            report.updated += updated
+
+
+    def _load_rows(self, conn, chunk, upsert, report):
+        """ Write rows one transaction each, reporting the rows that
+            break a constraint.
+        :return: (inserted, updated) counts
+        """
+        inserted = updated = 0
+        for line, values in chunk:
+            try:
+                added, changed = upsert(conn, [values])
+            except dbmodel.IntegrityViolation as e:
+                report.add_error(line, str(e))
+                continue
+            inserted += added
+            updated += changed
+        return inserted, updated
+
+
+    #####################
+    # Reading Functions #
+    #####################
+    def read_rows(self, path, report):
+        """ Stream (line number, row dict) pairs from a CSV or Excel
+            file. Keys are normalised column names; blank values are
+            None.
+        :return: RowReader object (an iterator with a columns
+            attribute)
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.xlsx', '.xlsm'):
+            return RowReader(self._read_excel(path), self._normalise, report)
+        return RowReader(self._read_csv(path), self._normalise, report)
+
+
+    def _read_csv(self, path):
+        # utf-8-sig drops the byte order mark Excel adds to CSV files
+        with open(path, 'r', newline='', encoding='utf-8-sig') as fh:
+            yield from csv.reader(fh)
+
+
+    def _read_excel(self, path):
+        """ Read the first worksheet of an Excel workbook.
+        """
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError("Importing Excel files needs the openpyxl "
+                "package. Save the sheet as CSV instead.")
+        workbook = openpyxl.load_workbook(path, read_only=True,
+            data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+
+    def _normalise(self, header):
+        name = str(header or '').strip().lower().replace(' ', '_')
+        return self.HEADER_ALIASES.get(name, name)
+
+
+    def _check_columns(self, rows, report, required, one_of):
+        """ Report missing columns.
+        :param required: columns that must be present
+        :param one_of: tuples of columns of which at least one must
+            be present
+        """
+        missing = [x for x in required if x not in rows.columns]
+        missing += [' or '.join(x) for x in one_of
+            if not any(col in rows.columns for col in x)]
+        for column in missing:
+            report.add_error(1, f"Missing column: {column}")
+        return not missing
+
+
+    ########################
+    # Validation Functions #
+    ########################
+    def _validate_study(self, line, row, researchers, report):
+        """ Return the row as a DBModel.upsert_studies() tuple, or
+            None after reporting why it is invalid.
+        """
+        report.total += 1
+        errors = []
+        study_id = self._id(row, 'study_id', errors)
+        study_name = self._text(row, 'study_name')
+        if study_name is None:
+            errors.append("study_name is required")
+        study_type = self._text(row, 'study_type')
+        if study_type is not None and study_type not in self.STUDY_TYPES:
+            errors.append(f"Unknown study_type '{study_type}' (use " +
+                f"{' or '.join(self.STUDY_TYPES)})")
+
+        # Researcher by id, or else by name
+        researcher_id = self._id(row, 'researcher_id', errors)
+        name = self._text(row, 'researcher')
+        if researcher_id is not None:
+            if researchers.name(researcher_id) is None:
+                errors.append(f"Unknown researcher_id {researcher_id}")
+        elif name is None:
+            errors.append("researcher is required")
+        else:
+            researcher_id = researchers.lookup(name)
+            if researcher_id is None:
+                if researchers.ids(name):
+                    errors.append(f"Researcher name '{name}' is shared " +
+                        "by several researchers: use researcher_id")
+                else:
+                    errors.append(f"Unknown researcher '{name}'")
+
+        created = self._date(row, 'date_created', errors)
+        closed = self._date(row, 'date_closed', errors)
+        if created and closed and closed < created:
+            errors.append("date_closed is before date_created")
+
+        return self._result(line, errors, report, (study_id,
+            self._text(row, 'irb_ref'), study_name, study_type,
+            researcher_id, created, closed))
+
+
+    def _validate_amendment(self, line, row, studies, report):
+        """ Return the row as a DBModel.upsert_amendments() tuple, or
+            None after reporting why it is invalid.
+        """
+        report.total += 1
+        errors = []
+        amend_id = self._id(row, 'amend_id', errors)
+
+        # Study by id, or else by name
+        study_id = self._id(row, 'study_id', errors)
+        name = self._text(row, 'study_name')
+        if study_id is not None:
+            if studies.name(study_id) is None:
+                errors.append(f"Unknown study_id {study_id}")
+        elif name is None:
+            errors.append("study_id or study_name is required")
+        else:
+            study_id = studies.lookup(name)
+            if study_id is None:
+                if studies.ids(name):
+                    errors.append(f"Study name '{name}' is shared by " +
+                        "several studies: use study_id")
+                else:
+                    errors.append(f"Unknown study '{name}'")
+
+        submitted = self._date(row, 'submit_date', errors)
+        approved = self._date(row, 'approval_date', errors)
+        if submitted and approved and approved < submitted:
+            errors.append("approval_date is before submit_date")
+
+        return self._result(line, errors, report, (amend_id, submitted,
+            approved, self._text(row, 'rationale'), study_id))
+
+
+    def _result(self, line, errors, report, values):
+        for message in errors:
+            report.add_error(line, message)
+        return None if errors else values
+
+
+    def _text(self, row, column):
+        return row.get(column)
+
+
+    def _id(self, row, column, errors):
+        """ Return an optional positive integer id.
+        """
+        value = row.get(column)
+        if value is None:
+            return None
+        if not value.isdigit() or int(value) == 0:
+            errors.append(f"{column}: '{value}' is not a valid id")
+            return None
+        return int(value)
+
+
+    def _date(self, row, column, errors):
+        """ Return an optional date, checked with the DateEntry
+            rules.
+        """
+        value = row.get(column)
+        if value is not None and not date_rules.is_valid_date(value):
+            errors.append(f"{column}: invalid date '{value}' " +
+                "(use YYYY-MM-DD)")
+            return None
+        return value
+
+
+class RowReader:
+    """ Iterate over (line number, row dict) for the data rows of a
+        sheet. The header row is read on creation and its normalised
+        names are in columns.
+    """
+    def __init__(self, source, normalise, report):
+        self._source = iter(source)
+        self.report = report
+        self.line = 1
+        try:
+            header = next(self._source)
+        except StopIteration:
+            header = []
+        self.columns = [normalise(x) for x in header]
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        while True:
+            values = next(self._source)
+            self.line += 1
+            values = [self._cell(x) for x in values]
+            # Skip blank lines
+            if not any(x is not None for x in values):
+                continue
+            if len(values) > len(self.columns) and any(
+                x is not None for x in values[len(self.columns):]):
+                self.report.total += 1
+                self.report.add_error(self.line,
+                    "Row has more values than there are columns")
+                continue
+            return self.line, dict(zip(self.columns, values))
+
+
+    @staticmethod
+    def _cell(value):
+        """ Convert a cell to a stripped string, or None if blank.
+        """
+        if value is None:
+            return None
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        if isinstance(value, float) and value.is_integer():
+            # Excel stores ids as floats
+            value = int(value)
+        value = str(value).strip()
+        return value or None
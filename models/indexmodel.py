@@ -0,0 +1,112 @@
+""" Bidirectional name <-> id index for study and researcher records.
+
+    Written by: Travis M. Moore
+"""
+
+#########
+# BEGIN #
+#########
+class NameIndex:
+    """ Map names to ids and ids to names. Names need not be unique:
+        labels for duplicate names include the id so every label
+        refers to exactly one record.
+    """
+    def __init__(self, pairs=()):
+        # id -> name
+        self._names = {}
+        # name -> set of ids
+        self._ids = {}
+
+        for id, name in pairs:
+            self.add(id, name)
+
+
+    def __len__(self):
+        return len(self._names)
+
+
+    def copy(self):
+        """ Return an independent copy of the index.
+        """
+        new = NameIndex()
+        new._names = dict(self._names)
+        new._ids = {name: set(ids) for name, ids in self._ids.items()}
+        return new
+
+
+    ##################
+    # Edit Functions #
+    ##################
+    def add(self, id, name):
+        """ Add or rename a record.
+        """
+        self.remove(id)
+        self._names[id] = name
+        self._ids.setdefault(name, set()).add(id)
+
+
+    def remove(self, id):
+        """ Remove a record, if present.
+        """
+        name = self._names.pop(id, None)
+        if name is None:
+            return
+        ids = self._ids[name]
+        ids.discard(id)
+        if not ids:
+            del self._ids[name]
+
+
+    ####################
+    # Lookup Functions #
+    ####################
+    def name(self, id):
+        return self._names.get(id)
+
+
+    def ids(self, name):
+        """ Return every id with the given name.
+        """
+        return sorted(self._ids.get(name, ()))
+
+
+    def label(self, id):
+        """ Display label for a record: the name, plus the id if the
+            name is shared with another record.
+        """
+        name = self._names[id]
+        if len(self._ids[name]) > 1:
+            return f"{name} (ID {id})"
+        return name
+
+
+    def labels(self, ids=None):
+        """ Sorted list of display labels, for every record or only
+            for those in ids.
+        """
+        if ids is None:
+            ids = self._names
+        return sorted(self.label(id) for id in ids if id in self._names)
+
+
+    def lookup(self, label):
+        """ Return the id for a display label, or for a plain name if
+            it is unique. Return None otherwise (including for a blank
+            or missing label).
+        """
+        if not isinstance(label, str) or not label:
+            return None
+        ids = self._ids.get(label)
+        if ids:
+            return next(iter(ids)) if len(ids) == 1 else None
+
+        # Duplicate names are labelled "name (ID n)"
+        name, sep, id = label.rpartition(' (ID ')
+        if sep and id.endswith(')'):
+            try:
+                id = int(id[:-1])
+            except ValueError:
+                return None
+            if self._names.get(id) == name:
+                return id
+        return None
@@ -0,0 +1,386 @@
+""" Versioned schema migrations for the study database. The schema
+    version is stored in PRAGMA user_version.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import database packages
+import sqlite3
+
+# Import custom modules
+from models import dbmodel
+
+
+#########
+# BEGIN #
+#########
+class MigrationModel:
+    """ Create the database schema from scratch, or upgrade an
+        existing database in place. Each migration runs in its own
+        transaction together with the user_version bump, so a failed
+        migration leaves the database at the previous version.
+    """
+    # Migration scripts. Version N is migrations[N-1].
+    migrations = [
+        # 1: Base schema. IF NOT EXISTS adopts databases created
+        # before migrations were tracked.
+        """
+        CREATE TABLE IF NOT EXISTS Researchers (
+            researcher_id INTEGER PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active'
+        );
+        CREATE TABLE IF NOT EXISTS Studies (
+            study_id INTEGER PRIMARY KEY,
+            irb_ref TEXT,
+            study_name TEXT NOT NULL,
+            study_type TEXT,
+            researcher_id INTEGER REFERENCES Researchers(researcher_id),
+            date_created TEXT,
+            date_closed TEXT
+        );
+        CREATE TABLE IF NOT EXISTS Amendments (
+            amend_id INTEGER PRIMARY KEY,
+            submit_date TEXT,
+            approval_date TEXT,
+            rationale TEXT,
+            study_id INTEGER REFERENCES Studies(study_id)
+        );
+        """,
+
+        # 2: Indexes for every hot DBModel query
+        """
+        -- select_all_studies: covering, in ORDER BY order
+        CREATE INDEX IF NOT EXISTS idx_studies_created ON Studies (
+            date_created DESC, study_id, irb_ref, study_name, study_type,
+            researcher_id, date_closed
+        );
+        -- select_open_studies: partial and covering
+        CREATE INDEX IF NOT EXISTS idx_studies_open ON Studies (
+            date_created DESC, study_id, irb_ref, study_name, study_type,
+            researcher_id, date_closed
+        ) WHERE date_closed IS NULL;
+        -- get_studyid_from_name
+        CREATE INDEX IF NOT EXISTS idx_studies_name
+            ON Studies (study_name);
+        -- select_amendments
+        CREATE INDEX IF NOT EXISTS idx_amendments_study
+            ON Amendments (study_id);
+        -- select_active_researchers: covering (researcher_id is the
+        -- rowid, so every index includes it)
+        CREATE INDEX IF NOT EXISTS idx_researchers_status
+            ON Researchers (status, first_name, last_name);
+        ANALYZE;
+        """,
+
+        # 3: Keyset pagination on (date_created, study_id). Scanned
+        # backwards, these also serve ORDER BY date_created DESC, so
+        # they replace the version 2 study indexes.
+        """
+        DROP INDEX IF EXISTS idx_studies_created;
+        DROP INDEX IF EXISTS idx_studies_open;
+        CREATE INDEX IF NOT EXISTS idx_studies_keyset ON Studies (
+            date_created, study_id, irb_ref, study_name, study_type,
+            researcher_id, date_closed
+        );
+        CREATE INDEX IF NOT EXISTS idx_studies_open_keyset ON Studies (
+            date_created, study_id, irb_ref, study_name, study_type,
+            researcher_id, date_closed
+        ) WHERE date_closed IS NULL;
+        ANALYZE;
+        """,
+
+        # 4: Full-text search over studies and amendment rationales,
+        # kept in sync by triggers. Studies are stored at rowid
+        # study_id*2 and amendments at amend_id*2+1, so the triggers
+        # find their rows by rowid instead of scanning the index.
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS SearchIndex USING fts5 (
+            kind UNINDEXED,
+            ref_id UNINDEXED,
+            study_id UNINDEXED,
+            study_name,
+            irb_ref,
+            researcher,
+            rationale,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+        -- Used to re-index a researcher's studies
+        CREATE INDEX IF NOT EXISTS idx_studies_researcher
+            ON Studies (researcher_id);
+
+        INSERT INTO SearchIndex (rowid, kind, ref_id, study_id,
+            study_name, irb_ref, researcher)
+        SELECT Studies.study_id * 2, 'study', Studies.study_id,
+            Studies.study_id, Studies.study_name, Studies.irb_ref,
+            Researchers.first_name || ' ' || Researchers.last_name
+        FROM Studies LEFT JOIN Researchers
+            ON Studies.researcher_id = Researchers.researcher_id;
+        INSERT INTO SearchIndex (rowid, kind, ref_id, study_id, rationale)
+        SELECT amend_id * 2 + 1, 'amendment', amend_id, study_id,
+            rationale
+        FROM Amendments;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_study_insert
+        AFTER INSERT ON Studies BEGIN
+            INSERT INTO SearchIndex (rowid, kind, ref_id, study_id,
+                study_name, irb_ref, researcher)
+            SELECT new.study_id * 2, 'study', new.study_id, new.study_id,
+                new.study_name, new.irb_ref,
+                (SELECT first_name || ' ' || last_name FROM Researchers
+                    WHERE researcher_id = new.researcher_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_study_update
+        AFTER UPDATE OF study_name, irb_ref, researcher_id ON Studies BEGIN
+            DELETE FROM SearchIndex WHERE rowid = old.study_id * 2;
+            INSERT INTO SearchIndex (rowid, kind, ref_id, study_id,
+                study_name, irb_ref, researcher)
+            SELECT new.study_id * 2, 'study', new.study_id, new.study_id,
+                new.study_name, new.irb_ref,
+                (SELECT first_name || ' ' || last_name FROM Researchers
+                    WHERE researcher_id = new.researcher_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_study_delete
+        AFTER DELETE ON Studies BEGIN
+            DELETE FROM SearchIndex WHERE rowid = old.study_id * 2;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_amendment_insert
+        AFTER INSERT ON Amendments BEGIN
+            INSERT INTO SearchIndex (rowid, kind, ref_id, study_id,
+                rationale)
+            VALUES (new.amend_id * 2 + 1, 'amendment', new.amend_id,
+                new.study_id, new.rationale);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_amendment_update
+        AFTER UPDATE OF rationale, study_id ON Amendments BEGIN
+            DELETE FROM SearchIndex WHERE rowid = old.amend_id * 2 + 1;
+            INSERT INTO SearchIndex (rowid, kind, ref_id, study_id,
+                rationale)
+            VALUES (new.amend_id * 2 + 1, 'amendment', new.amend_id,
+                new.study_id, new.rationale);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_amendment_delete
+        AFTER DELETE ON Amendments BEGIN
+            DELETE FROM SearchIndex WHERE rowid = old.amend_id * 2 + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_researcher_update
+        AFTER UPDATE OF first_name, last_name ON Researchers BEGIN
+            DELETE FROM SearchIndex WHERE rowid IN (
+                SELECT study_id * 2 FROM Studies
+                WHERE researcher_id = new.researcher_id);
+            INSERT INTO SearchIndex (rowid, kind, ref_id, study_id,
+                study_name, irb_ref, researcher)
+            SELECT study_id * 2, 'study', study_id, study_id, study_name,
+                irb_ref, new.first_name || ' ' || new.last_name
+            FROM Studies WHERE researcher_id = new.researcher_id;
+        END;
+        ANALYZE;
+        """,
+
+        # 5: Summary tables kept up to date by triggers, so counts
+        # cost a few rows instead of a table scan. StudyCounts holds
+        # the number of studies per (status, researcher, year);
+        # researcher_id 0 and year '' stand for missing values.
+        # AmendmentSummary holds one row per study with amendments; 
+        # each change recounts that study's amendments through 
+        # idx_amendments_study.
+        """
+        CREATE TABLE IF NOT EXISTS StudyCounts (
+            status TEXT NOT NULL,
+            researcher_id INTEGER NOT NULL,
+            year TEXT NOT NULL,
+            studies INTEGER NOT NULL,
+            PRIMARY KEY (status, researcher_id, year)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS AmendmentSummary (
+            study_id INTEGER PRIMARY KEY,
+            amendments INTEGER NOT NULL,
+            last_submit_date TEXT,
+            pending INTEGER NOT NULL
+        );
+
+        DELETE FROM StudyCounts;
+        INSERT INTO StudyCounts (status, researcher_id, year, studies)
+        SELECT CASE WHEN date_closed IS NULL THEN 'open' ELSE 'closed' END,
+            IFNULL(researcher_id, 0), IFNULL(substr(date_created, 1, 4), ''),
+            count(*)
+        FROM Studies GROUP BY 1, 2, 3;
+
+        DELETE FROM AmendmentSummary;
+        INSERT INTO AmendmentSummary 
+            (study_id, amendments, last_submit_date, pending)
+        SELECT study_id, count(*), max(submit_date), 
+            sum(approval_date IS NULL)
+        FROM Amendments WHERE study_id IS NOT NULL GROUP BY study_id;
+
+        CREATE TRIGGER IF NOT EXISTS trg_counts_study_insert
+        AFTER INSERT ON Studies BEGIN
+            INSERT INTO StudyCounts (status, researcher_id, year, studies)
+            VALUES (CASE WHEN new.date_closed IS NULL THEN 'open' 
+                ELSE 'closed' END, IFNULL(new.researcher_id, 0), 
+                IFNULL(substr(new.date_created, 1, 4), ''), 1)
+            ON CONFLICT (status, researcher_id, year) 
+            DO UPDATE SET studies = studies + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_counts_study_delete
+        AFTER DELETE ON Studies BEGIN
+            UPDATE StudyCounts SET studies = studies - 1
+            WHERE status = CASE WHEN old.date_closed IS NULL THEN 'open' 
+                ELSE 'closed' END
+            AND researcher_id = IFNULL(old.researcher_id, 0)
+            AND year = IFNULL(substr(old.date_created, 1, 4), '');
+            DELETE FROM StudyCounts WHERE studies = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_counts_study_update
+        AFTER UPDATE OF researcher_id, date_created, date_closed 
+        ON Studies BEGIN
+            UPDATE StudyCounts SET studies = studies - 1
+            WHERE status = CASE WHEN old.date_closed IS NULL THEN 'open' 
+                ELSE 'closed' END
+            AND researcher_id = IFNULL(old.researcher_id, 0)
+            AND year = IFNULL(substr(old.date_created, 1, 4), '');
+            INSERT INTO StudyCounts (status, researcher_id, year, studies)
+            VALUES (CASE WHEN new.date_closed IS NULL THEN 'open' 
+                ELSE 'closed' END, IFNULL(new.researcher_id, 0), 
+                IFNULL(substr(new.date_created, 1, 4), ''), 1)
+            ON CONFLICT (status, researcher_id, year) 
+            DO UPDATE SET studies = studies + 1;
+            DELETE FROM StudyCounts WHERE studies = 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_summary_amendment_insert
+        AFTER INSERT ON Amendments BEGIN
+            INSERT OR REPLACE INTO AmendmentSummary 
+                (study_id, amendments, last_submit_date, pending)
+            SELECT study_id, count(*), max(submit_date), 
+                sum(approval_date IS NULL)
+            FROM Amendments WHERE study_id = new.study_id GROUP BY study_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_summary_amendment_delete
+        AFTER DELETE ON Amendments BEGIN
+            DELETE FROM AmendmentSummary WHERE study_id = old.study_id;
+            INSERT INTO AmendmentSummary 
+                (study_id, amendments, last_submit_date, pending)
+            SELECT study_id, count(*), max(submit_date), 
+                sum(approval_date IS NULL)
+            FROM Amendments WHERE study_id = old.study_id GROUP BY study_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_summary_amendment_update
+        AFTER UPDATE OF submit_date, approval_date, study_id 
+        ON Amendments BEGIN
+            DELETE FROM AmendmentSummary 
+            WHERE study_id IN (old.study_id, new.study_id);
+            INSERT INTO AmendmentSummary 
+                (study_id, amendments, last_submit_date, pending)
+            SELECT study_id, count(*), max(submit_date), 
+                sum(approval_date IS NULL)
+            FROM Amendments WHERE study_id IN (old.study_id, new.study_id)
+            GROUP BY study_id;
+        END;
+        ANALYZE;
+        """,
+    ]
+
+    # Queries that must not scan a table or sort in a temp b-tree.
+    # Name: (sql, example parameters)
+    hot_queries = {
+        'get_studyid_from_name': (
+            dbmodel.DBModel.SQL_STUDYID_FROM_NAME, ('',)),
+        'select_open_studies': (dbmodel.DBModel.SQL_OPEN_STUDIES, ()),
+        'select_all_studies': (dbmodel.DBModel.SQL_ALL_STUDIES, ()),
+        'select_study': (dbmodel.DBModel.SQL_STUDY, (0,)),
+        'select_active_researchers': (
+            dbmodel.DBModel.SQL_ACTIVE_RESEARCHERS, ()),
+        'select_amendments': (dbmodel.DBModel.SQL_AMENDMENTS, (0,)),
+        'select_amendment': (dbmodel.DBModel.SQL_AMENDMENT, (0,)),
+        'select_studies_first_page': (
+            dbmodel.DBModel.SQL_STUDIES_FIRST_PAGE.format(filter=''), (1,)),
+        'select_studies_page': (
+            dbmodel.DBModel.SQL_STUDIES_PAGE.format(filter=''), ('', 0, 1)),
+        'select_studies_null_page': (
+            dbmodel.DBModel.SQL_STUDIES_NULL_PAGE.format(filter=''), (0, 1)),
+        'select_open_studies_first_page': (
+            dbmodel.DBModel.SQL_STUDIES_FIRST_PAGE.format(
+                filter=dbmodel.DBModel.SQL_OPEN_FILTER), (1,)),
+        'select_open_studies_page': (
+            dbmodel.DBModel.SQL_STUDIES_PAGE.format(
+                filter=dbmodel.DBModel.SQL_OPEN_FILTER), ('', 0, 1)),
+        'select_open_studies_null_page': (
+            dbmodel.DBModel.SQL_STUDIES_NULL_PAGE.format(
+                filter=dbmodel.DBModel.SQL_OPEN_FILTER), (0, 1)),
+        'select_amendment_summary': (
+            dbmodel.DBModel.SQL_AMENDMENT_SUMMARY, (0,)),
+    }
+
+
+    @property
+    def latest_version(self):
+        return len(self.migrations)
+
+
+    def get_version(self, conn):
+        """ Return the schema version of the database.
+        """
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+    def migrate(self, conn, target=None):
+        """ Apply any migrations the database has not had yet.
+        :param target: stop at this version instead of the latest
+        :return: the schema version after migrating
+        """
+        if target is None:
+            target = self.latest_version
+        version = self.get_version(conn)
+        print(f"\nmigrationmodel: Schema version {version} " +
+            f"(latest: {self.latest_version})")
+        if version > self.latest_version:
+            print("migrationmodel: Database is newer than this app!")
+            return version
+
+        for script in self.migrations[version:target]:
+            version += 1
+            print(f"migrationmodel: Migrating to version {version}...")
+            try:
+                conn.executescript(
+                    f"BEGIN;\n{script}\n" +
+                    f"PRAGMA user_version={version};\nCOMMIT;"
+                )
+            except sqlite3.Error as e:
+                print(f"migrationmodel: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            print("migrationmodel: Done!")
+
+        return version
+
+
+    def check_query_plans(self, conn):
+        """ Check every hot query for full table scans and temporary
+            sorts.
+        :return: dict of query name: offending plan steps
+        """
+        print("\nmigrationmodel: Checking query plans...")
+        problems = {}
+        for name, (sql, params) in self.hot_queries.items():
+            bad = []
+            for detail in dbmodel.DBModel.explain(conn, sql, params):
+                full_scan = (detail.startswith('SCAN')
+                    and 'INDEX' not in detail)
+                if full_scan or 'TEMP B-TREE' in detail:
+                    bad.append(detail)
+            if bad:
+                print(f"migrationmodel: {name}: {'; '.join(bad)}")
+                problems[name] = bad
+
+        if not problems:
+            print("migrationmodel: All hot queries use indexes")
+        return problems
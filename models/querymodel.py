@@ -0,0 +1,224 @@
+""" Background query executor. Runs database work on a worker
+    thread and hands the results back to the Tk thread through
+    after() polling, so the mainloop never blocks on database I/O.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import queue
+import threading
+
+
+#########
+# BEGIN #
+#########
+class QueryJob:
+    """ A unit of database work submitted to the QueryExecutor.
+    """
+    def __init__(self, func, args, callback=None, errback=None, key=None):
+        self.func = func
+        self.args = args
+        self.callback = callback
+        self.errback = errback
+        self.key = key
+        self.cancelled = False
+
+        # Set by the worker thread when the job has run
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+    def cancel(self):
+        """ Drop the job's result. The callback will not be called.
+        """
+        self.cancelled = True
+
+
+class QueryExecutor:
+    """ Run database functions on a single worker thread. Jobs run in
+        the order they were submitted, so a write followed by a read
+        always sees the write.
+
+        Each job function is called as func(conn, *args), where conn
+        is the worker thread's connection from the pool. Results are
+        passed to callback(result) and exceptions to errback(error) on
+        the Tk thread.
+
+        Jobs submitted with a key supersede any earlier job with the
+        same key: a queued job is skipped and a running job is
+        interrupted. Only use keys for reads.
+
+        Long jobs can report progress with call_soon(), which runs a
+        function on the Tk thread.
+    """
+    def __init__(self, root, pool, poll_ms=25, on_busy=None,
+        name='QueryExecutor'):
+        """
+        :param name: name of the worker thread
+        """
+        self.root = root
+        self.pool = pool
+        self.poll_ms = poll_ms
+        self.on_busy = on_busy
+
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._calls = queue.Queue()
+        self._latest = {}
+        self._running = None
+        self._running_lock = threading.Lock()
+        self._conn = None
+        self._pending = 0
+        self._notified = 0
+
+        # Start worker thread
+        self._thread = threading.Thread(target=self._run,
+            name=name, daemon=True)
+        self._thread.start()
+
+        # Start polling for results
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+
+    @property
+    def busy(self):
+        """ True while any job is queued or running.
+        """
+        return self._pending > 0
+
+
+    def submit(self, func, *args, callback=None, errback=None, key=None):
+        """ Queue func(conn, *args) to run on the worker thread.
+        :return: QueryJob object
+        """
+        job = QueryJob(func, args, callback, errback, key)
+        if key is not None:
+            if key in self._latest:
+                self.cancel(self._latest[key])
+            self._latest[key] = job
+
+        self._pending += 1
+        self._notify_busy()
+        self._jobs.put(job)
+        return job
+
+
+    def call_soon(self, func, *args):
+        """ Call func(*args) on the Tk thread at the next poll. Safe
+            to call from the worker thread.
+        """
+        self._calls.put((func, args))
+
+
+    def cancel(self, job):
+        """ Cancel a job. If it is running, interrupt its query.
+        """
+        job.cancel()
+        with self._running_lock:
+            if self._running is job and job.key is not None:
+                self._conn.interrupt()
+
+
+    def wait(self, job, timeout=None):
+        """ Block until a job has run. On the Tk thread this freezes
+            the window: only use it when that is wanted (on exit).
+            The job's callback or errback still runs at the next 
+            poll.
+        :return: False if the job did not finish within timeout.
+            Otherwise check job.error and job.result.
+        """
+        return job.done.wait(timeout)
+
+
+    def shutdown(self, timeout=5):
+        """ Cancel queued reads, finish queued writes and stop the
+            worker thread.
+        :return: False if the worker thread is still running
+        """
+        print("\nquerymodel: Shutting down query executor...")
+        for job in list(self._latest.values()):
+            self.cancel(job)
+        self._jobs.put(None)
+        self._thread.join(timeout)
+        self.root.after_cancel(self._after_id)
+        if self._thread.is_alive():
+            print("querymodel: Worker thread is still running")
+            return False
+        print("querymodel: Done!")
+        return True
+
+
+    def _run(self):
+        """ Worker thread loop.
+        """
+        self._conn = self.pool.health_check()
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            result = None
+            error = None
+            if not job.cancelled:
+                with self._running_lock:
+                    self._running = job
+                try:
+                    result = job.func(self._conn, *job.args)
+                except Exception as e:
+                    error = e
+                with self._running_lock:
+                    self._running = None
+
+            job.result, job.error = result, error
+            job.done.set()
+            self._results.put((job, result, error))
+
+        self.pool.release()
+
+
+    def _poll(self):
+        """ Deliver progress calls and finished jobs on the Tk 
+            thread.
+        """
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+
+        while True:
+            try:
+                job, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            self._pending -= 1
+            if self._latest.get(job.key) is job:
+                del self._latest[job.key]
+
+            if job.cancelled:
+                continue
+            if error is not None:
+                if job.errback:
+                    job.errback(error)
+                else:
+                    print(f"querymodel: {error}")
+            elif job.callback:
+                job.callback(result)
+
+        self._notify_busy()
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+
+    def _notify_busy(self):
+        """ Report the number of jobs in flight when it changes.
+        """
+        if self.on_busy and self._pending != self._notified:
+            self._notified = self._pending
+            self.on_busy(self._pending)
@@ -0,0 +1,164 @@
+""" Record classes for query results. Each is a named tuple with
+    __slots__ = (): named field access at the size of a plain tuple.
+    DBModel builds them with from_rows(), which also keeps a single
+    copy of strings that repeat across rows (researcher names, study
+    types, dates) instead of one copy per row.
+
+    The same record objects are shared by the cache, the trees and
+    the record views; nothing copies them into lists of its own.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+from collections import namedtuple
+
+
+#########
+# BEGIN #
+#########
+class Record:
+    """ Shared behaviour for the record classes below.
+    """
+    __slots__ = ()
+
+    # Fields whose values repeat across rows
+    SHARED = ()
+
+    # Tk variable dict key -> field, where they differ
+    VAR_FIELDS = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ Convert query rows (tuples in field order) to records.
+        """
+        if not rows:
+            return []
+        make = cls._make_row
+        if not cls.SHARED:
+            return list(map(make, rows))
+
+        # Work column by column so the loops run in C
+        columns = list(zip(*rows))
+        share = {}.setdefault
+        for field in cls.SHARED:
+            ii = cls._fields.index(field)
+            columns[ii] = map(share, columns[ii], columns[ii])
+        return list(map(make, zip(*columns)))
+
+
+    @classmethod
+    def from_vars(cls, vars):
+        """ Build a record from a dict of Tk variables. Blank values
+            (and the text "None") become None; missing fields are
+            None.
+        """
+        values = dict.fromkeys(cls._fields)
+        for key, var in vars.items():
+            field = cls.VAR_FIELDS.get(key, key)
+            if field in values:
+                value = var.get()
+                values[field] = None if value in ('', 'None') else value
+        return cls(**values)
+
+
+    def set_vars(self, vars):
+        """ Load the record into a dict of Tk variables. Variables
+            without a matching field are left alone.
+        """
+        for key, var in vars.items():
+            field = self.VAR_FIELDS.get(key, key)
+            if field in self._fields:
+                value = getattr(self, field)
+                var.set('' if value is None else value)
+
+
+def _record(name, fields, base):
+    """ Create a named tuple record class with base's methods. The
+        named tuple comes first, so a record class derived from 
+        another one (StudyRow) gets its own fields.
+    """
+    tuple_class = namedtuple(name, fields)
+    cls = type(name, (tuple_class, base), {'__slots__': ()})
+    # tuple.__new__ skips namedtuple's argument checks
+    cls._make_row = classmethod(tuple.__new__)
+    return cls
+
+
+class Study(_record('Study', ['study_id', 'irb_ref', 'study_name',
+    'study_type', 'researcher', 'date_created', 'date_closed'], Record)):
+    """ One row of DBModel.SQL_STUDY_SELECT. researcher is the full
+        name; the study views keep it in the 'researcher_id' variable.
+    """
+    __slots__ = ()
+    SHARED = ('study_type', 'researcher', 'date_created', 'date_closed')
+    VAR_FIELDS = {'researcher_id': 'researcher'}
+
+    @property
+    def is_open(self):
+        return self.date_closed is None
+
+
+    @property
+    def page_key(self):
+        """ Keyset pagination key (see DBModel.select_studies_page).
+        """
+        return (self.date_created, self.study_id)
+
+
+    def create_values(self, researcher_id):
+        """ Values for DBModel.WRITE_SQL['create_study'].
+        """
+        return (self.irb_ref, self.study_name, self.study_type,
+            researcher_id, self.date_created, self.date_closed)
+
+
+    def update_values(self, researcher_id):
+        """ Values for DBModel.WRITE_SQL['update_study'].
+        """
+        return self.create_values(researcher_id) + (self.study_id,)
+
+
+class StudyRow(_record('StudyRow', Study._fields + ('amendments',),
+    Study)):
+    """ A Studies tree row: a Study plus its amendment count.
+    """
+    __slots__ = ()
+
+
+class Amendment(_record('Amendment', ['amend_id', 'submit_date',
+    'approval_date', 'rationale', 'study_id'], Record)):
+    """ One row of the Amendments table.
+    """
+    __slots__ = ()
+    SHARED = ('submit_date', 'approval_date')
+
+    def create_values(self):
+        """ Values for DBModel.WRITE_SQL['create_amendment'].
+        """
+        return (self.submit_date, self.approval_date, self.rationale,
+            self.study_id)
+
+
+    def update_values(self):
+        """ Values for DBModel.WRITE_SQL['update_amendment'].
+        """
+        return self.create_values() + (self.amend_id,)
+
+
+class Researcher(_record('Researcher', ['name', 'researcher_id'], Record)):
+    """ A researcher's full name and id.
+    """
+    __slots__ = ()
+
+
+class SearchHit(_record('SearchHit', ['kind', 'ref_id', 'study_id',
+    'study_name', 'hl_name', 'hl_irb', 'hl_researcher', 'snippet'],
+    Record)):
+    """ One DBModel.search() result. hl_* are highlighted study
+        fields; snippet is the highlighted amendment rationale.
+    """
+    __slots__ = ()
@@ -0,0 +1,209 @@
+""" Local working copy of a shared database. The shared (primary)
+    file is copied to a local replica with the sqlite3 backup API, a
+    few pages at a time. Reads use the replica at local-disk speed;
+    writes go to the primary and are followed by a re-sync. A
+    background thread also re-syncs whenever someone else changes
+    the primary (PRAGMA data_version, or the file modification
+    times).
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import database packages
+import sqlite3
+
+# Import system packages
+import os
+import threading
+import time
+
+
+#########
+# BEGIN #
+#########
+class Replica:
+    """ Keep replica_file in step with primary_file. Every sync runs
+        on the replica's own thread, so only that thread reads the
+        primary for copying; other threads ask for a sync with
+        sync() and may wait for it.
+    """
+    # Pages copied per backup step. The primary is only read-locked
+    # during a step, so other users can write in between.
+    PAGES_PER_STEP = 256
+
+    # Seconds sync() waits by default. A large copy over a slow share
+    # can take a while, but a caller must never wait forever.
+    SYNC_TIMEOUT = 120
+
+    def __init__(self, db, primary_file, replica_file, interval=5.0,
+        on_sync=None, on_progress=None):
+        """
+        :param db: DBModel object (used to open the primary pool)
+        :param interval: seconds between checks for changes to the
+            primary
+        :param on_sync: called as on_sync(changed_by_others) from the
+            replica thread after each sync
+        :param on_progress: called as on_progress(copied, total) pages
+            from the replica thread during a sync
+        """
+        self.primary_file = primary_file
+        self.replica_file = replica_file
+        self.interval = interval
+        self.on_sync = on_sync
+        self.on_progress = on_progress
+
+        # Writes and change checks use the shared database
+        self.db = db
+        self.primary = db.create_pool(primary_file)
+
+        # Sync requests: sync() bumps _requested; the thread sets
+        # _synced to the last request it has served
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._synced = 0
+        self._stopped = False
+        self.error = None
+        self.last_sync = None
+
+        self._data_version = None
+        self._mtimes = None
+        self._thread = threading.Thread(target=self._run,
+            name='ReplicaSync', daemon=True)
+
+
+    def start(self):
+        """ Start the sync thread. The first sync runs at once.
+        """
+        print(f"\nreplicamodel: Using local copy {self.replica_file}")
+        os.makedirs(os.path.dirname(self.replica_file) or '.',
+            exist_ok=True)
+        self.sync(wait=False)
+        self._thread.start()
+
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self.primary.close_all()
+
+
+    def sync(self, wait=True, timeout=SYNC_TIMEOUT):
+        """ Ask for a sync of the replica. Call after writing to the
+            primary so later reads see the write.
+        :param wait: block until the sync has finished, for at most 
+            timeout seconds
+        :return: False if the sync failed or timed out (see error)
+        """
+        with self._cond:
+            self._requested += 1
+            target = self._requested
+            self._cond.notify_all()
+            if not wait:
+                return True
+            done = self._cond.wait_for(
+                lambda: self._synced >= target or self._stopped, timeout)
+            if not done:
+                self.error = TimeoutError("The local copy was not " +
+                    f"updated within {timeout} s")
+                return False
+            return self.error is None
+
+
+    def _run(self):
+        """ Sync thread loop: serve sync requests, and check the
+            primary for changes every interval seconds.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._requested > self._synced or self._stopped,
+                    self.interval)
+                if self._stopped:
+                    break
+                target = self._requested
+
+            requested = target > self._synced
+            try:
+                changed = self._changed()
+                if requested or changed:
+                    self._copy()
+                self.error = None
+            except Exception as e:
+                # Any error (e.g. an OSError reading the file times) 
+                # must not end the thread: sync() waits on it
+                print(f"replicamodel: Sync failed: {e}")
+                self.error = e
+                requested = changed = False
+
+            with self._cond:
+                self._synced = target
+                self._cond.notify_all()
+            # Tell the app about changes it did not make itself
+            if (requested or changed) and self.on_sync:
+                self.on_sync(changed and not requested)
+
+        self.primary.release()
+
+
+    def _state(self, conn):
+        """ Return the primary's data_version and file times.
+        """
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        mtimes = tuple(self._mtime(path) for path in (self.primary_file,
+            self.primary_file + '-wal'))
+        return version, mtimes
+
+
+    @staticmethod
+    def _mtime(path):
+        """ Modification time of a file, or None if it does not exist
+            (the -wal file comes and goes).
+        """
+        try:
+            return os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+
+
+    def _changed(self):
+        """ Has anyone changed the primary since the last sync?
+            data_version catches commits through SQLite; the file
+            times catch a sync client replacing the file.
+        """
+        if self._data_version is None:
+            return True
+        version, mtimes = self._state(self.primary.get())
+        return version != self._data_version or mtimes != self._mtimes
+
+
+    def _copy(self):
+        """ Copy the primary to the replica in steps of
+            PAGES_PER_STEP pages.
+        """
+        start = time.perf_counter()
+        src = self.primary.get()
+        # Read the state first: a commit during the copy makes the
+        # next check sync again
+        self._data_version, self._mtimes = self._state(src)
+        dst = sqlite3.connect(self.replica_file)
+        try:
+            # Each backup step waits for the read lock
+            with self.db.wait_for_locks(src):
+                src.backup(dst, pages=self.PAGES_PER_STEP,
+                    progress=self._progress)
+        finally:
+            dst.close()
+        self.last_sync = time.time()
+        print(f"replicamodel: Synced local copy in " +
+            f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+    def _progress(self, status, remaining, total):
+        if self.on_progress:
+            self.on_progress(total - remaining, total)
@@ -31,7 +31,25 @@ class SessionParsModel:
         'slm_reading': {'type': 'float', 'value': 70},
         'adj_pres_level': {'type': 'float', 'value': -30},
         'scaling_factor': {'type': 'float', 'value': -30},
-        'cal_file': {'type': 'str', 'value': 'cal_stim.wav'}
+        'cal_file': {'type': 'str', 'value': 'cal_stim.wav'},
+        # Stream audio files block by block instead of loading them
+        'stream_audio': {'type': 'bool', 'value': True},
+        # Decoded audio kept in memory, in MB (0 to turn off)
+        'stimulus_cache_mb': {'type': 'int', 'value': 256},
+        # Database queries taking at least this long are logged
+        'slow_query_ms': {'type': 'float', 'value': 100},
+        # Local slow-query log file (blank for none)
+        'slow_query_log': {'type': 'str', 'value': ''},
+        # Queue record edits and write them in batches
+        'write_behind': {'type': 'bool', 'value': False},
+        # Milliseconds to wait before writing queued edits
+        'write_behind_ms': {'type': 'int', 'value': 2000},
+        # Read from a local copy of the shared database
+        'local_replica': {'type': 'bool', 'value': False},
+        # Local copy file (blank for ~/.study_database/<name>)
+        'replica_file': {'type': 'str', 'value': ''},
+        # Seconds between checks for changes to the shared database
+        'replica_sync_s': {'type': 'float', 'value': 5},
     }
 
     def __init__(self):
@@ -0,0 +1,150 @@
+""" Query instrumentation. Records the wall time, row count and lock
+    wait of every DBModel statement, and the query plan of slow ones.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import threading
+import time
+from collections import deque
+from collections import namedtuple
+
+
+#########
+# BEGIN #
+#########
+# One executed statement. Times are in ms; plan is None unless the
+# statement was slow. failed is True if it gave up after
+# DBModel.lock_timeout.
+QueryRecord = namedtuple('QueryRecord',
+    ['timestamp', 'name', 'sql', 'wall_ms', 'rows', 'lock_wait_ms', 'plan',
+    'failed'])
+
+# Totals for one DBModel query name. waits is the number of runs
+# that waited for a lock.
+QuerySummary = namedtuple('QuerySummary',
+    ['name', 'count', 'total_ms', 'mean_ms', 'max_ms', 'lock_wait_ms',
+    'waits', 'max_lock_ms', 'rows', 'slow', 'sql', 'plan'])
+
+# Lock contention over all statements. failed is the number that
+# gave up after DBModel.lock_timeout.
+LockSummary = namedtuple('LockSummary',
+    ['count', 'waits', 'failed', 'total_ms', 'max_ms'])
+
+
+class QueryStats:
+    """ Ring buffer of the most recent capacity statements, plus an
+        optional slow-query log. Statements taking at least slow_ms
+        are logged with their EXPLAIN QUERY PLAN.
+
+        Statements are recorded on the query executor thread and read
+        on the Tk thread, so every access holds a lock.
+    """
+    def __init__(self, capacity=1000, slow_ms=100, log_file=None):
+        self.slow_ms = slow_ms
+        self.log_file = log_file
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+
+    @property
+    def capacity(self):
+        return self._records.maxlen
+
+
+    def is_slow(self, wall_ms):
+        return wall_ms >= self.slow_ms
+
+
+    def record(self, name, sql, wall_ms, rows, lock_wait_ms, plan=None,
+        failed=False):
+        """ Add one executed statement.
+        :param failed: the statement gave up waiting for a lock
+        """
+        record = QueryRecord(time.time(), name, sql, wall_ms, rows,
+            lock_wait_ms, plan, failed)
+        with self._lock:
+            self._records.append(record)
+        if plan is not None:
+            print(f"statsmodel: Slow query: {name} ({wall_ms:.1f} ms)")
+            if self.log_file:
+                self._log(record)
+
+
+    def _log(self, record):
+        """ Append a slow statement to the log file. One tab-separated
+            line per statement.
+        """
+        line = '\t'.join([
+            time.strftime('%Y-%m-%d %H:%M:%S',
+                time.localtime(record.timestamp)),
+            record.name,
+            f"{record.wall_ms:.1f}",
+            str(record.rows),
+            f"{record.lock_wait_ms:.1f}",
+            ' '.join(record.sql.split()),
+            '; '.join(record.plan),
+        ])
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as fh:
+                fh.write(line + '\n')
+        except OSError as e:
+            print(f"statsmodel: Cannot write slow-query log: {e}")
+
+
+    def records(self):
+        """ Return the buffered statements, oldest first.
+        """
+        with self._lock:
+            return list(self._records)
+
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+    def summary(self):
+        """ Totals per query name, worst (most total time) first.
+        :return: list of QuerySummary
+        """
+        totals = {}
+        for rec in self.records():
+            t = totals.setdefault(rec.name, {'count': 0, 'total': 0.0,
+                'max': 0.0, 'lock': 0.0, 'waits': 0, 'max_lock': 0.0,
+                'rows': 0, 'slow': 0, 'sql': rec.sql, 'plan': None})
+            t['count'] += 1
+            t['total'] += rec.wall_ms
+            t['max'] = max(t['max'], rec.wall_ms)
+            t['lock'] += rec.lock_wait_ms
+            if rec.lock_wait_ms > 0:
+                t['waits'] += 1
+                t['max_lock'] = max(t['max_lock'], rec.lock_wait_ms)
+            t['rows'] += rec.rows
+            if rec.plan is not None:
+                t['slow'] += 1
+                t['sql'] = rec.sql
+                t['plan'] = rec.plan
+
+        summary = [QuerySummary(name, t['count'], t['total'],
+            t['total'] / t['count'], t['max'], t['lock'], t['waits'],
+            t['max_lock'], t['rows'], t['slow'], t['sql'], t['plan']) 
+            for name, t in totals.items()]
+        summary.sort(key=lambda x: x.total_ms, reverse=True)
+        return summary
+
+
+    def lock_summary(self):
+        """ How often statements waited for a lock, and for how 
+            long.
+        :return: LockSummary
+        """
+        records = self.records()
+        waits = [rec.lock_wait_ms for rec in records if rec.lock_wait_ms > 0]
+        failed = sum(1 for rec in records if rec.failed)
+        return LockSummary(len(records), len(waits), failed, sum(waits),
+            max(waits, default=0.0))
@@ -0,0 +1,237 @@
+""" Process-wide cache of decoded audio files. Buffers are float32
+    and keyed by (path, mtime, size), so an edited file is decoded
+    again. Least recently used buffers are evicted to stay within a
+    byte budget. Files can be decoded ahead of time on a background
+    thread with prefetch().
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+
+# Import system packages
+import os
+import threading
+from collections import OrderedDict
+
+# Import audio packages
+import soundfile as sf
+
+
+#########
+# BEGIN #
+#########
+class StimulusCache:
+    """ LRU cache of decoded audio, safe to use from any thread.
+        Cached arrays are read-only and shared: copy before changing
+        them.
+    """
+    def __init__(self, budget_bytes=256 * 2**20):
+        self.budget_bytes = budget_bytes
+
+        # key: (signal, fs, subtype), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # key: Event, for files being decoded
+        self._loading = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Prefetch requests (newest wins) and worker thread
+        self._prefetch = []
+        self._prefetch_cond = threading.Condition(self._lock)
+        self._prefetch_thread = None
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+    @staticmethod
+    def key(path):
+        """ Cache key of a file: (absolute path, mtime, size).
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        return (path, st.st_mtime_ns, st.st_size)
+
+
+    def peek(self, path, count=False):
+        """ Return the cached (signal, fs, subtype) of a file, or 
+            None. Never decodes.
+        :param count: record a hit or miss. Only the one lookup that
+            decides how a file is presented should count.
+        """
+        key = self.key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            if count:
+                if entry is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return entry
+
+
+    def get(self, path, count=True):
+        """ Return (signal, fs, subtype) for an audio file, decoding 
+            it on a miss. signal is float32, 1-D for mono files (as
+            soundfile.read() returns); subtype is the file's sample 
+            format.
+        :param count: record a hit or miss (prefetches do not)
+        :return: None if the decoded file would not fit the budget
+        """
+        key = self.key(path)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return entry
+                loading = self._loading.get(key)
+                if loading is None:
+                    if count:
+                        self.misses += 1
+                    self._loading[key] = threading.Event()
+                    break
+            # Another thread is decoding this file: use its result
+            loading.wait()
+
+        try:
+            return self._load(key)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+
+    def _load(self, key):
+        """ Decode a file and add it to the cache.
+        """
+        path = key[0]
+        info = sf.info(path)
+        nbytes = info.frames * info.channels * np.dtype(np.float32).itemsize
+        if nbytes > self.budget_bytes:
+            print(f"stimuluscachemodel: {os.path.basename(path)} is " +
+                f"larger than the cache ({nbytes / 2**20:.1f} MB)")
+            return None
+
+        signal, fs = sf.read(path, dtype='float32')
+        signal.setflags(write=False)
+        entry = (signal, fs, info.subtype)
+        with self._lock:
+            # Files replaced since they were cached are never hit again
+            for old in [x for x in self._entries if x[0] == path]:
+                self._remove(old)
+            self._entries[key] = entry
+            self._bytes += signal.nbytes
+            self._evict()
+        return entry
+
+
+    def _remove(self, key):
+        signal = self._entries.pop(key)[0]
+        self._bytes -= signal.nbytes
+
+
+    def _evict(self):
+        """ Drop least recently used entries until within budget.
+            Call with the lock held.
+        """
+        while self._bytes > self.budget_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+    def stats(self):
+        """ Return a dict of counters and sizes.
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                'budget_bytes': self.budget_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+    ######################
+    # Prefetch Functions #
+    ######################
+    def prefetch(self, paths):
+        """ Decode files on a background thread, in order. Replaces
+            any prefetch still waiting. Files already cached are
+            skipped.
+        """
+        with self._prefetch_cond:
+            self._prefetch = list(paths)
+            if self._prefetch_thread is None:
+                self._prefetch_thread = threading.Thread(
+                    target=self._run_prefetch, name='StimulusPrefetch',
+                    daemon=True)
+                self._prefetch_thread.start()
+            self._prefetch_cond.notify()
+
+
+    def prefetch_next(self, paths, current, count):
+        """ Prefetch the count files after index current of a
+            presentation list.
+        """
+        self.prefetch(paths[current + 1:current + 1 + count])
+
+
+    def _run_prefetch(self):
+        while True:
+            with self._prefetch_cond:
+                self._prefetch_cond.wait_for(lambda: self._prefetch)
+                path = self._prefetch.pop(0)
+            try:
+                key = self.key(path)
+                with self._lock:
+                    cached = key in self._entries
+                if cached:
+                    continue
+                self.get(path, count=False)
+            except (OSError, RuntimeError) as e:
+                # The file will fail again, and be reported, when it
+                # is played
+                print(f"stimuluscachemodel: Could not prefetch {path}: {e}")
+
+
+# Shared by every Audio object in the process
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """ Return the process-wide StimulusCache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StimulusCache()
+        return _cache
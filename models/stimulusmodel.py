@@ -0,0 +1,352 @@
+""" Stimulus set checks. Every audio file in a folder is decoded and
+    measured (per-channel RMS, peak and DC offset) on a pool of
+    worker processes, and the set is checked for sample rate
+    mismatches, files with more channels than the audio device,
+    clipping and level spread before a session starts.
+
+    Results are kept in a manifest file keyed by a hash of each
+    file's contents. Files whose size and modification time have not
+    changed are not read at all; changed files are hashed, and only
+    contents never seen before are decoded again.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+
+# Import system packages
+import fnmatch
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Import audio packages
+import soundfile as sf
+
+# Import custom modules
+from functions import levels
+
+
+#########
+# BEGIN #
+#########
+# Analysis of one file. peak, rms and dc are per-channel lists
+# (linear, full scale = 1.0); level is the RMS of all channels
+# together, as Audio.rms() computes it, in dB.
+FileStats = namedtuple('FileStats',
+    ['path', 'hash', 'fs', 'channels', 'frames', 'subtype', 'peak',
+    'rms', 'dc', 'level', 'error'])
+
+# A check that failed. kind is 'error', 'sample_rate', 'channels',
+# 'clipping', 'dc', 'silent' or 'level'.
+Problem = namedtuple('Problem', ['path', 'kind', 'message'])
+
+StimulusReport = namedtuple('StimulusReport',
+    ['folder', 'files', 'problems', 'fs', 'level_range', 'analyzed',
+    'reused', 'seconds'])
+
+
+# Bump when the analysis changes, so old manifests are ignored
+MANIFEST_VERSION = 1
+
+# Bytes read at a time when hashing
+HASH_CHUNK = 2**20
+
+# Frames decoded at a time when measuring
+BLOCK_FRAMES = 2**16
+
+# Same limit as Audio.play()
+CLIP_LEVEL = 0.999
+
+
+def hash_file(path):
+    """ Return the BLAKE2b hash of a file's contents, as hex, or 
+        None if the file cannot be read.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+    except OSError as e:
+        print(f"stimulusmodel: Could not read {path}: {e}")
+        return None
+    return digest.hexdigest()
+
+
+def measure_file(path):
+    """ Decode a file block by block and measure each channel.
+        Runs in the worker processes, so it only takes and returns
+        plain values.
+    :return: dict of FileStats fields (without path and hash)
+    """
+    try:
+        with sf.SoundFile(path) as f:
+            st = levels.stats_blocks(f.blocks(BLOCK_FRAMES,
+                dtype='float32', always_2d=True), f.channels)
+            fs, channels, subtype = f.samplerate, f.channels, f.subtype
+    except (OSError, RuntimeError) as e:
+        return {'error': str(e)}
+
+    # Mean square of all channels together
+    level = np.sqrt(np.mean(np.square(st.rms))) if channels else 0.0
+    return {'fs': fs, 'channels': channels, 'frames': st.frames,
+        'subtype': subtype, 'peak': st.peak.tolist(),
+        'rms': st.rms.tolist(), 'dc': st.dc.tolist(),
+        'level': float(levels.mag2db(level)) if level > 0 else None,
+        'error': None}
+
+
+class StimulusAnalyzer:
+    """ Analyze the audio files in a folder and check them as a set.
+    """
+    # Level spread (dB from the set median) before a file is flagged
+    LEVEL_TOLERANCE_DB = 3.0
+
+    # DC offset (full scale) before a file is flagged
+    DC_LIMIT = 0.01
+
+    # Fewer files than this are analyzed in this process: starting
+    # the workers would take longer
+    MIN_PARALLEL = 16
+
+    def __init__(self, folder, pattern='*.wav', manifest_dir=None,
+        workers=None):
+        """
+        :param manifest_dir: where manifests are kept (default
+            ~/.study_database/stimuli)
+        :param workers: number of worker processes (default: one per
+            CPU)
+        """
+        self.folder = os.path.abspath(folder)
+        self.pattern = pattern
+        self.workers = workers or os.cpu_count() or 1
+        if manifest_dir is None:
+            manifest_dir = Path.home() / '.study_database' / 'stimuli'
+        # One manifest per folder
+        name = hashlib.blake2b(self.folder.encode('utf-8'),
+            digest_size=8).hexdigest()
+        self.manifest_file = os.path.join(manifest_dir, name + '.json')
+
+        # Files measured and reused by the last analyze()
+        self.analyzed = 0
+        self.reused = 0
+
+
+    ######################
+    # Manifest Functions #
+    ######################
+    def load_manifest(self):
+        """ Return (files, results) from the manifest: relative path
+            -> [size, mtime_ns, hash], and hash -> measure_file()
+            dict. Both are empty if there is no usable manifest.
+        """
+        try:
+            with open(self.manifest_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}, {}
+        except (OSError, ValueError) as e:
+            print(f"stimulusmodel: Ignoring manifest: {e}")
+            return {}, {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}, {}
+        return data['files'], data['results']
+
+
+    def save_manifest(self, files, results):
+        """ Write the manifest, keeping only results still in use.
+            Written to a temporary file first, so an interrupted save
+            leaves the old manifest intact.
+        """
+        # Files that could not be read or decoded (no hash, or an 
+        # error result) are tried again next time: the error may not
+        # last
+        results = dict((key, value) for key, value in results.items()
+            if value.get('error') is None)
+        files = dict((path, x) for path, x in files.items()
+            if x[2] in results)
+        used = set(x[2] for x in files.values())
+        data = {'version': MANIFEST_VERSION, 'folder': self.folder,
+            'files': files, 'results': dict((key, value)
+            for key, value in results.items() if key in used)}
+        os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+        temp = self.manifest_file + '.part'
+        with open(temp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temp, self.manifest_file)
+
+
+    ######################
+    # Analysis Functions #
+    ######################
+    def find_files(self):
+        """ Return the relative paths of the matching files in the
+            folder and its subfolders, sorted.
+        """
+        paths = []
+        for root, dirs, names in os.walk(self.folder):
+            dirs.sort()
+            for name in sorted(fnmatch.filter(names, self.pattern)):
+                paths.append(os.path.relpath(os.path.join(root, name),
+                    self.folder))
+        return paths
+
+
+    def _map(self, pool, func, paths, stage, progress):
+        """ Map func over relative paths, in the pool if there is
+            one, reporting progress as results arrive.
+        """
+        paths = [os.path.join(self.folder, x) for x in paths]
+        if pool is None:
+            results = map(func, paths)
+        else:
+            # Send paths in batches to keep the messaging cheap
+            chunk = max(1, min(64, len(paths) // (4 * self.workers)))
+            results = pool.map(func, paths, chunksize=chunk)
+
+        values = []
+        for value in results:
+            values.append(value)
+            if len(values) % 100 == 0:
+                progress(stage, len(values), len(paths))
+        progress(stage, len(values), len(paths))
+        return values
+
+
+    def analyze(self, progress=None):
+        """ Measure every file, reusing the manifest where possible.
+        :param progress: called as progress(stage, done, total)
+        :return: list of FileStats, sorted by path
+        """
+        if progress is None:
+            progress = lambda stage, done, total: None
+        old_files, results = self.load_manifest()
+        paths = self.find_files()
+        print(f"\nstimulusmodel: Checking {len(paths)} files in " +
+            f"{self.folder}")
+
+        # Files with the same size and time as last time are taken on
+        # trust
+        files = {}
+        changed = []
+        for path in paths:
+            try:
+                st = os.stat(os.path.join(self.folder, path))
+            except OSError:
+                # Removed since the folder was listed
+                continue
+            old = old_files.get(path)
+            if (old is not None and old[:2] == [st.st_size, st.st_mtime_ns]
+                and old[2] in results):
+                files[path] = old
+            else:
+                files[path] = [st.st_size, st.st_mtime_ns, None]
+                changed.append(path)
+
+        pool = None
+        if len(changed) >= self.MIN_PARALLEL and self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers)
+        try:
+            # Hash changed files; only unseen contents are decoded
+            digests = self._map(pool, hash_file, changed, 'hash', progress)
+            todo = {}
+            for path, digest in zip(changed, digests):
+                files[path][2] = digest
+                if digest is not None and digest not in results:
+                    todo.setdefault(digest, path)
+
+            measured = self._map(pool, measure_file, list(todo.values()),
+                'measure', progress)
+            results.update(zip(todo, measured))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.analyzed = len(todo)
+        self.reused = len(files) - len(todo)
+        print(f"stimulusmodel: Measured {self.analyzed} files, reused " +
+            f"{self.reused}")
+        self.save_manifest(files, results)
+        return [self._stats(path, x[2], results)
+            for path, x in files.items()]
+
+
+    def _stats(self, path, digest, results):
+        values = dict.fromkeys(FileStats._fields)
+        values.update(results.get(digest,
+            {'error': "The file could not be read"}),
+            path=path, hash=digest)
+        return FileStats(**values)
+
+
+    ###################
+    # Check Functions #
+    ###################
+    def check(self, stats, fs=None, max_channels=None):
+        """ Check a set of files.
+        :param fs: expected sample rate (default: the most common)
+        :param max_channels: audio device output channels, or None to
+            skip the check
+        :return: (problems, fs, (min, max) level in dB or None)
+        """
+        valid = [x for x in stats if x.error is None]
+        if fs is None and valid:
+            fs = Counter(x.fs for x in valid).most_common(1)[0][0]
+
+        dbs = np.array([x.level for x in valid if x.level is not None])
+        median = float(np.median(dbs)) if len(dbs) else None
+
+        problems = []
+        for x in stats:
+            if x.error is not None:
+                problems.append(Problem(x.path, 'error', x.error))
+                continue
+            if x.fs != fs:
+                problems.append(Problem(x.path, 'sample_rate',
+                    f"Sample rate is {x.fs} Hz, not {fs} Hz"))
+            if max_channels is not None and x.channels > max_channels:
+                problems.append(Problem(x.path, 'channels',
+                    f"{x.channels} channels, but the device has " +
+                    f"{max_channels} outputs"))
+            peak = max(x.peak, default=0.0)
+            if peak > CLIP_LEVEL:
+                problems.append(Problem(x.path, 'clipping',
+                    f"Peak is {peak:.4f} of full scale"))
+            dc = max(x.dc, key=abs, default=0.0)
+            if abs(dc) > self.DC_LIMIT:
+                problems.append(Problem(x.path, 'dc',
+                    f"DC offset is {dc:+.4f}"))
+            if x.level is None:
+                problems.append(Problem(x.path, 'silent', "File is silent"))
+            elif abs(x.level - median) > self.LEVEL_TOLERANCE_DB:
+                problems.append(Problem(x.path, 'level',
+                    f"Level is {x.level - median:+.1f} dB from the " +
+                    "set median"))
+
+        level_range = ((float(dbs.min()), float(dbs.max()))
+            if len(dbs) else None)
+        return problems, fs, level_range
+
+
+    def run(self, fs=None, max_channels=None, progress=None):
+        """ Analyze and check the folder.
+        :return: StimulusReport
+        """
+        start = time.perf_counter()
+        stats = self.analyze(progress)
+        problems, fs, level_range = self.check(stats, fs, max_channels)
+        seconds = time.perf_counter() - start
+        print(f"stimulusmodel: {len(problems)} problems in " +
+            f"{len(stats)} files ({seconds:.2f} s)")
+        return StimulusReport(self.folder, stats, problems, fs, level_range,
+            self.analyzed, self.reused, seconds)
@@ -1,7 +1,7 @@
 """ Class to check current version number against latest version 
-    library on Starfile. If upgrade is available, display
-    a message. If upgrade is mandatory, show warning and 
-    kill app. 
+    library on Starfile. The result is reported in the status
+    attribute; the controller decides what to show the user. No GUI
+    code runs here, so checks can run off the Tk thread.
 
     Written by: Travis M. Moore
     Created: Apr 11, 2023
@@ -14,36 +14,37 @@
 # Data science
 import pandas as pd
 
-# GUI
-from tkinter import messagebox
-
 
 #########
 # BEGIN #
 #########
 class VersionChecker:
     """ Class to check current version number against latest version 
-        library on Starfile. If upgrade is available but not mandatory,
-        return TRUE and display a message. If upgrade is mandatory, 
-        return FALSE, display a message, and kill app. 
+        library on Starfile. status is one of the STATUS_* values. 
+        current is FALSE only if a mandatory upgrade is available: 
+        the app must not be used. latest is the library version, if
+        found.
     """
+    STATUS_CURRENT = 'current'
+    STATUS_AVAILABLE = 'available'
+    STATUS_MANDATORY = 'mandatory'
+    STATUS_UNREACHABLE = 'unreachable'
+    STATUS_NOT_FOUND = 'not_found'
+
     def __init__(self, lib_path, app_name, app_version):
         self.lib_path = lib_path
         self.app_name = app_name
         self.app_version = app_version
         self.current = None
+        self.status = None
+        self.latest = None
 
         # Import version library to cross-reference
         try:
             self.import_version_library(self.lib_path)
         except FileNotFoundError:
             print(f"updater: Could not read from version library!")
-            messagebox.showwarning(
-                title="Cannot Reach Library",
-                message="Cannot check for updates!",
-                detail="The version library is unreachable. Please check " +
-                "that you have access to Starfile and try again."
-            )
+            self.status = self.STATUS_UNREACHABLE
             # Return True if version library file is unreachable. Defaults 
             # to being able to use the app if it cannot check the server.
             self.current = True
@@ -76,37 +77,24 @@ class VersionChecker:
                 print('\nupdater: New version available!')
                 print(f"updater: You are using version {self.app_version}, but " +
                     f"version {status.iloc[0]['version']} is available.")
+                self.latest = status.iloc[0]['version']
                 if status.iloc[0]['mandatory'] == 'yes':
-                    messagebox.showerror(
-                        title="New Version Available",
-                        message=f"Mandatory software update required!",
-                        detail=f"You must download version " +
-                        f"{status.iloc[0]['version']} to continue."
-                    )
+                    self.status = self.STATUS_MANDATORY
                     self.current = False
                     return
-                elif status.iloc[0]['mandatory'] == 'no':
-                    messagebox.showwarning(
-                        title="New Version Available",
-                        message=f"Software update available!",
-                        detail=f"Please download {self.app_name} " + 
-                        f"version {status.iloc[0]['version']}."
-                    )
+                self.status = self.STATUS_AVAILABLE
                 self.current = True
                 return
             else:
                 print("\nupdater: You are up to date!")
+                self.status = self.STATUS_CURRENT
                 self.current = True
                 return
         except IndexError:
             print("\nupdater: Check for updates failed!")
             print(f"updater: '{self.app_name}' cannot be found in the " +
                   "version library!")
-            messagebox.showerror(
-                title="Update Check Failed",
-                message="Could not check for updates!",
-                detail=f"'{self.app_name}' cannot be found in the version library."
-            )
+            self.status = self.STATUS_NOT_FOUND
             # Return True if app name cannot be found in version library. 
             # Defaults to being able to use the app if updates cannot be checked.
             self.current = True
@@ -0,0 +1,69 @@
+""" Write-behind queue for record edits. Saved records wait here
+    until they are flushed to the database in one transaction with
+    DBModel.write_batch(). Repeated edits to the same record are
+    coalesced: only the latest values are written.
+
+    Written by: Travis M. Moore
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import itertools
+
+
+#########
+# BEGIN #
+#########
+class WriteBehindQueue:
+    """ Pending record writes, in the order they were first queued.
+        Used from the Tk thread only: take() hands the writes to the
+        query executor.
+    """
+    def __init__(self):
+        # (name, record id) or ('create', n): (name, values)
+        self._pending = {}
+        self._new = itertools.count()
+
+
+    def __len__(self):
+        return len(self._pending)
+
+
+    def put(self, name, values):
+        """ Queue a DBModel.WRITE_SQL write. An update replaces any
+            queued update of the same record.
+        """
+        if name.startswith('create'):
+            key = ('create', next(self._new))
+        else:
+            key = (name, values[-1])
+        self._pending[key] = (name, values)
+
+
+    def pending(self, name, record_id):
+        """ Return the queued values of an update, or None.
+        """
+        write = self._pending.get((name, record_id))
+        return write[1] if write else None
+
+
+    def take(self):
+        """ Remove and return every queued write.
+        :return: list of (key, (name, values))
+        """
+        writes = list(self._pending.items())
+        self._pending = {}
+        return writes
+
+
+    def restore(self, writes):
+        """ Put back writes returned by take() after a failed flush.
+            Edits queued since take() are newer and win.
+        """
+        pending = dict(writes)
+        for key, write in self._pending.items():
+            pending.pop(key, None)
+            pending[key] = write
+        self._pending = pending
@@ -16,14 +16,15 @@ from widgets import date_entry
 # BEGIN #
 #########
 class AmendmentRecordView(tk.Toplevel):
-    def __init__(self, parent, _task, _amendvars, all_studies, *args, **kwargs):
+    def __init__(self, parent, _task, _amendvars, study_index, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
 
         # Assign arguments to variables
         self.parent = parent
         self._task = _task
         self._amendvars = _amendvars
-        self.studynames = sorted([x[2] for x in all_studies])
+        self.study_index = study_index
+        self.studynames = self.study_index.labels()
 
         # Window setup
         self.withdraw()
@@ -83,6 +84,7 @@ class AmendmentRecordView(tk.Toplevel):
             textvariable=self._amendvars['study_name'],
             values=self.studynames, state='readonly', width=60)
         self.cmbo_study.grid(column=10, columnspan=20, row=5, sticky='w')
+        self.cmbo_study.bind('<<ComboboxSelected>>', self._on_study_selected)
 
         # Rationale
         ttk.Label(self.frm_main, text="Rationale:").grid(
@@ -130,6 +132,13 @@ class AmendmentRecordView(tk.Toplevel):
         self.deiconify()
 
 
+    def _on_study_selected(self, event):
+        """ Store the id of the selected study.
+        """
+        self._amendvars['study_id'].set(
+            self.study_index.lookup(self.cmbo_study.get()))
+
+
     def _on_submit(self):
         if self._task == 'edit':
             print("\namendment_recordview: Sending submit amendments edits event...")
@@ -9,17 +9,20 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 
+# Import custom modules
+from widgets import record_tree
+
 
 #########
 # BEGIN #
 #########
 class AmendmentFrame(ttk.Frame):
-    def __init__(self, parent, studies, _amendvars, *args, **kwargs):
+    def __init__(self, parent, study_index, _amendvars, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
  
         # Assign variables
-        self.studies = studies
-        self.studynames = sorted([x[2] for x in self.studies])
+        self.study_index = study_index
+        self.studynames = self.study_index.labels()
         self._amendvars = _amendvars
 
         # center widgets
@@ -66,7 +69,7 @@ class AmendmentFrame(ttk.Frame):
         # Tree view #
         #############
         columns = ('amend_id', 'submit_date', 'approval_date', 'rationale')
-        self.tree = ttk.Treeview(self.frm_main, columns=columns, 
+        self.tree = record_tree.RecordTree(self.frm_main, columns=columns, 
             show='headings')
         # Headings
         self.tree.heading('amend_id', text="ID")
@@ -97,16 +100,22 @@ class AmendmentFrame(ttk.Frame):
     #############
     def _get_amendments(self, event):
         self._amendvars['study_name'].set(self.cmbo_study.get())
+        self._amendvars['study_id'].set(
+            self.study_index.lookup(self.cmbo_study.get()))
         self.event_generate('<<AmendmentStudySelected>>')
 
 
-    def _populate_tree(self, amendments):
-        # Delete any data from amendment tree
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+    def set_studies(self, study_index):
+        """ Update the list of studies offered in the combobox.
+        """
+        self.study_index = study_index
+        self.studynames = self.study_index.labels()
+        self.cmbo_study.configure(values=self.studynames)
 
-        for row in amendments:
-           self.tree.insert('', tk.END, values=row)
+
+    def _populate_tree(self, amendments):
+        # Only touch amendments that changed
+        self.tree.reconcile(amendments)
 
 
     def item_selected(self, event):
@@ -114,17 +123,14 @@ class AmendmentFrame(ttk.Frame):
             amendment details and sends event to controller to 
             display amendment editing window.
         """
-        # Retrieve study details
-        for selected_item in self.tree.selection():
-            item = self.tree.item(selected_item)
-            record = item['values']
-
-            # Insert selected study name to list of values
-            record.insert(0, self._amendvars['study_name'].get())
-
-        # Load study details into _amendvars
-        for ii, key in enumerate(self._amendvars):
-            self._amendvars[key].set(record[ii])
+        # Selection is cleared when a selected row is deleted
+        if not self.tree.selection():
+            return
+
+        # Load amendment details into _amendvars (study_name is
+        # already set by the studies combobox)
+        record = self.tree.record(self.tree.selection()[-1])
+        record.set_vars(self._amendvars)
 
         # Send item select event to controller
         self.event_generate('<<AmendmentTreeSelection>>')
@@ -0,0 +1,188 @@
+""" Export view. Choose records, filter and columns, then export to
+    CSV or Parquet with a progress bar.
+"""
+
+###########
+# Imports #
+###########
+# Import GUI packages
+import tkinter as tk
+from tkinter import ttk
+from tkinter import filedialog
+
+
+#########
+# BEGIN #
+#########
+class ExportView(tk.Toplevel):
+    def __init__(self, parent, columns, *args, **kwargs):
+        """
+        :param columns: dict of record kind: exportable column names
+        """
+        super().__init__(parent, *args, **kwargs)
+
+        # Assign arguments to variables
+        self.parent = parent
+        self.columns = columns
+        self.running = False
+
+        # Settings read by the controller
+        self.kind = tk.StringVar(value='studies')
+        self.filter = tk.StringVar(value='all')
+        self.path = None
+        self._column_vars = {}
+
+        # Window setup
+        self.withdraw()
+        self.focus()
+        self.title("Export")
+
+        # Draw widgets
+        self._draw_widgets()
+
+        # Center window
+        self.center_window()
+
+
+    def _draw_widgets(self):
+        """ Populate the frame with all widgets.
+        """
+        #################
+        # Create frames #
+        #################
+        options = {'padx':10, 'pady':10}
+
+        # Main container
+        self.frm_main = ttk.Frame(self)
+        self.frm_main.grid(column=5, row=5, **options)
+
+        # Records and filter
+        frm_options = ttk.Labelframe(self.frm_main, text="Records")
+        frm_options.grid(column=5, row=5, sticky='nsew', padx=(0,10))
+
+        # Columns
+        self.frm_columns = ttk.Labelframe(self.frm_main, text="Columns")
+        self.frm_columns.grid(column=10, row=5, sticky='nsew')
+
+        # Progress and buttons
+        self.frm_button = ttk.Frame(self.frm_main)
+        self.frm_button.grid(column=5, columnspan=10, row=10, pady=(10,0))
+
+
+        ##################
+        # Create Widgets #
+        ##################
+        # Record kind
+        ttk.Radiobutton(frm_options, text="Studies", value='studies',
+            variable=self.kind, command=self._draw_columns).grid(
+            column=5, row=5, sticky='w', padx=5, pady=(5,0))
+        ttk.Radiobutton(frm_options, text="Amendments", value='amendments',
+            variable=self.kind, command=self._draw_columns).grid(
+            column=5, row=10, sticky='w', padx=5)
+
+        # Filter
+        ttk.Separator(frm_options, orient='horizontal').grid(
+            column=5, row=15, sticky='we', pady=5)
+        ttk.Radiobutton(frm_options, text="All studies", value='all',
+            variable=self.filter).grid(column=5, row=20, sticky='w', padx=5)
+        ttk.Radiobutton(frm_options, text="Open studies only", value='open',
+            variable=self.filter).grid(
+            column=5, row=25, sticky='w', padx=5, pady=(0,5))
+
+        # Column checkboxes
+        self._draw_columns()
+
+        # Progress
+        self.progress = ttk.Progressbar(self.frm_button, length=300,
+            mode='determinate')
+        self.progress.grid(column=5, columnspan=10, row=5)
+        self.status = tk.StringVar()
+        ttk.Label(self.frm_button, textvariable=self.status).grid(
+            column=5, columnspan=10, row=10, pady=(5,10))
+
+        # Buttons
+        self.btn_export = ttk.Button(self.frm_button, text="Export...",
+            command=self._on_export)
+        self.btn_export.grid(column=5, row=15, padx=5)
+        self.btn_cancel = ttk.Button(self.frm_button, text="Cancel",
+            command=self._on_cancel, state='disabled')
+        self.btn_cancel.grid(column=10, row=15, padx=5)
+
+
+    def _draw_columns(self):
+        """ Show a checkbox for each column of the chosen record kind.
+        """
+        for widget in self.frm_columns.winfo_children():
+            widget.destroy()
+        self._column_vars = {}
+        for ii, name in enumerate(self.columns[self.kind.get()]):
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(self.frm_columns, text=name, variable=var).grid(
+                column=5, row=ii, sticky='w', padx=5)
+            self._column_vars[name] = var
+
+
+    #################
+    # General Funcs #
+    #################
+    def center_window(self):
+        """ Center the root window
+        """
+        self.update_idletasks()
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        size = tuple(int(_) for _ in self.geometry().split('+')[0].split('x'))
+        x = screen_width/2 - size[0]/2
+        y = screen_height/2 - size[1]/2
+        self.geometry("+%d+%d" % (x, y))
+        self.deiconify()
+
+
+    def selected_columns(self):
+        return [name for name, var in self._column_vars.items() if var.get()]
+
+
+    def _on_export(self):
+        """ Ask for a file name and send the export event to the
+            controller.
+        """
+        if not self.selected_columns():
+            self.status.set("Select at least one column")
+            return
+        path = filedialog.asksaveasfilename(parent=self,
+            title="Export", initialfile=self.kind.get(),
+            defaultextension='.csv',
+            filetypes=[('CSV files', '*.csv'),
+                ('Parquet files', '*.parquet')])
+        if not path:
+            return
+
+        self.path = path
+        self.set_running(True)
+        self.status.set("Starting export...")
+        self.parent.event_generate('<<ExportSubmit>>')
+
+
+    def _on_cancel(self):
+        self.parent.event_generate('<<ExportCancel>>')
+
+
+    def set_running(self, running):
+        self.running = running
+        self.btn_export.config(state='disabled' if running else 'normal')
+        self.btn_cancel.config(state='normal' if running else 'disabled')
+        self.progress['value'] = 0
+
+
+    def set_progress(self, done, total):
+        # Progress can arrive after the export has finished
+        if not self.running:
+            return
+        self.progress['maximum'] = max(total, 1)
+        self.progress['value'] = done
+        self.status.set(f"Exported {done} of {total} rows...")
+
+
+    def finish(self, message):
+        self.set_running(False)
+        self.status.set(message)
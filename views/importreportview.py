@@ -0,0 +1,120 @@
+""" Import report view. Shows the outcome of a bulk import and 
+    every row that was skipped.
+"""
+
+###########
+# Imports #
+###########
+# Import GUI packages
+import tkinter as tk
+from tkinter import ttk
+from tkinter import filedialog
+
+
+#########
+# BEGIN #
+#########
+class ImportReportView(tk.Toplevel):
+    # Problems listed in the window (Save Report writes them all)
+    MAX_ROWS = 1000
+
+    def __init__(self, parent, report, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+
+        # Assign arguments to variables
+        self.parent = parent
+        self.report = report
+
+        # Window setup
+        self.withdraw()
+        self.focus()
+        self.title("Import Report")
+
+        # Draw widgets
+        self._draw_widgets()
+
+        # Center window
+        self.center_window()
+
+
+    def _draw_widgets(self):
+        """ Populate the frame with all widgets.
+        """
+        #################
+        # Create frames #
+        #################
+        options = {'padx':10, 'pady':10}
+
+        # Main container
+        self.frm_main = ttk.Frame(self)
+        self.frm_main.grid(column=5, row=5, **options)
+
+        # Buttons
+        self.frm_button = ttk.Frame(self.frm_main)
+        self.frm_button.grid(column=5, row=20, pady=(10,0))
+
+
+        ##################
+        # Create Widgets #
+        ##################
+        # Summary
+        summary = self.report.summary()
+        if len(self.report.errors) > self.MAX_ROWS:
+            summary += (f"\nShowing the first {self.MAX_ROWS} of " +
+                f"{len(self.report.errors)} problems: save the report " +
+                "to see them all.")
+        ttk.Label(self.frm_main, text=summary).grid(
+            column=5, row=5, sticky='w', pady=(0,10))
+
+        # Skipped rows
+        columns = ('line', 'error')
+        self.tree = ttk.Treeview(self.frm_main, columns=columns,
+            show='headings', height=12)
+        self.tree.heading('line', text="Line")
+        self.tree.heading('error', text="Problem")
+        self.tree.column('line', width=60, stretch=False, anchor='e')
+        self.tree.column('error', width=500, stretch=False)
+        for line, message in self.report.errors[:self.MAX_ROWS]:
+            self.tree.insert('', tk.END, values=(line, message))
+        self.tree.grid(column=5, row=10)
+
+        # Add vertical scrollbar
+        scrollbar = ttk.Scrollbar(self.frm_main, orient=tk.VERTICAL,
+            command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        scrollbar.grid(column=6, row=10, sticky='ns')
+
+        # Buttons
+        btn_save = ttk.Button(self.frm_button, text="Save Report...",
+            command=self._on_save)
+        btn_save.grid(column=5, row=5, padx=5)
+        if not self.report.errors:
+            btn_save.config(state='disabled')
+        ttk.Button(self.frm_button, text="Close",
+            command=self.destroy).grid(column=10, row=5, padx=5)
+
+
+    #################
+    # General Funcs #
+    #################
+    def center_window(self):
+        """ Center the root window
+        """
+        self.update_idletasks()
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        size = tuple(int(_) for _ in self.geometry().split('+')[0].split('x'))
+        x = screen_width/2 - size[0]/2
+        y = screen_height/2 - size[1]/2
+        self.geometry("+%d+%d" % (x, y))
+        self.deiconify()
+
+
+    def _on_save(self):
+        """ Save the skipped rows to a CSV file.
+        """
+        path = filedialog.asksaveasfilename(parent=self,
+            title="Save Import Report", defaultextension='.csv',
+            filetypes=[('CSV files', '*.csv')])
+        if path:
+            self.report.save(path)
@@ -0,0 +1,162 @@
+""" Query statistics view. Lists the DBModel queries that took the
+    most time, with the captured plan of the selected query.
+"""
+
+###########
+# Imports #
+###########
+# Import GUI packages
+import tkinter as tk
+from tkinter import ttk
+
+
+#########
+# BEGIN #
+#########
+class QueryStatsView(tk.Toplevel):
+    def __init__(self, parent, stats, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+
+        # Assign arguments to variables
+        self.parent = parent
+        self.stats = stats
+        self._summary = {}
+
+        # Window setup
+        self.withdraw()
+        self.focus()
+        self.title("Query Statistics")
+
+        # Draw widgets
+        self._draw_widgets()
+
+        # Load statistics
+        self.refresh()
+
+        # Center window
+        self.center_window()
+
+
+    def _draw_widgets(self):
+        """ Populate the frame with all widgets.
+        """
+        #################
+        # Create frames #
+        #################
+        options = {'padx':10, 'pady':10}
+
+        # Main container
+        self.frm_main = ttk.Frame(self)
+        self.frm_main.grid(column=5, row=5, **options)
+
+        # Buttons
+        self.frm_button = ttk.Frame(self.frm_main)
+        self.frm_button.grid(column=5, row=20, pady=(10,0))
+
+
+        ###############
+        # Tree Widget #
+        ###############
+        columns = ('name', 'count', 'total_ms', 'mean_ms', 'max_ms',
+            'lock_wait_ms', 'waits', 'max_lock_ms', 'rows', 'slow')
+        self.tree = ttk.Treeview(self.frm_main, columns=columns,
+            show='headings', height=12)
+        # Headings
+        self.tree.heading('name', text="Query")
+        self.tree.heading('count', text="Count")
+        self.tree.heading('total_ms', text="Total (ms)")
+        self.tree.heading('mean_ms', text="Mean (ms)")
+        self.tree.heading('max_ms', text="Max (ms)")
+        self.tree.heading('lock_wait_ms', text="Lock Wait (ms)")
+        self.tree.heading('waits', text="Waits")
+        self.tree.heading('max_lock_ms', text="Max Wait (ms)")
+        self.tree.heading('rows', text="Rows")
+        self.tree.heading('slow', text="Slow")
+        # Columns
+        self.tree.column('name', width=200, stretch=False)
+        for column in columns[1:]:
+            self.tree.column(column, width=80, stretch=False, anchor='e')
+        self.tree.bind('<<TreeviewSelect>>', self._item_selected)
+        self.tree.grid(column=5, row=5)
+
+        # Statement and plan of the selected query
+        self.txt_detail = tk.Text(self.frm_main, height=8, width=100,
+            wrap='word')
+        self.txt_detail.grid(column=5, row=10, pady=(10,0))
+
+        # Lock contention totals
+        self.contention = tk.StringVar()
+        ttk.Label(self.frm_main, textvariable=self.contention).grid(
+            column=5, row=12, sticky='w', pady=(5,0))
+
+        # Threshold note
+        ttk.Label(self.frm_main, text=f"Plans are captured for queries "
+            f"taking at least {self.stats.slow_ms} ms. Showing the last "
+            f"{self.stats.capacity} statements.").grid(
+            column=5, row=15, sticky='w', pady=(5,0))
+
+        # Buttons
+        ttk.Button(self.frm_button, text="Refresh",
+            command=self.refresh).grid(column=5, row=5, padx=5)
+        ttk.Button(self.frm_button, text="Clear",
+            command=self._on_clear).grid(column=10, row=5, padx=5)
+        ttk.Button(self.frm_button, text="Close",
+            command=self.destroy).grid(column=15, row=5, padx=5)
+
+
+    #################
+    # General Funcs #
+    #################
+    def center_window(self):
+        """ Center the root window
+        """
+        self.update_idletasks()
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        size = tuple(int(_) for _ in self.geometry().split('+')[0].split('x'))
+        x = screen_width/2 - size[0]/2
+        y = screen_height/2 - size[1]/2
+        self.geometry("+%d+%d" % (x, y))
+        self.deiconify()
+
+
+    def refresh(self):
+        """ Reload the statistics, worst offenders first.
+        """
+        self.tree.delete(*self.tree.get_children())
+        self._summary = {}
+        for s in self.stats.summary():
+            self.tree.insert('', tk.END, iid=s.name, values=(s.name,
+                s.count, f"{s.total_ms:.1f}", f"{s.mean_ms:.1f}",
+                f"{s.max_ms:.1f}", f"{s.lock_wait_ms:.1f}", s.waits,
+                f"{s.max_lock_ms:.1f}", s.rows, s.slow))
+            self._summary[s.name] = s
+
+        locks = self.stats.lock_summary()
+        self.contention.set(f"Lock contention: {locks.waits} of " +
+            f"{locks.count} statements waited (total " +
+            f"{locks.total_ms:.1f} ms, worst {locks.max_ms:.1f} ms); " +
+            f"{locks.failed} gave up.")
+        self._show_detail(None)
+
+
+    def _on_clear(self):
+        self.stats.clear()
+        self.refresh()
+
+
+    def _item_selected(self, event):
+        if not self.tree.selection():
+            return
+        self._show_detail(self._summary[self.tree.selection()[0]])
+
+
+    def _show_detail(self, summary):
+        self.txt_detail.config(state='normal')
+        self.txt_detail.delete('1.0', tk.END)
+        if summary is not None:
+            self.txt_detail.insert(tk.END, ' '.join(summary.sql.split()))
+            if summary.plan:
+                self.txt_detail.insert(tk.END, "\n\nQuery plan (last slow "
+                    "run):\n" + '\n'.join(summary.plan))
+        self.txt_detail.config(state='disabled')
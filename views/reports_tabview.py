@@ -0,0 +1,161 @@
+""" Reports notebook view. Shows AnalyticsModel reports: approval
+    lag, open study ageing, researcher workload and yearly totals.
+"""
+
+###########
+# Imports #
+###########
+# Import GUI packages
+import tkinter as tk
+from tkinter import ttk
+
+
+#########
+# BEGIN #
+#########
+class ReportsFrame(ttk.Frame):
+    def __init__(self, parent, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+
+        self.summary = tk.StringVar(value="No report yet")
+        self.status = tk.StringVar()
+
+        # center widgets
+        self.grid_columnconfigure(5, weight=1)
+
+        # Populate frame with widgets
+        self.draw_widgets()
+
+
+    def draw_widgets(self):
+        """ Populate the reports view with all widgets
+        """
+        #################
+        # Create frames #
+        #################
+        options = {'padx':10, 'pady':10}
+
+        # Main container
+        self.frm_main = ttk.Frame(self)
+        self.frm_main.grid(column=5, row=5, **options)
+
+        # Summary and refresh button
+        frm_top = ttk.Frame(self.frm_main)
+        frm_top.grid(column=5, columnspan=11, row=5, sticky='we',
+            pady=(0,10))
+        frm_top.grid_columnconfigure(5, weight=1)
+        ttk.Label(frm_top, textvariable=self.summary).grid(
+            column=5, row=5, sticky='w')
+        ttk.Label(frm_top, textvariable=self.status).grid(
+            column=10, row=5, padx=10)
+        ttk.Button(frm_top, text="Refresh",
+            command=lambda: self.event_generate('<<ReportsRefresh>>')
+            ).grid(column=15, row=5)
+
+
+        ################
+        # Report Trees #
+        ################
+        self.tree_lag = self._make_tree(self.frm_main,
+            "Approval Lag (days)", 5, 10,
+            [('percentile', "Percentile", 80), ('days', "Days", 80)],
+            height=6)
+        self.tree_ageing = self._make_tree(self.frm_main,
+            "Open Study Age", 10, 10,
+            [('age', "Open For", 120), ('studies', "Studies", 70)],
+            height=6)
+        self.tree_types = self._make_tree(self.frm_main,
+            "Study Types", 15, 10,
+            [('study_type', "Type", 120), ('open', "Open", 60),
+            ('total', "Total", 60)], height=6)
+        self.tree_workload = self._make_tree(self.frm_main,
+            "Researcher Workload", 5, 15,
+            [('researcher', "Researcher", 150), ('open', "Open", 60),
+            ('total', "Total", 60), ('amendments', "Amendments", 85),
+            ('per_study', "Per Study", 70),
+            ('median_lag', "Median Lag", 80)], columnspan=6)
+        self.tree_years = self._make_tree(self.frm_main,
+            "By Year", 15, 15,
+            [('year', "Year", 50), ('created', "Created", 60),
+            ('closed', "Closed", 60), ('amendments', "Amendments", 85),
+            ('per_study', "Per Study", 70),
+            ('median_lag', "Median Lag", 80)], columnspan=6)
+
+
+    def _make_tree(self, parent, title, column, row, columns, height=10,
+        columnspan=1):
+        """ Create a labelled tree with a scrollbar. The first
+            column is left aligned, the rest right aligned.
+        :param columns: list of (name, heading, width)
+        """
+        frame = ttk.Labelframe(parent, text=title)
+        frame.grid(column=column, columnspan=columnspan, row=row,
+            sticky='nsew', padx=5, pady=5)
+        tree = ttk.Treeview(frame, columns=[x[0] for x in columns],
+            show='headings', height=height)
+        for ii, (name, heading, width) in enumerate(columns):
+            tree.heading(name, text=heading)
+            tree.column(name, width=width, stretch=False,
+                anchor='w' if ii == 0 else 'e')
+        tree.grid(column=5, row=5, padx=(5,0), pady=5)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL,
+            command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        scrollbar.grid(column=6, row=5, sticky='ns', pady=5)
+        return tree
+
+
+    #############
+    # Functions #
+    #############
+    @staticmethod
+    def _fmt(value, digits=0):
+        """ Format a number for display ('-' if there is none).
+        """
+        if value is None:
+            return '-'
+        return f"{value:,.{digits}f}"
+
+
+    def _fill(self, tree, rows):
+        tree.delete(*tree.get_children())
+        for row in rows:
+            tree.insert('', tk.END, values=row)
+
+
+    def set_loading(self):
+        self.status.set("Updating...")
+
+
+    def show_report(self, report):
+        """ Display an AnalyticsModel.report().
+        """
+        fmt = self._fmt
+        lag = report.lag
+        self.summary.set(f"{report.studies:,} studies ({report.open:,} " +
+            f"open), {report.amendments:,} amendments " +
+            f"({lag.pending:,} awaiting approval). Mean approval lag: " +
+            f"{fmt(lag.mean, 1)} days.")
+        self.status.set(f"As of {report.today}")
+
+        self._fill(self.tree_lag, [(f"{p}th", fmt(days))
+            for p, days in lag.percentiles])
+
+        ageing = report.ageing
+        rows = [(label, f"{count:,}") for label, count in ageing.bins]
+        rows.append(("Median (days)", fmt(ageing.median)))
+        if ageing.undated:
+            rows.append(("No start date", f"{ageing.undated:,}"))
+        self._fill(self.tree_ageing, rows)
+
+        self._fill(self.tree_types, [(x.study_type or "(none)",
+            f"{x.open:,}", f"{x.total:,}") for x in report.types])
+
+        self._fill(self.tree_workload, [(x.researcher or "(none)",
+            f"{x.open:,}", f"{x.total:,}", f"{x.amendments:,}",
+            fmt(x.per_study, 1), fmt(x.median_lag))
+            for x in report.workload])
+
+        self._fill(self.tree_years, [(x.year, f"{x.created:,}",
+            f"{x.closed:,}", f"{x.amendments:,}", fmt(x.per_study, 1),
+            fmt(x.median_lag)) for x in report.years])
@@ -0,0 +1,150 @@
+""" Database settings dialog
+"""
+
+###########
+# Imports #
+###########
+# Import GUI packages
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox
+from tkinter import filedialog
+
+
+#########
+# BEGIN #
+#########
+class SettingsDialog(tk.Toplevel):
+    """ Dialog for the write-behind and local copy settings. Local
+        copy changes take effect the next time the app starts.
+    """
+    def __init__(self, parent, sessionpars, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.parent = parent
+        self.sessionpars = sessionpars
+
+        # Edit copies, so Cancel leaves the settings alone
+        self.vars = {key: type(sessionpars[key])(value=sessionpars[key].get())
+            for key in ('write_behind', 'write_behind_ms', 'local_replica',
+            'replica_file', 'replica_sync_s')}
+
+        self.withdraw()
+        self.title("Database Settings")
+        self.grab_set()
+
+
+        #################
+        # Create Frames #
+        #################
+        # Shared frame settings
+        frame_options = {'padx': 10, 'pady': 10}
+        widget_options = {'padx': 5, 'pady': 5}
+
+        # Write-behind frame
+        frm_writes = ttk.Labelframe(self, text='Saving Edits')
+        frm_writes.grid(row=5, column=5, **frame_options, sticky='nsew')
+
+        # Local copy frame
+        frm_replica = ttk.Labelframe(self, text='Local Copy')
+        frm_replica.grid(row=10, column=5, **frame_options, sticky='nsew')
+
+        # Buttons
+        frm_buttons = ttk.Frame(self)
+        frm_buttons.grid(row=40, column=5, pady=(0, 10))
+
+
+        #######################
+        # Create view widgets #
+        #######################
+        # Write-behind
+        ttk.Checkbutton(frm_writes, text="Queue edits and save them in " +
+            "batches", takefocus=0, variable=self.vars['write_behind']
+            ).grid(row=5, column=5, columnspan=20, sticky='w',
+            **widget_options)
+        ttk.Label(frm_writes, text="Save after (ms):"
+            ).grid(row=10, column=5, sticky='e', **widget_options)
+        ttk.Entry(frm_writes, width=10,
+            textvariable=self.vars['write_behind_ms']
+            ).grid(row=10, column=10, sticky='w')
+
+        # Local copy
+        ttk.Checkbutton(frm_replica, text="Read from a local copy of " +
+            "the shared database", takefocus=0,
+            variable=self.vars['local_replica']
+            ).grid(row=5, column=5, columnspan=20, sticky='w',
+            **widget_options)
+        ttk.Label(frm_replica, text="Copy file:"
+            ).grid(row=10, column=5, sticky='e', **widget_options)
+        ttk.Entry(frm_replica, width=40,
+            textvariable=self.vars['replica_file']
+            ).grid(row=10, column=10, sticky='w')
+        ttk.Button(frm_replica, text="Browse", command=self._get_replica_file
+            ).grid(row=10, column=15, sticky='w', **widget_options)
+        ttk.Label(frm_replica, text="Check for changes every (s):"
+            ).grid(row=15, column=5, sticky='e', **widget_options)
+        ttk.Entry(frm_replica, width=10,
+            textvariable=self.vars['replica_sync_s']
+            ).grid(row=15, column=10, sticky='w')
+        ttk.Label(frm_replica, text="Leave the file blank to use " +
+            "~/.study_database. Takes effect after a restart."
+            ).grid(row=20, column=5, columnspan=20, sticky='w',
+            **widget_options)
+
+        # Buttons
+        ttk.Button(frm_buttons, text="Submit", command=self._on_submit
+            ).grid(row=5, column=5, padx=5)
+        ttk.Button(frm_buttons, text="Cancel", command=self.destroy
+            ).grid(row=5, column=10, padx=5)
+
+        # Center the dialog window
+        self.center_window()
+
+
+    #############
+    # Functions #
+    #############
+    def center_window(self):
+        """ Center the root window
+        """
+        self.update_idletasks()
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        size = tuple(int(_) for _ in self.geometry().split('+')[0].split('x'))
+        x = screen_width/2 - size[0]/2
+        y = screen_height/2 - size[1]/2
+        self.geometry("+%d+%d" % (x, y))
+        self.deiconify()
+
+
+    def _get_replica_file(self):
+        """ Get path to the local copy
+        """
+        filename = filedialog.asksaveasfilename(title="Local Copy",
+            defaultextension='.db', filetypes=[("Database", "*.db")])
+        if filename:
+            self.vars['replica_file'].set(filename)
+
+
+    def _on_submit(self):
+        """ Check the numbers, copy the settings and send the submit
+            event to the controller.
+        """
+        try:
+            delay = self.vars['write_behind_ms'].get()
+            interval = self.vars['replica_sync_s'].get()
+        except tk.TclError:
+            delay = interval = -1
+        if delay < 0 or interval <= 0:
+            messagebox.showerror(title="Invalid Settings",
+                message="Invalid number!",
+                detail="The save delay must be 0 ms or more, and the " +
+                    "check interval more than 0 s.",
+                parent=self)
+            return
+
+        for key, var in self.vars.items():
+            self.sessionpars[key].set(var.get())
+
+        print("\nsettingsview: Sending save event...")
+        self.parent.event_generate('<<SettingsSubmit>>')
+        self.destroy()
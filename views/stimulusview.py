@@ -0,0 +1,198 @@
+""" Stimulus check view. Shows the progress of a StimulusAnalyzer
+    run, then every file with its measurements and problems.
+"""
+
+###########
+# Imports #
+###########
+# Import GUI packages
+import tkinter as tk
+from tkinter import ttk
+
+# Import system packages
+import math
+
+
+#########
+# BEGIN #
+#########
+class StimulusView(tk.Toplevel):
+    # Files listed in the window
+    MAX_ROWS = 5000
+
+    # Progress bar text for each analysis stage
+    STAGES = {'hash': "Looking for changed files", 'measure': "Measuring"}
+
+    def __init__(self, parent, folder, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+
+        # Assign arguments to variables
+        self.parent = parent
+        self.report = None
+
+        self.summary = tk.StringVar(value=f"Checking {folder}...")
+        self.status = tk.StringVar()
+        self.problems_only = tk.BooleanVar(value=True)
+
+        # Window setup
+        self.withdraw()
+        self.focus()
+        self.title("Check Stimuli")
+
+        # Draw widgets
+        self._draw_widgets()
+
+        # Center window
+        self.center_window()
+
+
+    def _draw_widgets(self):
+        """ Populate the frame with all widgets.
+        """
+        #################
+        # Create frames #
+        #################
+        options = {'padx':10, 'pady':10}
+
+        # Main container
+        self.frm_main = ttk.Frame(self)
+        self.frm_main.grid(column=5, row=5, **options)
+
+        # Buttons
+        self.frm_button = ttk.Frame(self.frm_main)
+        self.frm_button.grid(column=5, row=20, pady=(10,0))
+
+
+        ##################
+        # Create Widgets #
+        ##################
+        # Summary
+        ttk.Label(self.frm_main, textvariable=self.summary,
+            wraplength=800).grid(column=5, row=5, sticky='w', pady=(0,10))
+
+        # Progress
+        self.progress = ttk.Progressbar(self.frm_main, length=400,
+            mode='determinate')
+        self.progress.grid(column=5, row=7, sticky='w')
+        ttk.Label(self.frm_main, textvariable=self.status).grid(
+            column=5, row=8, sticky='w', pady=(0,10))
+
+        # Files
+        columns = ('path', 'fs', 'channels', 'seconds', 'peak', 'level',
+            'problems')
+        self.tree = ttk.Treeview(self.frm_main, columns=columns,
+            show='headings', height=15)
+        self.tree.heading('path', text="File")
+        self.tree.heading('fs', text="Rate (Hz)")
+        self.tree.heading('channels', text="Channels")
+        self.tree.heading('seconds', text="Length (s)")
+        self.tree.heading('peak', text="Peak (dB)")
+        self.tree.heading('level', text="RMS (dB)")
+        self.tree.heading('problems', text="Problems")
+        self.tree.column('path', width=220, stretch=False)
+        for column in columns[1:-1]:
+            self.tree.column(column, width=75, stretch=False, anchor='e')
+        self.tree.column('problems', width=350, stretch=False)
+        self.tree.tag_configure('problem', foreground='red')
+        self.tree.grid(column=5, row=10)
+
+        # Add vertical scrollbar
+        scrollbar = ttk.Scrollbar(self.frm_main, orient=tk.VERTICAL,
+            command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        scrollbar.grid(column=6, row=10, sticky='ns')
+
+        # Filter
+        ttk.Checkbutton(self.frm_main, text="Show problems only",
+            variable=self.problems_only, command=self._fill).grid(
+            column=5, row=15, sticky='w', pady=(5,0))
+
+        # Buttons
+        ttk.Button(self.frm_button, text="Close",
+            command=self.destroy).grid(column=5, row=5, padx=5)
+
+
+    #################
+    # General Funcs #
+    #################
+    def center_window(self):
+        """ Center the root window
+        """
+        self.update_idletasks()
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        size = tuple(int(_) for _ in self.geometry().split('+')[0].split('x'))
+        x = screen_width/2 - size[0]/2
+        y = screen_height/2 - size[1]/2
+        self.geometry("+%d+%d" % (x, y))
+        self.deiconify()
+
+
+    def set_progress(self, stage, done, total):
+        self.progress.config(maximum=max(total, 1), value=done)
+        self.status.set(f"{self.STAGES.get(stage, stage)}: {done} of " +
+            f"{total} files")
+
+
+    def finish(self, message):
+        """ Show a message in place of a report (e.g. on failure).
+        """
+        self.progress.grid_remove()
+        self.summary.set(message)
+        self.status.set('')
+
+
+    def show_report(self, report):
+        """ Display a StimulusAnalyzer.run() report.
+        """
+        self.report = report
+        self.progress.grid_remove()
+        files = len(report.files)
+        flagged = len(set(x.path for x in report.problems))
+        summary = (f"{report.folder}: {files} files, {flagged} with " +
+            f"problems. Sample rate: {report.fs} Hz.")
+        if report.level_range is not None:
+            low, high = report.level_range
+            summary += (f" RMS levels from {low:.1f} to {high:.1f} dB " +
+                f"(spread {high - low:.1f} dB).")
+        self.summary.set(summary)
+        self.status.set(f"Measured {report.analyzed} files and reused " +
+            f"{report.reused} in {report.seconds:.1f} s")
+        self._fill()
+
+
+    @staticmethod
+    def _db(values):
+        """ Largest of per-channel values, in dB ('-' for none).
+        """
+        value = max(values or [0.0])
+        if value <= 0:
+            return '-'
+        return f"{20 * math.log10(value):.1f}"
+
+
+    def _fill(self):
+        """ List the report's files (or only those with problems).
+        """
+        self.tree.delete(*self.tree.get_children())
+        if self.report is None:
+            return
+        problems = {}
+        for x in self.report.problems:
+            problems.setdefault(x.path, []).append(x.message)
+
+        files = self.report.files
+        if self.problems_only.get():
+            files = [x for x in files if x.path in problems]
+        for x in files[:self.MAX_ROWS]:
+            messages = problems.get(x.path)
+            if x.error is not None:
+                values = (x.path, '', '', '', '', '')
+            else:
+                values = (x.path, x.fs, x.channels,
+                    f"{x.frames / x.fs:.2f}" if x.fs else '',
+                    self._db(x.peak),
+                    '-' if x.level is None else f"{x.level:.1f}")
+            self.tree.insert('', tk.END,
+                values=values + ('; '.join(messages or []),),
+                tags=('problem',) if messages else ())
@@ -16,7 +16,12 @@ from widgets import date_entry
 # BEGIN #
 #########
 class StudyView(tk.Toplevel):
-    def __init__(self, parent, _task, _vars, researchers, *args, **kwargs):
+    def __init__(self, parent, _task, _vars, researchers, active=None, 
+        *args, **kwargs):
+        """
+        :param researchers: NameIndex of every researcher
+        :param active: ids of the researchers to offer (default: all)
+        """
         super().__init__(parent, *args, **kwargs)
 
         # Assign arguments to variables
@@ -24,6 +29,7 @@ class StudyView(tk.Toplevel):
         self._task = _task
         self._vars = _vars
         self.researchers = researchers
+        self.active = active
         self.study_types = ['Main Study', 'Sub-Study']
 
         # Window setup
@@ -97,7 +103,7 @@ class StudyView(tk.Toplevel):
         ttk.Label(self.frm_main, text="Researcher:").grid(
             column=5, row=20, **small_padding)
         ttk.Combobox(self.frm_main, textvariable=self._vars['researcher_id'],
-            values=list(self.researchers.keys()), state='readonly',
+            values=self.researchers.labels(self.active), state='readonly',
             width=17).grid(column=10, row=20)
 
         # Date created
@@ -9,17 +9,38 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 
+# Import custom modules
+from widgets import record_tree
+
 
 #########
 # BEGIN #
 #########
 class MainFrame(ttk.Frame):
+    # Rows inserted per event loop pass during large reloads
+    CHUNK_SIZE = 500
+    # Wait this long after the last keystroke before searching
+    SEARCH_DELAY_MS = 250
+
     def __init__(self, parent, studies, _studyvars, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
 
         self.studies = studies
         self._studyvars = _studyvars
 
+        # Paging state: key of the last loaded row, whether more
+        # rows exist and whether a page has been requested
+        self.last_key = None
+        self.has_more = True
+        self.loading = False
+
+        # Search state: (kind, ref_id, study_id) for each result iid
+        self.search_var = tk.StringVar()
+        self.search_status = tk.StringVar()
+        self.search_selection = None
+        self._search_hits = {}
+        self._search_job = None
+
         # Populate frame with widgets
         self.draw_widgets()
 
@@ -44,11 +65,43 @@ class MainFrame(ttk.Frame):
         self.frm_main.grid(column=5, row=5, **options)
 
 
+        #################
+        # Search Widget #
+        #################
+        frm_search = ttk.Frame(self.frm_main)
+        frm_search.grid(row=5, column=5, sticky='w', pady=(0,10))
+        ttk.Label(frm_search, text="Search:").grid(row=5, column=5)
+        self.ent_search = ttk.Entry(frm_search, 
+            textvariable=self.search_var, width=50)
+        self.ent_search.grid(row=5, column=6, padx=(5,10))
+        ttk.Label(frm_search, textvariable=self.search_status).grid(
+            row=5, column=7)
+
+        # Search as the user types, or at once on Return
+        self.ent_search.bind('<KeyRelease>', self._schedule_search)
+        self.ent_search.bind('<Return>', lambda _: self._on_search())
+        self.ent_search.bind('<Escape>', lambda _: self.clear_search())
+
+        # Search results (hidden until there are any)
+        columns = ('kind', 'study', 'match')
+        self.search_tree = ttk.Treeview(self.frm_main, columns=columns, 
+            show='headings', height=6)
+        self.search_tree.heading('kind', text="Type")
+        self.search_tree.heading('study', text="Study")
+        self.search_tree.heading('match', text="Match")
+        self.search_tree.column('kind', width=80, stretch=False)
+        self.search_tree.column('study', width=250, stretch=False)
+        self.search_tree.column('match', width=360, stretch=False)
+        self.search_tree.bind('<<TreeviewSelect>>', self.search_selected)
+        self.search_tree.grid(row=7, column=5, pady=(0,10))
+        self.search_tree.grid_remove()
+
+
         ###############
         # Tree Widget #
         ###############
-        columns = ('study_id', 'irb_ref', 'study_name', 'study_type', 'full_name', 'date_created', 'date_closed')
-        self.tree = ttk.Treeview(self.frm_main, columns=columns, show='headings')
+        columns = ('study_id', 'irb_ref', 'study_name', 'study_type', 'full_name', 'date_created', 'date_closed', 'amendments')
+        self.tree = record_tree.RecordTree(self.frm_main, columns=columns, show='headings', chunk_size=self.CHUNK_SIZE)
         # Headings
         self.tree.heading('study_id', text="ID")
         self.tree.heading('irb_ref', text="IRB Ref.")
@@ -57,6 +110,7 @@ class MainFrame(ttk.Frame):
         self.tree.heading('full_name', text='Researcher')
         self.tree.heading('date_created', text="Created")
         self.tree.heading('date_closed', text="Closed")
+        self.tree.heading('amendments', text="Amendments")
         # Columns
         self.tree.column("study_id", width=30, stretch=False)
         self.tree.column("irb_ref", width=70, stretch=False)
@@ -65,10 +119,10 @@ class MainFrame(ttk.Frame):
         self.tree.column("full_name", width=100, stretch=False)
         self.tree.column("date_created", width=70, stretch=False)
         self.tree.column("date_closed", width=70, stretch=False)
+        self.tree.column("amendments", width=75, stretch=False, anchor='e')
 
         # Load data into tree
-        for row in self.studies:
-            self.tree.insert('', tk.END, values=row)
+        self.append_rows(self.studies)
 
         # Bind function to tree
         self.tree.bind('<<TreeviewSelect>>', self.item_selected)
@@ -77,9 +131,9 @@ class MainFrame(ttk.Frame):
         self.tree.grid(row=10, column=5)
 
         # Add vertical scrollbar
-        scrollbar = ttk.Scrollbar(self.frm_main, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        scrollbar.grid(row=10, column=6, sticky='ns')
+        self.scrollbar = ttk.Scrollbar(self.frm_main, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=self._on_scroll)
+        self.scrollbar.grid(row=10, column=6, sticky='ns')
 
         # KNOWN ISSUE WITH HORIZONTAL SCROLLING WITH TREEVIEW
         # scrollbar_x = ttk.Scrollbar(self.frm_main, orient=tk.HORIZONTAL, command=self.tree.xview)
@@ -94,19 +148,122 @@ class MainFrame(ttk.Frame):
         self.event_generate('<<MainSave>>')
 
 
+    def _on_scroll(self, first, last):
+        """ Update the scrollbar and ask the controller for the next
+            page when the view nears the bottom of the loaded rows.
+        """
+        self.scrollbar.set(first, last)
+        if (float(last) >= 0.9 and self.has_more and not self.loading
+            and not self.tree.loading):
+            self.loading = True
+            self.event_generate('<<MainTreeNeedPage>>')
+
+
+    def append_rows(self, rows, page_size=None):
+        """ Append a page of rows to the tree. A page shorter than 
+            page_size is the last one.
+        """
+        self.tree.append(rows)
+        self._update_paging(rows, page_size)
+
+
+    def reload_rows(self, rows, page_size=None, on_progress=None):
+        """ Replace the rows in the tree, touching only rows that 
+            were inserted, changed, moved or deleted. Large reloads 
+            are inserted in chunks and report on_progress(done, total).
+        """
+        counts = self.tree.reconcile(rows, on_progress=on_progress)
+        print("\nstudy_tabview: Reloaded tree (inserted: {}, changed: {}, "
+            "moved: {}, deleted: {})".format(*counts))
+        self.last_key = None
+        self._update_paging(rows, page_size)
+
+
+    def _update_paging(self, rows, page_size):
+        if rows:
+            self.last_key = rows[-1].page_key
+        if page_size is not None:
+            self.has_more = len(rows) >= page_size
+        self.loading = False
+
+
+    def _schedule_search(self, event):
+        # Ignore keys that don't edit the text
+        if event.keysym in ('Return', 'Escape'):
+            return
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(self.SEARCH_DELAY_MS, self._on_search)
+
+
+    def _on_search(self):
+        """ Ask the controller to search for the text in the search
+            box.
+        """
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+            self._search_job = None
+
+        if not self.search_var.get().strip():
+            self.show_search_results([])
+        # An empty search still goes to the controller, so it 
+        # supersedes a search that is still running
+        self.event_generate('<<MainSearch>>')
+
+
+    def clear_search(self):
+        self.search_var.set('')
+        self._on_search()
+
+
+    def show_search_results(self, rows):
+        """ Show DBModel.search() results below the search box.
+        """
+        self.search_tree.delete(*self.search_tree.get_children())
+        self._search_hits = {}
+        for hit in rows:
+            if hit.kind == 'study':
+                match = ' | '.join(x for x in (hit.hl_irb, hit.hl_name, 
+                    hit.hl_researcher) if x)
+            else:
+                match = hit.snippet
+            iid = f"{hit.kind}:{hit.ref_id}"
+            self.search_tree.insert('', tk.END, iid=iid, 
+                values=(hit.kind.title(), hit.study_name, match))
+            self._search_hits[iid] = (hit.kind, hit.ref_id, hit.study_id)
+
+        if rows:
+            self.search_status.set(f"{len(rows)} matches")
+            self.search_tree.grid()
+        else:
+            self.search_status.set(
+                "No matches" if self.search_var.get().strip() else "")
+            self.search_tree.grid_remove()
+
+
+    def search_selected(self, event):
+        """ Send the selected search result to the controller to 
+            open.
+        """
+        if not self.search_tree.selection():
+            return
+        self.search_selection = self._search_hits[
+            self.search_tree.selection()[0]]
+        self.event_generate('<<MainSearchSelection>>')
+
+
     def item_selected(self, event):
         """ Bound function to Studies treeview that retrieves
             study details and send event to controller to 
             display study editing window.
         """
-        # Retrieve study details
-        for selected_item in self.tree.selection():
-            item = self.tree.item(selected_item)
-            record = item['values']
+        # Selection is cleared when a selected row is deleted
+        if not self.tree.selection():
+            return
 
         # Load study details into _studyvars
-        for ii, key in enumerate(self._studyvars):
-            self._studyvars[key].set(record[ii])
+        record = self.tree.record(self.tree.selection()[-1])
+        record.set_vars(self._studyvars)
 
         # Send item select event to controller
         self.event_generate('<<MainTreeSelection>>')
@@ -1,8 +1,7 @@
 import tkinter as tk
 from tkinter import ttk
 
-from datetime import datetime
-
+from functions import date_rules
 from mixins import validatedmixin
 
 
@@ -13,12 +12,8 @@ class DateEntry(validatedmixin.ValidatedMixin, ttk.Entry):
         valid = True
         if action == '0': # Delete action
             valid = True
-        elif index in ('0', '1', '2', '3', '5', '6', '8', '9'):
-            valid = char.isdigit()
-        elif index in ('4', '7'):
-            valid = char == '-'
-        else: 
-            valid = False
+        else:
+            valid = date_rules.valid_date_char(int(index), char)
         return valid
 
 
@@ -27,9 +22,7 @@ class DateEntry(validatedmixin.ValidatedMixin, ttk.Entry):
         # if not self.get():
         #     self.error.set('A value is required')
         #     valid = False
-        try:
-            datetime.strptime(self.get(), '%Y-%m-%d')
-        except ValueError:
+        if not date_rules.is_valid_date(self.get()):
             self.error.set('Invalid date')
             valid = False
         return valid
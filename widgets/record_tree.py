@@ -0,0 +1,214 @@
+import tkinter as tk
+from tkinter import ttk
+
+from bisect import bisect_left
+
+
+class RecordTree(ttk.Treeview):
+    """ Treeview whose items are keyed by a record id (e.g., study_id
+        or amend_id). reconcile() updates the tree to a new result set
+        by touching only the items that were inserted, changed, moved
+        or deleted, so selection and scroll position survive a refresh.
+
+        Large loads are inserted chunk_size rows at a time, one batch
+        per event loop pass, so the window stays interactive. Any
+        later call supersedes a load that is still in progress.
+    """
+    def __init__(self, *args, key_index=0, chunk_size=500, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.key_index = key_index
+        self.chunk_size = chunk_size
+        self._load_job = None
+
+        # iid -> row currently shown, and iids in display order
+        self._rows = {}
+        self._order = []
+
+
+    def _iid(self, row):
+        return str(row[self.key_index])
+
+
+    @property
+    def loading(self):
+        """ True while a chunked load is in progress.
+        """
+        return self._load_job is not None
+
+
+    def cancel_load(self):
+        """ Stop a chunked load. Rows already inserted stay.
+        """
+        if self._load_job is not None:
+            self.after_cancel(self._load_job)
+            self._load_job = None
+
+
+    def record(self, iid):
+        """ Return the row shown as iid (as passed in, not the
+            strings Treeview.item() returns), or None.
+        """
+        return self._rows.get(iid)
+
+
+    def clear(self):
+        """ Delete every row.
+        """
+        self.cancel_load()
+        self.delete(*self._order)
+        self._rows = {}
+        self._order = []
+
+
+    def append(self, rows):
+        """ Add rows to the end of the tree. Rows already shown are
+            updated in place.
+        """
+        self.cancel_load()
+        self._append(rows)
+
+
+    def load(self, rows, on_progress=None, on_done=None, append=False):
+        """ Insert rows in batches of chunk_size. The first batch is
+            inserted immediately, the rest one batch per event loop 
+            pass.
+        :param on_progress: called as on_progress(done, total) after
+            each batch
+        :param on_done: called once every row is inserted
+        :param append: keep existing rows instead of clearing first
+        """
+        if append:
+            self.cancel_load()
+        else:
+            self.clear()
+        total = len(rows)
+
+        def step(start):
+            end = min(start + self.chunk_size, total)
+            self._append(rows[start:end])
+            if on_progress:
+                on_progress(end, total)
+            if end < total:
+                # after() rather than after_idle() so input and redraws
+                # are handled between batches
+                self._load_job = self.after(1, step, end)
+            else:
+                self._load_job = None
+                if on_done:
+                    on_done()
+
+        step(0)
+
+
+    def _append(self, rows):
+        for row in rows:
+            iid = self._iid(row)
+            if iid in self._rows:
+                if self._rows[iid] != row:
+                    self.item(iid, values=row)
+            else:
+                self.insert('', tk.END, iid=iid, values=row)
+                self._order.append(iid)
+            self._rows[iid] = row
+
+
+    def reconcile(self, rows, on_progress=None, on_done=None):
+        """ Show rows, in order, with the fewest Tk calls. A mostly
+            new result set is reloaded with load() instead.
+        :return: (inserted, changed, moved, deleted) counts
+        """
+        self.cancel_load()
+        new_order = [self._iid(row) for row in rows]
+        new_rows = dict(zip(new_order, rows))
+
+        kept = sum(1 for iid in self._order if iid in new_rows)
+        if (len(new_order) - kept > self.chunk_size 
+            and kept < len(new_order) // 2):
+            deleted = len(self._order) - kept
+            self.load(rows, on_progress, on_done)
+            return len(rows), 0, 0, deleted
+
+        # Delete rows that are gone
+        deleted = [iid for iid in self._order if iid not in new_rows]
+        if deleted:
+            self.delete(*deleted)
+        current = [iid for iid in self._order if iid in new_rows]
+
+        # Rows in the longest run that is already in the right order
+        # stay put; every other surviving row is moved
+        stay = self._longest_ordered_run(current, new_order)
+
+        inserted = changed = moved = 0
+        placed = set()
+        pos = 0
+        for index, iid in enumerate(new_order):
+            # current[pos] is the first unplaced row still attached.
+            # Rows before index are final.
+            while pos < len(current) and current[pos] in placed:
+                pos += 1
+            if pos < len(current) and current[pos] == iid:
+                pos += 1
+            else:
+                # Detach out-of-order rows until the next staying row
+                while pos < len(current) and (current[pos] in placed
+                    or current[pos] not in stay):
+                    if current[pos] not in placed:
+                        self.detach(current[pos])
+                    pos += 1
+
+                if iid in self._rows:
+                    if iid in stay:
+                        # Already next in line
+                        pos += 1
+                    else:
+                        self.move(iid, '', index)
+                        moved += 1
+                else:
+                    self.insert('', index, iid=iid, values=new_rows[iid])
+                    inserted += 1
+            placed.add(iid)
+
+            # Update changed values
+            old = self._rows.get(iid)
+            if old is not None and old != new_rows[iid]:
+                self.item(iid, values=new_rows[iid])
+                changed += 1
+
+        self._rows = new_rows
+        self._order = new_order
+        if on_progress:
+            on_progress(len(rows), len(rows))
+        if on_done:
+            on_done()
+        return inserted, changed, moved, len(deleted)
+
+
+    @staticmethod
+    def _longest_ordered_run(current, new_order):
+        """ Return the largest set of iids whose relative order is the
+            same in current and new_order (longest increasing
+            subsequence of new positions).
+        """
+        position = {iid: ii for ii, iid in enumerate(new_order)}
+        seq = [position[iid] for iid in current]
+
+        # Patience sort with back links
+        tails = []
+        tail_idx = []
+        prev = [-1] * len(seq)
+        for ii, value in enumerate(seq):
+            jj = bisect_left(tails, value)
+            if jj == len(tails):
+                tails.append(value)
+                tail_idx.append(ii)
+            else:
+                tails[jj] = value
+                tail_idx[jj] = ii
+            prev[ii] = tail_idx[jj - 1] if jj > 0 else -1
+
+        stay = set()
+        ii = tail_idx[-1] if tail_idx else -1
+        while ii != -1:
+            stay.add(current[ii])
+            ii = prev[ii]
+        return stay